@@ -9,8 +9,23 @@ from .theme import RetroTheme
 from .dialogs import RetroMessageBox
 from .config import ConfigManager, CONFIG_FILE, ARTICLES_DIR
 from .articles import ArticleManager
+from .build_state import BuildState
+from .transfer_journal import TransferJournal
+from .template_engine import TemplateEngine
 from .html_generator import HTMLGenerator
+from .minifier import minify_css, minify_html
+from .search_index import SearchIndex
+from .feeds import FeedGenerator
+from .related import RelatedArticles
+from .images import ImagePipeline
+from .site_builder import SiteBuilder
+from .retry import CircuitBreaker
 from .uploader import FileUploader, SFTPUploader, build_web_url
+from .connection_pool import ConnectionPool
+from .transfer import TransferEngine
+from .async_transfer import AsyncTransferEngine, BlockingTransfers
+from .manifest import RemoteManifest, MANIFEST_FILENAME
+from .sync import SyncPlanner
 from .app import RetroCMSApp
 
 __all__ = [
@@ -20,9 +35,27 @@ __all__ = [
     'CONFIG_FILE',
     'ARTICLES_DIR',
     'ArticleManager',
+    'BuildState',
+    'TransferJournal',
+    'TemplateEngine',
     'HTMLGenerator',
+    'minify_css',
+    'minify_html',
+    'SearchIndex',
+    'FeedGenerator',
+    'RelatedArticles',
+    'ImagePipeline',
+    'SiteBuilder',
+    'CircuitBreaker',
     'FileUploader',
     'SFTPUploader',
     'build_web_url',
+    'ConnectionPool',
+    'TransferEngine',
+    'AsyncTransferEngine',
+    'BlockingTransfers',
+    'RemoteManifest',
+    'MANIFEST_FILENAME',
+    'SyncPlanner',
     'RetroCMSApp',
 ]
@@ -2,6 +2,7 @@
 Aplicación principal del CMS CTPFA
 """
 
+import ftplib
 import os
 import threading
 import tkinter as tk
@@ -13,8 +14,14 @@ from .theme import RetroTheme
 from .dialogs import RetroMessageBox
 from .config import ConfigManager
 from .articles import ArticleManager
+from .build_state import BuildState
 from .html_generator import HTMLGenerator
-from .uploader import FileUploader, SFTPUploader, build_web_url
+from .site_builder import SiteBuilder
+from .connection_pool import ConnectionPool
+from .async_transfer import AsyncTransferEngine
+from .manifest import RemoteManifest
+from .sync import SyncPlanner
+from .uploader import build_web_url
 
 
 class ToolTip:
@@ -95,6 +102,15 @@ class RetroCMSApp:
         self.config = ConfigManager()
         self.articles = ArticleManager(self.config)
         self.generator = HTMLGenerator(self.articles, self.config)
+        self.builder = SiteBuilder(self.articles, self.generator, self.config)
+        # Sesiones FTP/SFTP que se reutilizan entre publicaciones, importaciones y borrados
+        self.connections = ConnectionPool(self.config)
+        # Lotes de subidas y descargas repartidos entre varias de esas sesiones. Las
+        # acciones (publicar, importar...) van a un único hilo y sus transferencias,
+        # al bucle de eventos del motor, que permite cancelarlas
+        self.engine = AsyncTransferEngine(self.connections)
+        # Comparación con el servidor para subir solo lo que ha cambiado
+        self.sync = SyncPlanner(self.builder)
         
         self.setup_styles()
         self.create_menu()
@@ -625,17 +641,26 @@ class RetroCMSApp:
                 self.set_status("Eliminando del servidor...")
                 server = self.config.get("server")
                 if server.get("host"):
-                    uploader = SFTPUploader(self.config)
-                    uploader.connect()
-                    remote_file = f"{server['remote_path']}/{self.current_article_id}.html"
-                    try:
-                        if uploader.sftp is not None:
-                            uploader.sftp.remove(remote_file)
-                        self.set_status("Artículo eliminado del servidor")
-                    except IOError:
-                        # El archivo no existía en el servidor
-                        pass
-                    uploader.disconnect()
+                    with self.connections.session() as uploader:
+                        remote_file = f"{server['remote_path']}/{self.current_article_id}.html"
+                        try:
+                            uploader.delete_with_variants(remote_file)
+                            self.set_status("Artículo eliminado del servidor")
+                        except (IOError, ftplib.error_perm):
+                            # El archivo no existía en el servidor
+                            pass
+                        # Datos del artículo publicados aparte (build.article_data = "file")
+                        data_file = f"{server['remote_path']}/{self.current_article_id}.json"
+                        try:
+                            uploader.delete_with_variants(data_file)
+                        except (IOError, ftplib.error_perm):
+                            pass
+                        manifest = RemoteManifest(server['remote_path']).load(uploader)
+                        if manifest.found:
+                            manifest.remove_article(self.current_article_id)
+                            manifest.remove_file(f"{self.current_article_id}.html")
+                            manifest.remove_file(f"{self.current_article_id}.json")
+                            manifest.save(uploader)
             except Exception as e:
                 RetroMessageBox.showwarning(
                     self.root,
@@ -676,12 +701,19 @@ class RetroCMSApp:
             'created': datetime.now().strftime("%Y-%m-%d %H:%M")
         }
         
+        # Los recursos con huella y las imágenes solo existen en el directorio de salida
+        self.builder.build_assets()
+        self.builder.build_images([temp_article])
         html = self.generator.generate_article_html(temp_article)
         
-        # Ajustar rutas CSS para que apunten al directorio padre
-        parent_dir = Path(__file__).parent.parent.parent.absolute()
+        # Ajustar rutas CSS, JS e imágenes para que apunten al directorio de salida
+        parent_dir = self.builder.output_path.absolute()
         html = html.replace('href="css/', f'href="file://{parent_dir}/css/')
         html = html.replace("href='css/", f"href='file://{parent_dir}/css/")
+        html = html.replace('src="js/', f'src="file://{parent_dir}/js/')
+        html = html.replace('src="img/', f'src="file://{parent_dir}/img/')
+        html = html.replace('srcset="img/', f'srcset="file://{parent_dir}/img/')
+        html = html.replace(', img/', f', file://{parent_dir}/img/')
         
         # Guardar preview temporal
         preview_path = Path("preview.html")
@@ -903,6 +935,21 @@ class RetroCMSApp:
         self.anim_btn_frame = tk.Frame(frame, bg=RetroTheme.BG_DARK)
         self.anim_btn_frame.pack(pady=10)
         
+        # Cancelar las transferencias en curso (anim_finish lo sustituye por los botones finales)
+        btn_cancel = tk.Button(
+            self.anim_btn_frame, text="[ CANCELAR ]",
+            font=("Courier New", 10),
+            fg=RetroTheme.NEON_RED, bg=RetroTheme.BG_DARK,
+            activeforeground=RetroTheme.BG_DARK,
+            activebackground=RetroTheme.NEON_RED,
+            bd=0, highlightthickness=1,
+            highlightbackground=RetroTheme.NEON_RED,
+            cursor="hand2",
+            command=self.engine.cancel
+        )
+        btn_cancel.pack(side=tk.LEFT, padx=8)
+        ToolTip(btn_cancel, "Detener la transferencia (lo que ya se está enviando termina)")
+        
         # Efecto de parpadeo del borde
         self.anim_blink_active = True
         def blink_border():
@@ -925,8 +972,23 @@ class RetroCMSApp:
         self.anim_lines = []
         self.root.after(100, on_complete_callback)
     
+    def in_ui_thread(self, method, *args):
+        """Indica si se puede tocar Tk desde aquí; si no, programa method(*args) en el hilo de Tk.
+
+        Las acciones se ejecutan en el hilo de acciones y el progreso de las
+        transferencias en el del bucle de eventos: todo lo que cambia la
+        ventana (anim_*, set_status) pasa por root.after, en orden, al hilo
+        de la interfaz.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return True
+        self.root.after(0, method, *args)
+        return False
+    
     def anim_add_line(self, text, color=None):
         """Añade una línea al terminal de animación"""
+        if not self.in_ui_thread(self.anim_add_line, text, color):
+            return
         if hasattr(self, 'anim_terminal'):
             self.anim_terminal.config(state=tk.NORMAL)
             self.anim_terminal.insert(tk.END, f"{text}\n")
@@ -936,6 +998,8 @@ class RetroCMSApp:
     
     def anim_update_progress(self, current, total):
         """Actualiza la barra de progreso ASCII"""
+        if not self.in_ui_thread(self.anim_update_progress, current, total):
+            return
         if hasattr(self, 'progress_label'):
             percent = int((current / total) * 100) if total > 0 else 0
             filled = int(percent / 5)
@@ -945,12 +1009,16 @@ class RetroCMSApp:
     
     def anim_set_status(self, text):
         """Actualiza el estado en la animación"""
+        if not self.in_ui_thread(self.anim_set_status, text):
+            return
         if hasattr(self, 'anim_status'):
             self.anim_status.config(text=text)
             self.root.update_idletasks()
     
     def anim_finish(self, success=True, message="", url=None):
         """Finaliza la animación"""
+        if not self.in_ui_thread(self.anim_finish, success, message, url):
+            return
         if hasattr(self, 'anim_window') and self.anim_window.winfo_exists():
             # Detener el parpadeo del borde
             self.anim_blink_active = False
@@ -1155,65 +1223,87 @@ class RetroCMSApp:
                 self.anim_add_line(f"> Conectando a {server['host']} ({protocol})...")
                 self.anim_set_status(f"Estableciendo conexión {protocol}...")
                 
-                uploader = FileUploader(self.config)
-                uploader.connect()
+                with self.connections.session() as uploader:
+                    self.anim_add_line(f"  ✓ {self.connections.describe(uploader)}")
+                    time.sleep(0.2)
                 
-                self.anim_add_line("  ✓ Conexión establecida")
-                time.sleep(0.2)
+                    remote_path = server['remote_path']
+                    filename = f"{article_id}.html"
+                    manifest = RemoteManifest(remote_path).load(uploader)
                 
-                remote_path = server['remote_path']
-                filename = f"{article_id}.html"
+                    # Los recursos (CSS/JS con huella) antes que las páginas que los enlazan
+                    self.upload_assets(uploader, remote_path, manifest)
                 
-                self.anim_add_line("")
-                self.anim_add_line("> Generando HTML...")
+                    self.anim_add_line("")
+                    self.anim_add_line(f"> Generando y subiendo: {filename}")
+                    self.anim_set_status(f"Subiendo: {title[:40]}...")
+                    self.anim_update_progress(0, 1)
                 
-                # Generar HTML del artículo
-                html = self.generator.generate_article_html(full_article)
-                self.anim_add_line(f"  ✓ HTML generado ({len(html)} bytes)")
-                time.sleep(0.2)
+                    # Las imágenes del artículo antes que la página que las enlaza
+                    self.upload_images(uploader, remote_path, self.builder.build_images([full_article]), manifest)
                 
-                self.anim_add_line("")
-                self.anim_add_line(f"> Subiendo: {filename}")
-                self.anim_set_status(f"Subiendo: {title[:40]}...")
-                self.anim_update_progress(0, 1)
-                
-                # Subir artículo
-                remote_file = f"{remote_path}/{filename}"
-                uploader.upload_string(html, remote_file)
+                    # Los relacionados se recalculan antes de generar la página que los muestra
+                    affected = [art for art in self.builder.update_related() if art['id'] != article_id]
                 
-                self.anim_add_line(f"  ✓ Artículo subido")
-                time.sleep(0.15)
+                    # Generar el HTML del artículo (y sus variantes comprimidas) en local
+                    relpaths = self.builder.build_article(full_article)
+                    self.builder.precompress(relpaths)
                 
-                # Actualizar index.html
-                self.anim_add_line("")
-                self.anim_add_line("> Actualizando índice del sitio...")
-                self.anim_set_status("Regenerando index.html...")
-                
-                # Generar y subir index.html
-                index_html = self.generator.generate_index_html(self.articles.list_articles())
-                uploader.upload_string(index_html, f"{remote_path}/index.html")
-                self.anim_add_line("  ✓ index.html actualizado")
-
+                    sent = self.upload_article_files(uploader, remote_path, relpaths, manifest)
                 
+                    self.anim_add_line(f"  ✓ Artículo subido ({sent} bytes)")
+                    time.sleep(0.15)
                 
-                self.anim_update_progress(1, 1)
-                self.anim_add_line("")
-                self.anim_add_line("> Cerrando conexión...")
-                uploader.disconnect()
+                    # Artículos cuya lista de relacionados ha cambiado con esta publicación
+                    if affected:
+                        self.anim_add_line("")
+                        self.anim_add_line(f"> Actualizando relacionados ({len(affected)} artículos)...")
+                        built = {}
+                    
+                        def build(art):
+                            built[art['id']] = self.builder.build_article(art)
+                            self.builder.precompress(built[art['id']])
+                            return [(self.builder.output_file(path), f"{remote_path}/{path}")
+                                    for path in built[art['id']]]
+                    
+                        # Cada artículo se sube en cuanto está generado; la generación espera si va por delante
+                        report = self.engine.run(self.engine.upload_many(
+                            self.engine.render_many(affected, build), uploader=uploader))
+                        self.check_transfer(report)
+                        for art in affected:
+                            for path in built[art['id']]:
+                                manifest.add_file(path, self.builder.output_file(path))
+                            manifest.add_article(art, self.builder.output_file(f"{art['id']}.html"))
+                        self.anim_add_line("  ✓ Relacionados actualizados")
+                
+                    # Actualizar index.html
+                    self.anim_add_line("")
+                    self.anim_add_line("> Actualizando índice del sitio...")
+                    self.anim_set_status("Regenerando index.html...")
+                
+                    # Generar y subir solo las páginas del índice y archivos que han cambiado
+                    self.upload_listing_pages(uploader, remote_path, manifest)
+                
+                    # El manifiesto solo se mantiene si existe: lo crea «Sincronizar TODO»
+                    if manifest.found:
+                        manifest.add_article(full_article, self.builder.output_file(filename))
+                        manifest.save(uploader)
+                
+                    self.anim_update_progress(1, 1)
                 
                 # Construir URL del artículo publicado
                 article_url = build_web_url(server, filename)
                 
                 self.anim_finish(True, f"'{title}' publicado correctamente", url=article_url)
                 self.set_status(f"✓ Publicado: {title}")
-                self.refresh_article_list()
+                self.root.after(0, self.refresh_article_list)
                 
             except Exception as e:
                 self.anim_finish(False, str(e))
                 self.set_status(f"Error: {str(e)}")
         
         # Mostrar ventana de animación y ejecutar
-        self.show_upload_animation(lambda: threading.Thread(target=do_upload).start())
+        self.show_upload_animation(lambda: self.engine.run_action(do_upload))
 
     def publish_all(self):
         """Sincroniza todos los artículos marcados al servidor"""
@@ -1261,65 +1351,232 @@ class RetroCMSApp:
                 self.anim_add_line(f"> Conectando a {server['host']} ({protocol})...")
                 self.anim_set_status(f"Estableciendo conexión {protocol}...")
                 
-                uploader = FileUploader(self.config)
-                uploader.connect()
-                
-                self.anim_add_line("  ✓ Conexión establecida")
-                time.sleep(0.2)
-                
-                remote_path = server['remote_path']
-                total = len(articles_to_publish)
-                published_count = 0
-                
-                self.anim_add_line("")
-                self.anim_add_line("> Iniciando transferencia de archivos...")
-                self.anim_add_line("")
-                
-                for i, full_article in enumerate(articles_to_publish):
-                    filename = f"{full_article['id']}.html"
-                    self.anim_add_line(f"  [{i+1}/{total}] {filename[:35]}")
-                    self.anim_set_status(f"Subiendo: {full_article['title'][:40]}...")
-                    self.anim_update_progress(i, total)
-                    
-                    # Generar HTML
-                    html = self.generator.generate_article_html(full_article)
-                    
-                    # Subir
-                    remote_file = f"{remote_path}/{filename}"
-                    uploader.upload_string(html, remote_file)
-                    
-                    self.anim_add_line(f"        → Transferido ({len(html)} bytes)")
-                    published_count += 1
-                    time.sleep(0.15)
-                
-                self.anim_update_progress(total, total)
-                self.anim_add_line("")
-                
-                # Actualizar index.html
-                self.anim_add_line("> Actualizando índice del sitio...")
-                self.anim_set_status("Regenerando index.html...")
-                index_html = self.generator.generate_index_html(self.articles.list_articles())
-                uploader.upload_string(index_html, f"{remote_path}/index.html")
-                self.anim_add_line("  ✓ index.html actualizado")
-                
-                
-                self.anim_add_line("")
-                self.anim_add_line("> Cerrando conexión...")
-                uploader.disconnect()
+                with self.connections.session() as uploader:
+                    self.anim_add_line(f"  ✓ {self.connections.describe(uploader)}")
+                    time.sleep(0.2)
+                
+                    remote_path = server['remote_path']
+                    total = len(articles_to_publish)
+                
+                    # Generar el sitio completo en local y comprimirlo en paralelo
+                    self.anim_add_line("")
+                    self.anim_add_line("> Generando páginas...")
+                    self.anim_set_status("Generando y comprimiendo páginas...")
+                    self.builder.update_related()
+                    assets = list(self.builder.build_assets().values())
+                    images = self.builder.build_images(articles_to_publish)
+                    relpaths = assets + images
+                    for article in articles_to_publish:
+                        relpaths += self.builder.build_article(article)
+                    pages, _ = self.builder.build_listing_pages()
+                    relpaths += [page['path'] for page in pages]
+                    self.builder.precompress(relpaths)
+                
+                    # Comparar con lo que ya hay en el servidor y subir solo las diferencias
+                    self.anim_add_line("")
+                    self.anim_set_status("Comparando con el servidor...")
+                    plan = self.sync.plan(uploader, remote_path, relpaths)
+                    for line in SyncPlanner.describe(plan, limit=10):
+                        self.anim_add_line(f"  {line}")
+                
+                    self.anim_add_line("")
+                    self.anim_add_line("> Iniciando transferencia de archivos...")
+                    self.anim_set_status(f"Subiendo {len(plan['add']) + len(plan['change'])} archivo(s)...")
+                    report = self.sync.execute(plan, self.engine.blocking, uploader, remote_path,
+                                               self.transfer_progress, articles_to_publish)
+                    if report['bundle']:
+                        self.anim_add_line(f"  ✓ Paquete de {report['bytes']} bytes desplegado de una vez")
+                    elif report['bundle_error']:
+                        self.anim_add_line(f"  ! Sin paquete ({report['bundle_error']}): archivo a archivo")
+                    self.check_transfer(report)
+                    for path in report['deleted']:
+                        self.anim_add_line(f"  ✓ {path} eliminado")
+                    self.anim_update_progress(1, 1)
+                
+                    # El estado de publicación queda al día con lo que ya está en el servidor
+                    state = self.open_build_state()
+                    for relpath in assets + images:
+                        state.update(relpath, relpath)
+                    for page in pages:
+                        state.update(page['path'], page['fingerprint'])
+                    for path in report['deleted']:
+                        state.forget(path)
+                    self.upload_htaccess(uploader, remote_path, state)
+                    state.save()
+                    self.show_savings_report()
                 
                 # URL del sitio
                 site_url = build_web_url(server)
                 
-                self.anim_finish(True, f"Se publicaron {published_count} artículo(s)", url=site_url)
-                self.set_status(f"✓ Publicados {published_count} artículos")
+                self.anim_finish(True, f"Se publicaron {total} artículo(s)", url=site_url)
+                self.set_status(f"✓ Publicados {total} artículos")
                 
             except Exception as e:
                 self.anim_finish(False, str(e))
                 self.set_status(f"Error: {str(e)}")
         
         # Mostrar ventana de animación y ejecutar
-        self.show_upload_animation(lambda: threading.Thread(target=do_upload).start())
+        self.show_upload_animation(lambda: self.engine.run_action(do_upload))
+
+    def open_build_state(self):
+        """Carga el estado de publicación asociado al servidor configurado"""
+        server = self.config.get("server")
+        target = f"{server.get('host', '')}:{server.get('remote_path', '')}"
+        return BuildState(self.articles.articles_path / BuildState.FILENAME, target)
+    
+    def upload_article_files(self, uploader, remote_path, relpaths, manifest=None):
+        """Sube los archivos de un artículo (datos JSON y página). Devuelve los bytes enviados"""
+        sent = 0
+        for relpath in relpaths:
+            sent += uploader.upload_with_variants(self.builder.output_file(relpath), f"{remote_path}/{relpath}")
+            if manifest:
+                manifest.add_file(relpath, self.builder.output_file(relpath))
+        return sent
+    
+    def transfer_progress(self, done, total, remote, sent, error):
+        """Línea del registro por cada archivo de una subida en paralelo (desde el hilo del bucle)"""
+        name = remote.rsplit('/', 1)[-1]
+        if error is None:
+            self.anim_add_line(f"  [{done}/{total}] {name[:35]} ({sent} bytes)")
+        else:
+            self.anim_add_line(f"  ✗ {name[:35]}: {error}")
+        self.anim_update_progress(done, total)
+    
+    def check_transfer(self, report):
+        """Falla si algún archivo de una subida en paralelo no llegó al servidor"""
+        if report.get('cancelled'):
+            raise InterruptedError(f"Transferencia cancelada ({report['files']} archivo(s) subidos)")
+        if report['errors']:
+            remote, message = report['errors'][0]
+            raise IOError(f"{len(report['errors'])} archivo(s) sin subir "
+                          f"(el primero, {remote}: {message})")
+    
+    def fetch_article_data(self, uploader, remote_path, filename):
+        """Descarga los datos de un artículo publicado.
+
+        Se intenta primero el <id>.json (más ligero) y, si no existe, la página HTML.
+        """
+        article_id = filename.replace('.html', '')
+        side_data = uploader.download_string(f"{remote_path}/{article_id}.json")
+        if side_data:
+            data = self.articles.extract_article_data(None, filename, side_data)
+            if data:
+                return data
+        
+        html_content = uploader.download_string(f"{remote_path}/{filename}")
+        if not html_content:
+            return None
+        return self.articles.extract_article_data(html_content, filename)
+    
+    def upload_listing_pages(self, uploader, remote_path, manifest=None):
+        """Regenera y sube solo las páginas del índice y archivos que han cambiado"""
+        state = self.open_build_state()
+        pages, stale = self.builder.build_listing_pages(state)
+        self.builder.precompress([page['path'] for page in pages])
+        
+        # Las páginas se suben en paralelo; index.html, solo cuando han llegado todas las demás
+        by_remote = {f"{remote_path}/{page['path']}": page for page in pages}
+        files = [(self.builder.output_file(page['path']), remote) for remote, page in by_remote.items()]
+        final = [item for item in files if by_remote[item[1]]['path'] == 'index.html']
+        files = [item for item in files if item not in final]
+        
+        def progress(done, total, remote, sent, error):
+            if error is None:
+                page = by_remote[remote]
+                state.update(page['path'], page['fingerprint'])
+                if manifest:
+                    manifest.add_file(page['path'], self.builder.output_file(page['path']))
+                self.anim_add_line(f"  ✓ {page['path']} actualizado")
+            else:
+                self.anim_add_line(f"  ✗ {by_remote[remote]['path']}: {error}")
+        
+        report = self.engine.run(self.engine.upload_many(files, progress, final=final, uploader=uploader))
+        if report['errors']:
+            # Lo que sí llegó queda anotado para no repetirlo en el próximo intento
+            state.save()
+            self.check_transfer(report)
+        
+        # Páginas que sobran (menos artículos, categorías o tags vacíos)
+        for path in stale:
+            try:
+                uploader.delete_with_variants(f"{remote_path}/{path}")
+            except Exception:
+                pass  # Ya no existía en el servidor
+            state.forget(path)
+            if manifest:
+                manifest.remove_file(path)
+            self.anim_add_line(f"  ✓ {path} eliminado")
+        
+        if not pages and not stale:
+            self.anim_add_line("  ✓ Índice sin cambios")
+        
+        self.upload_htaccess(uploader, remote_path, state)
+        state.save()
+        self.show_savings_report()
+        return len(pages)
+    
+    def show_savings_report(self):
+        """Muestra en el registro el ahorro de la minificación (build.minify)"""
+        report = self.builder.savings_report()
+        if report:
+            self.anim_add_line("")
+            self.anim_add_line("> Minificación:")
+            for line in report:
+                self.anim_add_line(f"  {line}")
+    
+    def upload_assets(self, uploader, remote_path, manifest=None):
+        """Sube los recursos estáticos (CSS y JS) que aún no están en el servidor.
 
+        El nombre de cada recurso lleva la huella de su contenido, así que basta
+        con saber si ese nombre ya se subió. Las versiones anteriores se dejan en
+        el servidor porque las páginas no republicadas siguen enlazándolas.
+        """
+        state = self.open_build_state()
+        relpaths = list(self.builder.build_assets().values())
+        self.builder.precompress(relpaths)
+        for relpath in relpaths:
+            if state.is_current(relpath, relpath):
+                continue
+            uploader.upload_with_variants(self.builder.output_file(relpath), f"{remote_path}/{relpath}")
+            state.update(relpath, relpath)
+            if manifest:
+                manifest.add_file(relpath, self.builder.output_file(relpath))
+            self.anim_add_line(f"  ✓ {relpath} subido")
+        state.save()
+    
+    def upload_images(self, uploader, remote_path, relpaths, manifest=None):
+        """Sube las variantes de imagen que aún no están en el servidor.
+
+        Igual que los recursos, llevan la huella en el nombre: si ya se subió
+        ese nombre, no hace falta volver a subirlo.
+        """
+        state = self.open_build_state()
+        for relpath in relpaths:
+            if state.is_current(relpath, relpath):
+                continue
+            uploader.upload_file(self.builder.output_file(relpath), f"{remote_path}/{relpath}")
+            state.update(relpath, relpath)
+            if manifest:
+                manifest.add_file(relpath, self.builder.output_file(relpath))
+            self.anim_add_line(f"  ✓ {relpath} subida")
+        state.save()
+    
+    def upload_htaccess(self, uploader, remote_path, state):
+        """Añade al .htaccess del servidor las reglas de caché y de variantes comprimidas"""
+        rules = self.builder.build_htaccess()
+        fingerprint = BuildState.fingerprint(rules)
+        if state.is_current('.htaccess', fingerprint):
+            return
+        
+        # Conservar las reglas que ya hubiera en el servidor
+        remote_file = f"{remote_path}/.htaccess"
+        existing = uploader.download_string(remote_file)
+        merged = SiteBuilder.merge_htaccess(existing, rules)
+        if merged != existing:
+            uploader.upload_string(merged, remote_file)
+            self.anim_add_line("  ✓ .htaccess actualizado")
+        state.update('.htaccess', fingerprint)
+    
     def import_from_server(self):
         """Importa artículos desde el servidor"""
         server = self.config.get("server")
@@ -1346,73 +1603,77 @@ class RetroCMSApp:
                 self.anim_add_line(f"> Conectando a {server['host']} ({protocol})...")
                 self.anim_set_status(f"Estableciendo conexión {protocol}...")
                 
-                uploader = FileUploader(self.config)
-                uploader.connect()
-                
-                self.anim_add_line("  ✓ Conexión establecida")
-                time.sleep(0.2)
-                
-                self.anim_add_line("")
-                self.anim_add_line("> Listando archivos remotos...")
-                remote_path = server['remote_path']
-                
-                # Listar archivos
-                files = uploader.list_files(remote_path)
-                
-                # Filtrar solo .html ignorando index.html y articulo.html (plantilla)
-                article_files = [
-                    f for f in files 
-                    if f.endswith('.html') and f not in ['index.html', 'articulo.html']
-                ]
-                
-                self.anim_add_line(f"  ✓ Encontrados {len(article_files)} artículos")
-                
-                if not article_files:
-                    self.anim_add_line("  ! No hay artículos para importar")
-                    time.sleep(1)
-                    uploader.disconnect()
-                    self.anim_finish(True, "No se encontraron artículos nuevos")
-                    return
+                with self.connections.session() as uploader:
+                    self.anim_add_line(f"  ✓ {self.connections.describe(uploader)}")
+                    time.sleep(0.2)
+                
+                    self.anim_add_line("")
+                    self.anim_add_line("> Leyendo manifiesto del servidor...")
+                    remote_path = server['remote_path']
+                    manifest = RemoteManifest(remote_path).load(uploader)
+                
+                    if manifest.found:
+                        # Solo se descargan los artículos nuevos o cambiados en el servidor
+                        pending = self.plan_import(manifest)
+                        overwrite = {filename for filename, replace in pending if replace}
+                        article_files = [filename for filename, _ in pending]
+                        self.anim_add_line(f"  ✓ {len(manifest.articles)} artículos en el servidor: "
+                                           f"{len(article_files) - len(overwrite)} nuevos, "
+                                           f"{len(overwrite)} con cambios")
+                    else:
+                        self.anim_add_line("  ! Sin manifiesto: listando archivos remotos...")
+                        files = uploader.list_files(remote_path)
+                    
+                        # Filtrar solo .html ignorando index.html y articulo.html (plantilla)
+                        article_files = [
+                            f for f in files 
+                            if f.endswith('.html') and f not in ['index.html', 'articulo.html']
+                        ]
+                        overwrite = set()
+                        self.anim_add_line(f"  ✓ Encontrados {len(article_files)} artículos")
+                
+                    if not article_files:
+                        self.anim_add_line("  ! No hay artículos para importar")
+                        time.sleep(1)
+                        self.anim_finish(True, "No se encontraron artículos nuevos")
+                        return
 
-                total = len(article_files)
-                imported_count = 0
+                    total = len(article_files)
+                    imported_count = 0
                 
-                self.anim_add_line("")
-                self.anim_add_line("> Iniciando descarga e importación...")
-                self.anim_add_line("")
+                    self.anim_add_line("")
+                    self.anim_add_line("> Iniciando descarga e importación...")
+                    self.anim_add_line("")
                 
-                for i, filename in enumerate(article_files):
-                    self.anim_add_line(f"  [{i+1}/{total}] {filename}")
-                    self.anim_set_status(f"Importando: {filename}...")
-                    self.anim_update_progress(i, total)
+                    for i, filename in enumerate(article_files):
+                        self.anim_add_line(f"  [{i+1}/{total}] {filename}")
+                        self.anim_set_status(f"Importando: {filename}...")
+                        self.anim_update_progress(i, total)
                     
-                    # Descargar contenido
-                    remote_file = f"{remote_path}/{filename}"
-                    content = uploader.download_string(remote_file)
+                        # Descargar datos (<id>.json o, si no hay, la página)
+                        data = self.fetch_article_data(uploader, remote_path, filename)
                     
-                    if content:
-                        # Importar (overwrite=False para respetar locales)
-                        article = self.articles.import_article_from_html(content, filename, overwrite=False)
-                        if article:
-                            self.anim_add_line(f"        → Importado: {article['title'][:30]}")
-                            imported_count += 1
-                        else:
-                            # Puede devolver None si falló O si ya existía (y overwrite=False)
-                            # Verificamos si existe para dar mensaje adecuado
-                            article_id = filename.replace('.html', '')
-                            if self.articles.get_article(article_id):
-                                self.anim_add_line(f"        → Omitido (Ya existe localmente)")
+                        if data:
+                            # Importar (sin sobrescribir los locales, salvo los que han cambiado en el servidor)
+                            article = self.articles.create_or_update_article(
+                                data, force_id=data.get('id'), overwrite=filename in overwrite)
+                            if article:
+                                self.anim_add_line(f"        → Importado: {article['title'][:30]}")
+                                imported_count += 1
                             else:
-                                self.anim_add_line("        ✗ Fallo al importar")
-                    else:
-                        self.anim_add_line("        ✗ Fallo al descargar")
+                                # Puede devolver None si falló O si ya existía (y overwrite=False)
+                                # Verificamos si existe para dar mensaje adecuado
+                                article_id = filename.replace('.html', '')
+                                if self.articles.get_article(article_id):
+                                    self.anim_add_line(f"        → Omitido (Ya existe localmente)")
+                                else:
+                                    self.anim_add_line("        ✗ Fallo al importar")
+                        else:
+                            self.anim_add_line("        ✗ Fallo al descargar")
                         
-                    time.sleep(0.1)
+                        time.sleep(0.1)
                 
-                self.anim_update_progress(total, total)
-                self.anim_add_line("")
-                self.anim_add_line("> Cerrando conexión...")
-                uploader.disconnect()
+                    self.anim_update_progress(total, total)
                 
                 self.anim_finish(True, f"Se importaron {imported_count} artículo(s)")
                 self.set_status(f"✓ Importados {imported_count} artículos")
@@ -1425,8 +1686,24 @@ class RetroCMSApp:
                 self.set_status(f"Error: {str(e)}")
 
         # Mostrar ventana de animación y ejecutar
-        self.show_upload_animation(lambda: threading.Thread(target=do_import).start())
+        self.show_upload_animation(lambda: self.engine.run_action(do_import))
+
+    def plan_import(self, manifest):
+        """Artículos del manifiesto que hay que descargar: [(archivo, sobrescribir)].
 
+        Se descargan los que no existen en local y los que han cambiado en el
+        servidor después de la última modificación local; el resto ni se abre.
+        """
+        pending = []
+        for article_id, entry in sorted(manifest.articles.items()):
+            local = self.articles.get_article(article_id)
+            if local is None:
+                pending.append((f"{article_id}.html", False))
+            elif (RemoteManifest.content_hash(local) != entry['hash']
+                  and entry.get('modified', '') > local.get('modified', '')):
+                pending.append((f"{article_id}.html", True))
+        return pending
+    
     def download_as_markdown(self):
         """Descarga artículos del servidor como archivos Markdown"""
         server = self.config.get("server")
@@ -1452,37 +1729,34 @@ class RetroCMSApp:
                 self.anim_add_line(f"> Conectando a {server['host']}...")
                 self.anim_set_status(f"Conectando {protocol}...")
                 
-                uploader = FileUploader(self.config)
-                uploader.connect()
-                
-                self.anim_add_line("  ✓ Conexión establecida")
+                with self.connections.session() as uploader:
+                    self.anim_add_line(f"  ✓ {self.connections.describe(uploader)}")
                 
-                remote_path = server['remote_path']
-                files = uploader.list_files(remote_path)
-                article_files = [f for f in files if f.endswith('.html') and f not in ['index.html', 'articulo.html']]
+                    remote_path = server['remote_path']
+                    manifest = RemoteManifest(remote_path).load(uploader)
+                    if manifest.found:
+                        article_files = [f"{article_id}.html" for article_id in sorted(manifest.articles)]
+                    else:
+                        files = uploader.list_files(remote_path)
+                        article_files = [f for f in files if f.endswith('.html') and f not in ['index.html', 'articulo.html']]
                 
-                if not article_files:
-                    self.anim_add_line("  ! No hay artículos")
-                    uploader.disconnect()
-                    self.anim_finish(True, "Sin artículos")
-                    return
+                    if not article_files:
+                        self.anim_add_line("  ! No hay artículos")
+                        self.anim_finish(True, "Sin artículos")
+                        return
 
-                total = len(article_files)
-                count = 0
+                    total = len(article_files)
+                    count = 0
                 
-                self.anim_add_line(f"> Descargando {total} artículos...")
+                    self.anim_add_line(f"> Descargando {total} artículos...")
                 
-                for i, filename in enumerate(article_files):
-                    self.anim_add_line(f"  [{i+1}/{total}] {filename}")
-                    self.anim_update_progress(i, total)
+                    for i, filename in enumerate(article_files):
+                        self.anim_add_line(f"  [{i+1}/{total}] {filename}")
+                        self.anim_update_progress(i, total)
                     
-                    # Descargar
-                    remote_file = f"{remote_path}/{filename}"
-                    content = uploader.download_string(remote_file)
+                        # Descargar datos (<id>.json o, si no hay, la página)
+                        data = self.fetch_article_data(uploader, remote_path, filename)
                     
-                    if content:
-                        # Extraer datos sin guardar
-                        data = self.articles.extract_article_data(content, filename)
                         if data:
                             # Crear contenido Markdown
                             md_content = f"""---
@@ -1497,19 +1771,18 @@ date: {data.get('created', '')}
                             # Guardar archivo .md
                             slug = data.get('id', filename.replace('.html', ''))
                             local_path = os.path.join(dest_dir, f"{slug}.md")
-                            
+                        
                             with open(local_path, 'w', encoding='utf-8') as f:
                                 f.write(md_content)
-                                
+                            
                             self.anim_add_line(f"        → Guardado: {slug}.md")
                             count += 1
                         else:
                             self.anim_add_line("        ✗ Error extrayendo datos")
                     
-                    time.sleep(0.1)
+                        time.sleep(0.1)
                 
-                self.anim_update_progress(total, total)
-                uploader.disconnect()
+                    self.anim_update_progress(total, total)
                 
                 self.anim_finish(True, f"Descargados {count} archivos .md")
                 self.set_status(f"✓ Descarga completada en {dest_dir}")
@@ -1518,15 +1791,19 @@ date: {data.get('created', '')}
                 self.anim_finish(False, str(e))
                 self.set_status(f"Error: {str(e)}")
 
-        self.show_upload_animation(lambda: threading.Thread(target=do_download).start())
+        self.show_upload_animation(lambda: self.engine.run_action(do_download))
     
     def set_status(self, message):
         """Actualiza la barra de estado"""
+        if not self.in_ui_thread(self.set_status, message):
+            return
         self.status_var.set(f">> {message}")
         self.root.update_idletasks()
     
     def cleanup(self):
-        """Limpia archivos temporales al cerrar"""
+        """Limpia archivos temporales y cierra las conexiones al salir"""
+        self.engine.close()
+        self.connections.close()
         preview_file = Path("preview.html")
         if preview_file.exists():
             try:
@@ -18,17 +18,61 @@ class ArticleManager:
         self.articles_path.mkdir(parents=True, exist_ok=True)
         self.index_file = self.articles_path / "index.json"
         self.articles = self.load_index()
+        self._entries = None
     
     def load_index(self):
         if self.index_file.exists():
             with open(self.index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                index = json.load(f)
+            self._complete_index(index)
+            return index
         return {"articles": []}
     
+    def _complete_index(self, index):
+        """Añade a un índice antiguo los campos que faltan (subtítulo y fecha de modificación).
+
+        Solo se leen una vez los artículos afectados; después el índice basta
+        para el feed y el sitemap sin abrir cada artículo.
+        """
+        completed = False
+        for idx, art in enumerate(index.get("articles", [])):
+            if "modified" in art:
+                continue
+            article = self.get_article(art["id"])
+            if article:
+                index["articles"][idx] = self.index_entry(article)
+            else:
+                art.setdefault("subtitle", "")
+                art["modified"] = art.get("created", "")
+            completed = True
+        if completed:
+            with open(self.index_file, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=4, ensure_ascii=False)
+    
+    @staticmethod
+    def index_entry(article):
+        """Datos de un artículo que se guardan en el índice"""
+        return {
+            "id": article["id"],
+            "title": article["title"],
+            "subtitle": article.get("subtitle", ""),
+            "category": article["category"],
+            "created": article["created"],
+            "modified": article.get("modified", article["created"]),
+            "published": article.get("published", False)
+        }
+    
     def save_index(self):
+        self._entries = None
         with open(self.index_file, 'w', encoding='utf-8') as f:
             json.dump(self.articles, f, indent=4, ensure_ascii=False)
     
+    def get_index_entry(self, article_id):
+        """Entrada del índice de un artículo, sin leer el artículo (None si no está)"""
+        if self._entries is None:
+            self._entries = {art['id']: art for art in self.list_articles()}
+        return self._entries.get(article_id)
+    
     def create_article(self, data):
         """Crea un nuevo artículo"""
         slug = self.slugify(data['title'])
@@ -52,13 +96,7 @@ class ArticleManager:
             json.dump(article, f, indent=4, ensure_ascii=False)
         
         # Actualizar índice
-        self.articles["articles"].append({
-            "id": slug,
-            "title": data['title'],
-            "category": data['category'],
-            "created": article['created'],
-            "published": data.get('published', False)
-        })
+        self.articles["articles"].append(self.index_entry(article))
         self.save_index()
         
         return article
@@ -82,11 +120,7 @@ class ArticleManager:
         # Actualizar índice
         for idx, art in enumerate(self.articles["articles"]):
             if art["id"] == article_id:
-                self.articles["articles"][idx].update({
-                    "title": article['title'],
-                    "category": article['category'],
-                    "published": article.get('published', False)
-                })
+                self.articles["articles"][idx] = self.index_entry(article)
                 break
         self.save_index()
         
@@ -129,16 +163,24 @@ class ArticleManager:
         text = text.strip('-')
         return text
 
-    def extract_article_data(self, html_content, filename):
-        """Extrae los datos del artículo desde el HTML sin guardar."""
+    def extract_article_data(self, html_content, filename, side_data=None):
+        """Extrae los datos del artículo sin guardar.
+
+        Si se pasa el contenido del <id>.json publicado junto a la página se usa
+        ese; si no, se buscan en el HTML.
+        """
         import json
         import re
         
-        # Estrategia 1: Buscar JSON incrustado
-        json_match = re.search(r'<script type="application/json" id="ctpfa-data">(.*?)</script>', html_content, re.DOTALL)
-        if json_match:
+        # Estrategia 1: JSON aparte (<id>.json) o incrustado en la página
+        json_sources = [side_data] if side_data else []
+        if html_content:
+            json_match = re.search(r'<script type="application/json" id="ctpfa-data">(.*?)</script>', html_content, re.DOTALL)
+            if json_match:
+                json_sources.append(json_match.group(1))
+        for source in json_sources:
             try:
-                data = json.loads(json_match.group(1))
+                data = json.loads(source)
                 if all(k in data for k in ['title', 'content', 'category']):
                     data['published'] = True
                     # Asegurar ID
@@ -147,6 +189,9 @@ class ArticleManager:
                     return data
             except json.JSONDecodeError:
                 pass
+        
+        if not html_content:
+            return None
 
         # Estrategia 2: Parsing Best Effort (Legacy)
         try:
@@ -184,9 +229,9 @@ class ArticleManager:
             print(f"Error extrayendo datos legacy: {e}")
             return None
 
-    def import_article_from_html(self, html_content, filename, overwrite=False):
-        """Importa un artículo desde su contenido HTML."""
-        data = self.extract_article_data(html_content, filename)
+    def import_article_from_html(self, html_content, filename, overwrite=False, side_data=None):
+        """Importa un artículo desde su contenido HTML (o su <id>.json)."""
+        data = self.extract_article_data(html_content, filename, side_data)
         if data:
             return self.create_or_update_article(data, force_id=data.get('id'), overwrite=overwrite)
         return None
@@ -227,13 +272,7 @@ class ArticleManager:
                 json.dump(article, f, indent=4, ensure_ascii=False)
             
             # Actualizar índice
-            self.articles["articles"].append({
-                "id": article_id,
-                "title": data['title'],
-                "category": data['category'],
-                "created": article['created'],
-                "published": True
-            })
+            self.articles["articles"].append(self.index_entry(article))
             self.save_index()
             return article
     def _html_to_markdown_basic(self, html):
@@ -0,0 +1,374 @@
+"""
+Transferencias con asyncio para CTPFA CMS
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+
+# Archivos preparados que pueden esperar turno por cada sesión (contrapresión)
+QUEUE_PER_SESSION = 4
+
+
+class AsyncTransferEngine:
+    """Subidas y descargas en paralelo con asyncio, junto a FileUploader.
+
+    Las sesiones FTP/SFTP siguen siendo bloqueantes: cada operación se
+    ejecuta en un pool de hilos acotado (server.max_connections hilos) y un
+    semáforo limita las operaciones en curso de todos los lotes a la vez.
+    Cada lote reparte sus archivos entre varias sesiones del pool de
+    conexiones, que los toman de una cola de tamaño limitado: si la subida
+    va más lenta que la generación de páginas (render_many), la generación
+    espera en lugar de acumular archivos.
+
+    Las corrutinas se ejecutan en un único hilo con el bucle de eventos
+    (start); desde otros hilos se usan run, submit y cancel. El progreso
+    se notifica en ese hilo, nunca en paralelo consigo mismo. Las acciones
+    de la interfaz, bloqueantes, van a un único hilo de acciones
+    (run_action) en lugar de a un hilo nuevo cada vez.
+    """
+
+    # Fin de la cola de archivos
+    _DONE = object()
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.loop = None
+        self._thread = None
+        self._limit = None
+        self._slots = None
+        self._executor = None
+        # Generación de archivos y acciones de la interfaz: un hilo cada una
+        self._render_executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="ctpfa-render")
+        self._actions = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="ctpfa-action")
+        # Lotes en curso y acción de la interfaz en curso (para cancel)
+        self._batches = []
+        self._action = None
+        # Para el código bloqueante que espera un TransferEngine (p. ej. SyncPlanner.execute)
+        self.blocking = BlockingTransfers(self)
+
+    def start(self):
+        """Arranca el hilo del bucle de eventos si no está en marcha"""
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop_thread, args=(self.loop,), name="ctpfa-loop",
+                                            daemon=True)
+            self._thread.start()
+        return self.loop
+
+    @staticmethod
+    def _loop_thread(loop):
+        loop.run_forever()
+        loop.close()
+
+    def submit(self, coro):
+        """Programa una corrutina en el bucle; devuelve un concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro):
+        """Ejecuta una corrutina en el bucle y espera su resultado (desde otro hilo)"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("run() bloquearía el hilo del bucle de eventos: usa await")
+        return self.submit(coro).result()
+
+    def run_action(self, action):
+        """Ejecuta una acción bloqueante de la interfaz en el hilo de acciones.
+
+        Las acciones van de una en una; dentro, las transferencias se hacen con
+        run(...) sobre el bucle de eventos. Tras cancel, los lotes que la
+        acción empiece después también se dan por cancelados.
+        """
+        def perform():
+            self._action = {'cancelled': False}
+            try:
+                return action()
+            finally:
+                self._action = None
+        return self._actions.submit(perform)
+
+    def cancel(self):
+        """Cancela los lotes en curso (desde cualquier hilo).
+
+        Las operaciones que ya están en marcha no se pueden interrumpir: se
+        espera a que terminen y las sesiones vuelven al pool. Cada lote
+        devuelve su informe con lo que no llegó a hacerse como error
+        ("Transferencia cancelada") y sin los finales, como si hubiera
+        fallado: el manifiesto y el estado de publicación recogen lo que sí llegó.
+        """
+        action = self._action
+        if action is not None:
+            action['cancelled'] = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._cancel_batches)
+
+    def _cancel_batches(self):
+        for batch in self._batches:
+            batch['cancelled'] = True
+            for task in batch['tasks']:
+                task.cancel()
+
+    def close(self):
+        """Cancela lo pendiente y, cuando los lotes terminan, detiene el bucle y los hilos"""
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+            self.loop = None
+        for executor in (self._executor, self._render_executor, self._actions):
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    async def upload_many(self, files, progress=None, final=(), uploader=None, atomic=None):
+        """Sube [(ruta local, ruta remota)] y, después, los archivos de 'final'.
+
+        Los de 'final' (p. ej. index.html) solo se suben si todo lo anterior
+        ha llegado bien, para que el sitio nunca enlace páginas que no están.
+        Si el llamante ya tiene una sesión del pool la puede pasar en
+        'uploader': la usa uno de los trabajadores, así que no cuenta dos veces.
+
+        progress(hechos, total, ruta remota, bytes, error) se llama tras cada
+        archivo. Devuelve un dict con 'files', 'bytes', 'errors' (lista de
+        (ruta remota, mensaje)), 'skipped' (los finales que no se subieron) y
+        'cancelled'. 'atomic' se pasa a FileUploader.upload_with_variants.
+
+        'files' también puede ser un iterable asíncrono, p. ej. render_many:
+        la subida empieza con el primer archivo generado. En ese caso el total que recibe progress
+        crece a medida que llegan y, si se cancela, solo constan como
+        cancelados los archivos que llegaron a generarse.
+        """
+        def upload(session, job):
+            local, remote = job
+            return session.upload_with_variants(local, remote, atomic)
+        return await self._batch(upload, files, final, progress, uploader)
+
+    async def move_many(self, moves, progress=None, final=(), uploader=None):
+        """Mueve en el servidor [(ruta local, origen, destino)] con sus variantes.
+
+        Igual que upload_many, pero solo renombra: sirve para pasar a su
+        sitio lo que se ha subido antes a otro directorio. La ruta local
+        indica qué variantes comprimidas acompañan a cada archivo.
+        """
+        def move(session, job):
+            local, source, target = job
+            return session.rename_with_variants(source, target, local)
+        return await self._batch(move, moves, final, progress, uploader)
+
+    async def download_many(self, files, progress=None, uploader=None):
+        """Descarga [(ruta local, ruta remota)] a disco con FileUploader.download_file.
+
+        Devuelve el mismo informe que upload_many; un archivo remoto que no
+        existe cuenta como error.
+        """
+        def download(session, job):
+            local, remote = job
+            received = session.download_file(remote, local)
+            if received is None:
+                raise FileNotFoundError(f"No existe en el servidor: {remote}")
+            return received
+        return await self._batch(download, files, (), progress, uploader)
+
+    async def render_many(self, items, build):
+        """Genera en segundo plano los archivos de cada elemento, según se vayan pidiendo.
+
+        build(elemento) se ejecuta en el hilo de generación y devuelve
+        [(ruta local, ruta remota)]. Pasado a upload_many, no se genera el
+        siguiente elemento mientras la cola de subida esté llena.
+        """
+        for item in items:
+            for job in await self._wait(self._render_executor.submit(build, item)):
+                yield job
+
+    async def _shutdown(self):
+        self._cancel_batches()
+        waiting = [batch['task'] for batch in self._batches]
+        if waiting:
+            await asyncio.wait(waiting)
+        asyncio.get_running_loop().stop()
+
+    async def _batch(self, operation, jobs, final, progress, uploader):
+        """Aplica la operación a los trabajos en paralelo y después, si nada ha fallado, a los finales"""
+        iterable = hasattr(jobs, '__aiter__')
+        if not iterable:
+            jobs = list(jobs)
+        final = list(final)
+        report = {'files': 0, 'bytes': 0, 'errors': [], 'skipped': [], 'cancelled': False}
+        action = self._action
+        # 'fed': trabajos entregados a la cola (los de un iterable, según llegan)
+        batch = {'total': len(final) + (0 if iterable else len(jobs)),
+                 'fed': [] if iterable else jobs,
+                 'report': report, 'progress': progress, 'done': set(),
+                 'cancelled': action is not None and action['cancelled'],
+                 'tasks': [], 'task': asyncio.current_task()}
+        self._batches.append(batch)
+        try:
+            if not batch['cancelled']:
+                await self._run(operation, jobs, batch, uploader)
+            if not report['errors'] and not batch['cancelled']:
+                await self._run(operation, final, batch, uploader)
+        finally:
+            self._batches.remove(batch)
+
+        report['cancelled'] = batch['cancelled']
+        if batch['cancelled']:
+            # Lo que quedaba de la tanda en curso falla; los finales sin empezar se omiten.
+            # De un iterable solo constan los trabajos que llegó a entregar
+            fed = batch['fed']
+            started = fed if any(job[-1] not in batch['done'] for job in fed) else final
+            for job in started:
+                if job[-1] not in batch['done']:
+                    self._record(batch, job, 0, InterruptedError("Transferencia cancelada"))
+        if report['errors']:
+            report['skipped'] = [job[-1] for job in final if job[-1] not in batch['done']]
+        return report
+
+    async def _run(self, operation, jobs, batch, uploader):
+        """Procesa una tanda de trabajos con varias sesiones y espera a que terminen todos"""
+        workers = self.pool.limit()
+        if isinstance(jobs, list):
+            if not jobs:
+                return
+            workers = min(workers, len(jobs))
+        queue = asyncio.Queue(maxsize=self.pool.limit() * QUEUE_PER_SESSION)
+        batch['alive'] = workers
+        tasks = [asyncio.create_task(self._feed(jobs, queue, batch))]
+        tasks += [asyncio.create_task(self._worker(operation, queue, batch, uploader if i == 0 else None))
+                  for i in range(workers)]
+        batch['tasks'] = tasks
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            if not batch['cancelled']:
+                raise
+        finally:
+            # gather acaba en cuanto falla o se cancela una tarea: las demás paran y,
+            # antes de seguir, terminan lo que tienen en marcha y devuelven su sesión
+            for task in tasks:
+                task.cancel()
+            await self._settle(asyncio.wait(tasks), lambda: all(task.done() for task in tasks))
+
+    async def _feed(self, jobs, queue, batch):
+        """Pone los trabajos en la cola; si está llena, espera (y con ella la generación)"""
+        if isinstance(jobs, list):
+            for job in jobs:
+                await queue.put(job)
+        else:
+            async for job in jobs:
+                batch['total'] += 1
+                batch['fed'].append(job)
+                await queue.put(job)
+        await queue.put(self._DONE)
+
+    async def _worker(self, operation, queue, batch, uploader=None):
+        """Toma trabajos de la cola mientras su sesión funcione"""
+        own_session = uploader is None
+        error = None
+        if own_session:
+            try:
+                # Las sesiones extra no esperan: si el servidor no admite más, sobran
+                uploader = await self._call(self.pool.acquire, False, late=self.pool.release)
+                if uploader is None:
+                    error = ConnectionError("Sin conexiones libres con el servidor")
+            except Exception as e:
+                error = e
+        try:
+            while error is None:
+                job = await queue.get()
+                if job is self._DONE:
+                    queue.put_nowait(job)  # Para los demás
+                    return
+                try:
+                    # Si se cancela mientras está en marcha y acaba bien, cuenta como hecho
+                    sent = await self._call(operation, uploader, job,
+                                            late=lambda sent, job=job: self._record(batch, job, sent, None))
+                except Exception as e:
+                    self._record(batch, job, 0, e)
+                    # Los reintentos y la reconexión ya los hace la sesión (ver retry.py)
+                    if self.pool.breaker.is_open() or not await self._call(uploader.is_alive):
+                        error = e
+                else:
+                    self._record(batch, job, sent, None)
+        finally:
+            if own_session and uploader is not None:
+                self.pool.release(uploader)
+
+        # Sin sesión: si era la última, lo que queda en la cola falla con ese error
+        batch['alive'] -= 1
+        if batch['alive']:
+            return
+        while True:
+            job = await queue.get()
+            if job is self._DONE:
+                queue.put_nowait(job)
+                return
+            self._record(batch, job, 0, error)
+
+    @staticmethod
+    def _record(batch, job, sent, error):
+        report = batch['report']
+        batch['done'].add(job[-1])
+        if error is None:
+            report['files'] += 1
+            report['bytes'] += sent or 0
+        else:
+            report['errors'].append((job[-1], str(error)))
+        if batch['progress']:
+            done = report['files'] + len(report['errors'])
+            batch['progress'](done, batch['total'], job[-1], sent, error)
+
+    def _slots_for_limit(self):
+        """Semáforo y pool de hilos a la medida de server.max_connections"""
+        limit = self.pool.limit()
+        if limit != self._limit:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = concurrent.futures.ThreadPoolExecutor(limit, thread_name_prefix="ctpfa-transfer")
+            self._slots = asyncio.Semaphore(limit)
+            self._limit = limit
+        return self._slots
+
+    async def _call(self, function, *args, late=None):
+        """Ejecuta una llamada bloqueante en el pool de hilos, con el semáforo"""
+        async with self._slots_for_limit():
+            return await self._wait(self._executor.submit(function, *args), late)
+
+    @staticmethod
+    async def _wait(future, late=None):
+        """Espera un concurrent.futures.Future desde el bucle.
+
+        Si se cancela la espera, la llamada que ya está en marcha no se puede
+        interrumpir: se espera a que termine (para no devolver al pool una
+        sesión ocupada) y, si ha dado resultado, se pasa a late(resultado).
+        """
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            await AsyncTransferEngine._settle(asyncio.wrap_future(future), future.done)
+            if late is not None and not future.cancelled() and future.exception() is None:
+                late(future.result())
+            raise
+
+    @staticmethod
+    async def _settle(awaitable, done):
+        """Espera hasta que done() sea cierto aunque vuelvan a cancelar la espera"""
+        waiter = asyncio.ensure_future(awaitable)
+        while not done():
+            try:
+                await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                pass
+
+
+class BlockingTransfers:
+    """Misma interfaz que TransferEngine, pero los lotes van por el bucle de AsyncTransferEngine.
+
+    Sirve para el código bloqueante (p. ej. SyncPlanner.execute) que se
+    ejecuta fuera del hilo del bucle: así esos lotes también se pueden cancelar.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def upload_many(self, files, progress=None, final=(), uploader=None, atomic=None):
+        return self.engine.run(self.engine.upload_many(files, progress, final, uploader, atomic))
+
+    def move_many(self, moves, progress=None, final=(), uploader=None):
+        return self.engine.run(self.engine.move_many(moves, progress, final, uploader))
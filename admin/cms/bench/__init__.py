@@ -0,0 +1,9 @@
+"""
+Mediciones de rendimiento de CTPFA CMS
+
+No forman parte de la aplicación: cada módulo es un script que genera un
+corpus sintético en un directorio temporal y mide una parte del CMS. Se
+ejecutan desde admin/, p. ej.:
+
+    python -m cms.bench.index_build --articles 10000
+"""
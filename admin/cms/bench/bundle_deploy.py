@@ -0,0 +1,102 @@
+"""
+Medición: sincronización completa en paquete (tar.gz por SSH) o archivo a archivo
+
+Genera el sitio, lo sincroniza con un servidor SFTP local detrás de un
+proxy con latencia y comprueba que el servidor queda igual que la salida
+local. Después cambia un artículo y vuelve a sincronizar.
+"""
+
+import argparse
+import filecmp
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from ..connection_pool import ConnectionPool
+from ..html_generator import HTMLGenerator
+from ..site_builder import SiteBuilder
+from ..sync import SyncPlanner
+from ..transfer import TransferEngine
+from .corpus import make_config, make_articles
+from .servers import start_proxy, start_sftp
+
+
+def check(builder, relpaths, site):
+    """Comprueba que el servidor tiene lo mismo que la salida local y lo que no es del CMS"""
+    for relpath in relpaths:
+        if relpath == '.htaccess':
+            continue
+        for suffix in ('', '.gz', '.br'):
+            local = builder.output_file(relpath + suffix)
+            if local.exists() and not filecmp.cmp(local, site / (relpath + suffix), shallow=False):
+                raise AssertionError(f"{relpath + suffix} no coincide en el servidor")
+    if (site / "ajeno.txt").read_text() != "no es del CMS":
+        raise AssertionError("se ha perdido un archivo que no es del CMS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el despliegue en paquete por SSH")
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--delay", type=float, default=0.02, help="segundos en cada sentido")
+    parser.add_argument("--files", action="store_true", help="archivo a archivo (sin paquete)")
+    parser.add_argument("--no-exec", action="store_true", help="el servidor no permite órdenes por SSH")
+    parser.add_argument("--symlink", action="store_true",
+                        help="la ruta remota es un enlace simbólico (cambio atómico del enlace)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ctpfa-bench-") as workdir:
+        workdir = Path(workdir)
+        site = workdir / "remote" / "site"
+        if args.symlink:
+            (workdir / "remote" / "site.actual").mkdir(parents=True)
+            site.symlink_to("site.actual")
+        else:
+            site.mkdir(parents=True)
+        (site / "ajeno.txt").write_text("no es del CMS")
+
+        port = start_proxy(start_sftp(exec_allowed=not args.no_exec), args.delay)
+        config = make_config(workdir, server={
+            "protocol": "sftp", "host": "127.0.0.1", "port": port, "username": "bench",
+            "password": "bench", "remote_path": str(site), "bundle_deploy": not args.files,
+        })
+        articles = make_articles(config, args.articles)
+        builder = SiteBuilder(articles, HTMLGenerator(articles, config), config)
+        planner = SyncPlanner(builder)
+        pool = ConnectionPool(config)
+        engine = TransferEngine(pool)
+
+        def sync(label):
+            relpaths = builder.build_site()
+            with pool.session() as uploader:
+                start = time.perf_counter()
+                plan = planner.plan(uploader, str(site), relpaths)
+                report = planner.execute(plan, engine, uploader, str(site))
+                elapsed = time.perf_counter() - start
+            if report['errors']:
+                raise AssertionError(f"errores: {report['errors'][:3]}")
+            check(builder, relpaths, site)
+            how = "paquete" if report['bundle'] else f"archivo a archivo ({report.get('bundle_error') or 'sin paquete'})"
+            print(f"{label}: {elapsed:.2f} s, {report['files']} archivos, {report['bytes']} bytes, {how}")
+
+        try:
+            sync(f"Primera sincronización de {args.articles} artículos")
+            article = articles.get_article("a00005")
+            article["content"] += "\n\nCambiado."
+            with open(articles.articles_path / "a00005.json", 'w', encoding='utf-8') as f:
+                json.dump(article, f, ensure_ascii=False)
+            sync("Un artículo cambiado")
+        finally:
+            pool.close()
+
+        leftovers = [path.name for path in site.parent.iterdir()
+                     if path.name.endswith((".ctpfa-new", ".ctpfa-old", ".ctpfa-link"))]
+        if leftovers:
+            raise AssertionError(f"quedan directorios temporales: {leftovers}")
+        if args.symlink:
+            print(f"{site.name} -> {os.readlink(site)}")
+
+
+if __name__ == "__main__":
+    main()
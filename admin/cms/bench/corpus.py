@@ -0,0 +1,72 @@
+"""
+Corpus sintético para las mediciones de CTPFA CMS
+"""
+
+import json
+import random
+from pathlib import Path
+
+from ..config import ConfigManager
+from ..articles import ArticleManager
+
+
+# Campos de cada artículo en articles/index.json
+INDEX_KEYS = ("id", "title", "subtitle", "category", "created", "modified", "published")
+
+CATEGORIES = ["TECNOLOGÍA", "VIDEOJUEGOS", "MÚSICA", "CINE", "INTERNET", "HARDWARE", "SOFTWARE", "CULTURA"]
+
+
+def make_config(workdir, **sections):
+    """ConfigManager con los valores por defecto y todo lo local dentro de workdir.
+
+    Cada argumento con nombre es una sección cuyos valores se cambian,
+    p. ej. build={"related": 0}.
+    """
+    workdir = Path(workdir)
+    config = json.loads(json.dumps(ConfigManager.DEFAULT_CONFIG))
+    config["local"].update({
+        "articles_path": str(workdir / "articles"),
+        "output_path": str(workdir / "public"),
+        "images_path": str(workdir / "images"),
+    })
+    for section, values in sections.items():
+        config.setdefault(section, {}).update(values)
+    config_file = workdir / "config.json"
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4, ensure_ascii=False)
+    return ConfigManager(str(config_file))
+
+
+def make_articles(config, count, words=300, vocabulary=5000, seed=1):
+    """Crea 'count' artículos publicados y devuelve su ArticleManager.
+
+    El texto sale de un vocabulario con frecuencias de Zipf (pocas palabras
+    muy repetidas y muchas raras, como en un texto real); la semilla fija
+    hace que dos ejecuciones generen el mismo corpus.
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"palabra{i}" for i in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    tags = [f"tag{i}" for i in range(60)]
+
+    articles = ArticleManager(config)
+    entries = []
+    for i in range(count):
+        article = {
+            "id": f"a{i:05d}",
+            "title": f"Artículo {i}",
+            "subtitle": "Subtítulo",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "content": "Hola **mundo**.\n\n" + " ".join(rng.choices(vocabulary, weights, k=words)),
+            "tags": rng.sample(tags, 3),
+            "author": "Admin",
+            "created": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}",
+            "modified": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}",
+            "published": True,
+        }
+        with open(articles.articles_path / f"{article['id']}.json", 'w', encoding='utf-8') as f:
+            json.dump(article, f, ensure_ascii=False)
+        entries.append({key: article[key] for key in INDEX_KEYS})
+    articles.articles = {"articles": entries}
+    articles.save_index()
+    return articles
@@ -0,0 +1,70 @@
+"""
+Medición: generación de index.html (lecturas de artículos y tiempo)
+
+Compara la pasada única de collect_index_data con el camino anterior de
+tres pasadas (generate_index_cards, generate_tag_cloud y el recuento de
+publicados, cada una leyendo todos los artículos).
+"""
+
+import argparse
+import tempfile
+import time
+
+from ..html_generator import HTMLGenerator
+from .corpus import make_config, make_articles
+
+
+def three_pass_index(generator, articles):
+    """index.html como se generaba antes: una pasada para cada dato"""
+    cards_html = generator.generate_index_cards(articles)
+    tag_counts = generator.collect_index_data(articles, render_cards=False)['tag_counts']
+    published_count = 0
+    for art in articles:
+        full_article = generator.am.get_article(art['id'])
+        if full_article and full_article.get('published', False):
+            published_count += 1
+    return generator.render_index_page({'tag_counts': tag_counts, 'published_count': published_count},
+                                       cards_html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide la generación de index.html")
+    parser.add_argument("--articles", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ctpfa-bench-") as workdir:
+        config = make_config(workdir)
+        articles = make_articles(config, args.articles)
+        generator = HTMLGenerator(articles, config)
+        listed = articles.list_articles()
+
+        # Cada lectura de un artículo del disco pasa por get_article
+        reads = 0
+        get_article = articles.get_article
+
+        def counting_get_article(article_id):
+            nonlocal reads
+            reads += 1
+            return get_article(article_id)
+        articles.get_article = counting_get_article
+
+        def measure(build):
+            nonlocal reads
+            reads = 0
+            start = time.perf_counter()
+            html = build(listed)
+            return html, reads, time.perf_counter() - start
+
+        baseline, baseline_reads, baseline_time = measure(lambda items: three_pass_index(generator, items))
+        html, single_reads, single_time = measure(generator.generate_index_html)
+
+    if html != baseline:
+        raise AssertionError("la pasada única no genera el mismo index.html")
+    print(f"{args.articles} artículos, {len(html)} caracteres")
+    print(f"  tres pasadas: {baseline_reads} lecturas, {baseline_time:.2f} s")
+    print(f"  una pasada: {single_reads} lecturas, {single_time:.2f} s")
+    print(f"  {baseline_time / single_time:.1f}x más rápido, {baseline_reads / max(single_reads, 1):.1f}x menos lecturas")
+
+
+if __name__ == "__main__":
+    main()
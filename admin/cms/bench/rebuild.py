@@ -0,0 +1,46 @@
+"""
+Medición: archivos reescritos al regenerar un sitio que no ha cambiado
+"""
+
+import argparse
+import tempfile
+import time
+
+from ..html_generator import HTMLGenerator
+from ..site_builder import SiteBuilder
+from .corpus import make_config, make_articles
+
+
+def snapshot(folder):
+    """Fecha de modificación (ns) de cada archivo bajo folder"""
+    return {path: path.stat().st_mtime_ns for path in folder.rglob('*') if path.is_file()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide una regeneración sin cambios")
+    parser.add_argument("--articles", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ctpfa-bench-") as workdir:
+        config = make_config(workdir)
+        articles = make_articles(config, args.articles)
+        builder = SiteBuilder(articles, HTMLGenerator(articles, config), config)
+        builder.build_site()
+        before = snapshot(builder.output_path)
+
+        time.sleep(0.01)  # que una reescritura cambie la fecha aunque el reloj sea grueso
+        start = time.perf_counter()
+        builder.build_site()
+        elapsed = time.perf_counter() - start
+        after = snapshot(builder.output_path)
+
+    variants = [path for path in after if path.suffix in ('.gz', '.br')]
+    rewritten = [path for path in variants if before.get(path) != after[path]]
+    pages = [path for path in after if path.suffix not in ('.gz', '.br')]
+    touched = [path for path in pages if before.get(path) != after[path]]
+    print(f"{args.articles} artículos: {len(touched)}/{len(pages)} archivos y "
+          f"{len(rewritten)}/{len(variants)} variantes reescritos, {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
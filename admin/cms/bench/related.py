@@ -0,0 +1,78 @@
+"""
+Medición: cálculo de los artículos relacionados (completo e incremental)
+
+Calcula las listas de todos los artículos, cambia uno y las actualiza.
+Informa también de cuántas listas habría cambiado un cálculo completo (las
+filas no afectadas conservan la suya aunque el IDF varíe un poco) y, con
+--compare, comprueba que NumPy y Python puro dan las mismas listas.
+"""
+
+import argparse
+import tempfile
+import time
+
+from .. import related
+from ..related import RelatedArticles
+from ..search_index import SearchIndex
+from .corpus import make_config, make_articles
+
+
+def lists(articles):
+    """Lista de relacionados de cada artículo del índice"""
+    return {entry['id']: entry.get('related') for entry in articles.list_articles()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el cálculo de los artículos relacionados")
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--pure-python", action="store_true", help="sin NumPy aunque esté instalado")
+    parser.add_argument("--compare", action="store_true",
+                        help="repite el cálculo completo en Python puro y compara las listas")
+    args = parser.parse_args()
+    numpy = related.np
+    if args.pure_python:
+        related.np = None
+
+    with tempfile.TemporaryDirectory(prefix="ctpfa-bench-") as workdir:
+        config = make_config(workdir)
+        articles = make_articles(config, args.articles)
+        search = SearchIndex(articles)
+        search.refresh()
+        calculator = RelatedArticles(articles, search, config)
+
+        start = time.perf_counter()
+        calculator.update()
+        full = time.perf_counter() - start
+        backend = "Python puro" if related.np is None else "NumPy"
+
+        mismatches = None
+        if args.compare:
+            computed = lists(articles)
+            related.np = None
+            articles.articles.pop('related', None)
+            calculator.update()
+            related.np = None if args.pure_python else numpy
+            mismatches = sum(computed[key] != value for key, value in lists(articles).items())
+
+        article = articles.get_article("a00042")
+        articles.update_article("a00042", {"content": article["content"] + " palabra7 palabra8 palabra9",
+                                           "tags": ["tag1", "tag2"]})
+        start = time.perf_counter()
+        pages = calculator.update()
+        incremental = time.perf_counter() - start
+        updated = lists(articles)
+
+        # Sin las listas guardadas, update las recalcula todas
+        articles.articles.pop('related', None)
+        calculator.update()
+        differences = sum(updated[key] != value for key, value in lists(articles).items())
+
+    print(f"{args.articles} artículos ({backend}): completo {full:.2f} s, "
+          f"incremental {incremental:.2f} s ({len(pages)} páginas), "
+          f"{differences} listas distintas de un cálculo completo")
+    if mismatches is not None:
+        print(f"{mismatches} listas distintas entre {backend} y Python puro")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Servidor SFTP local y proxy con latencia para las mediciones de CTPFA CMS
+
+El servidor (paramiko) sirve el sistema de archivos local sin comprobar
+credenciales y, si se permite, ejecuta órdenes por SSH. El proxy retrasa
+cada sentido de la conexión para simular la red entre el cliente y el
+servidor de verdad.
+"""
+
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+
+
+class _Server(paramiko.ServerInterface):
+    """Acepta cualquier usuario y, si se permite, las órdenes por SSH"""
+
+    def __init__(self, exec_allowed):
+        self.exec_allowed = exec_allowed
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        if not self.exec_allowed:
+            return False
+        threading.Thread(target=self._run, args=(channel, command), daemon=True).start()
+        return True
+
+    @staticmethod
+    def _run(channel, command):
+        process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        def feed():
+            try:
+                while True:
+                    data = channel.recv(65536)
+                    if not data:
+                        break
+                    process.stdin.write(data)
+                process.stdin.close()
+            except OSError:
+                pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        out, err = process.stdout.read(), process.stderr.read()
+        process.wait()
+        feeder.join(1)
+        channel.sendall(out)
+        channel.sendall_stderr(err)
+        channel.send_exit_status(process.returncode)
+        channel.close()
+
+
+class _Handle(SFTPHandle):
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+def _sftp_errors(method):
+    """Traduce los OSError del sistema de archivos a códigos SFTP"""
+    def wrapper(*args):
+        try:
+            return method(*args)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+    return wrapper
+
+
+class _FileSystem(SFTPServerInterface):
+    """Operaciones SFTP sobre el sistema de archivos local"""
+
+    @_sftp_errors
+    def list_folder(self, path):
+        entries = []
+        for name in os.listdir(path):
+            attributes = SFTPAttributes.from_stat(os.stat(os.path.join(path, name)))
+            attributes.filename = name
+            entries.append(attributes)
+        return entries
+
+    @_sftp_errors
+    def stat(self, path):
+        return SFTPAttributes.from_stat(os.stat(path))
+
+    @_sftp_errors
+    def lstat(self, path):
+        return SFTPAttributes.from_stat(os.lstat(path))
+
+    @_sftp_errors
+    def open(self, path, flags, attr):
+        fd = os.open(path, flags, 0o644)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _Handle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    @_sftp_errors
+    def remove(self, path):
+        os.remove(path)
+        return paramiko.SFTP_OK
+
+    @_sftp_errors
+    def rename(self, oldpath, newpath):
+        # Como en SFTP v3: no sobrescribe
+        if os.path.exists(newpath):
+            return paramiko.SFTP_FAILURE
+        os.rename(oldpath, newpath)
+        return paramiko.SFTP_OK
+
+    @_sftp_errors
+    def posix_rename(self, oldpath, newpath):
+        os.rename(oldpath, newpath)
+        return paramiko.SFTP_OK
+
+    @_sftp_errors
+    def mkdir(self, path, attr):
+        os.mkdir(path)
+        return paramiko.SFTP_OK
+
+    @_sftp_errors
+    def rmdir(self, path):
+        os.rmdir(path)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.normpath(path if os.path.isabs(path) else os.path.join(os.getcwd(), path))
+
+
+class _SFTPServer(SFTPServer):
+    """Como OpenSSH, sin la extensión check-file (la de paramiko tarda minutos con archivos grandes)"""
+
+    def _check_file(self, request_number, msg):
+        self._send_status(request_number, paramiko.SFTP_OP_UNSUPPORTED)
+
+
+def _listen():
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(50)
+    return sock
+
+
+def _accept_forever(sock, handle):
+    def serve():
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    threading.Thread(target=serve, daemon=True).start()
+
+
+def start_sftp(exec_allowed=True, compression=False):
+    """Arranca un servidor SFTP en 127.0.0.1 y devuelve su puerto.
+
+    Cualquier usuario y contraseña valen. Con exec_allowed=False rechaza
+    las órdenes por SSH, como los alojamientos que solo dan SFTP.
+    """
+    host_key = paramiko.RSAKey.generate(2048)
+    sock = _listen()
+
+    def handle(conn):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(host_key)
+        transport.use_compression(compression)
+        transport.set_subsystem_handler('sftp', _SFTPServer, _FileSystem)
+        transport.start_server(server=_Server(exec_allowed))
+
+    _accept_forever(sock, handle)
+    return sock.getsockname()[1]
+
+
+def start_proxy(target_port, delay, bandwidth=0):
+    """Proxy TCP hacia target_port que retrasa 'delay' segundos cada sentido.
+
+    Con bandwidth (bytes/s) limita además el caudal. Devuelve el puerto en
+    el que escucha; el tiempo de ida y vuelta es el doble de 'delay'.
+    """
+    sock = _listen()
+
+    def pump(source, target):
+        pending = queue.Queue()
+
+        def reader():
+            while True:
+                try:
+                    data = source.recv(65536)
+                except OSError:
+                    data = b''
+                pending.put((time.monotonic() + delay, data))
+                if not data:
+                    return
+
+        def writer():
+            free_at = 0.0
+            while True:
+                due, data = pending.get()
+                if bandwidth and data:
+                    free_at = max(free_at, due - delay) + len(data) / bandwidth
+                    due = max(due, free_at + delay)
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    if not data:
+                        target.shutdown(socket.SHUT_WR)
+                        return
+                    target.sendall(data)
+                except OSError:
+                    return
+
+        threading.Thread(target=reader, daemon=True).start()
+        threading.Thread(target=writer, daemon=True).start()
+
+    def handle(client):
+        upstream = socket.create_connection(('127.0.0.1', target_port))
+        for conn in (client, upstream):
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pump(client, upstream)
+        pump(upstream, client)
+
+    _accept_forever(sock, handle)
+    return sock.getsockname()[1]
@@ -0,0 +1,75 @@
+"""
+Medición: subidas y descargas SFTP con latencia de red
+
+Usa un servidor SFTP local detrás de un proxy que retrasa cada sentido
+--delay segundos; las opciones del servidor (pipelining, compression,
+window_size) se pueden cambiar para compararlas.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from ..uploader import FileUploader
+from .corpus import make_config
+from .servers import start_proxy, start_sftp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide SFTP a través de un proxy con latencia")
+    parser.add_argument("--delay", type=float, default=0.02, help="segundos en cada sentido")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/s (0: sin límite)")
+    parser.add_argument("--no-pipelining", action="store_true")
+    parser.add_argument("--compression", action="store_true")
+    parser.add_argument("--window-size", type=int)
+    args = parser.parse_args()
+
+    server = {"pipelining": not args.no_pipelining, "compression": args.compression}
+    if args.window_size:
+        server["window_size"] = args.window_size
+
+    # JSON compresible (como el manifiesto) y datos aleatorios (incompresibles)
+    rng = random.Random(1)
+    text = json.dumps({f"page/{i}.html": {"hash": "%064x" % rng.getrandbits(256), "size": i}
+                       for i in range(25000)})
+    blob = os.urandom(4 * 1024 * 1024)
+    pages = [f"<html>{i}</html>" * 200 for i in range(50)]
+
+    with tempfile.TemporaryDirectory(prefix="ctpfa-bench-") as workdir:
+        remote = Path(workdir) / "remote"
+        remote.mkdir()
+        source = Path(workdir) / "blob.bin"
+        source.write_bytes(blob)
+        port = start_proxy(start_sftp(compression=True), args.delay, args.bandwidth)
+        config = make_config(workdir, server=dict(server, protocol="sftp", host="127.0.0.1", port=port,
+                                                  username="bench", password="bench",
+                                                  remote_path=str(remote)))
+        uploader = FileUploader(config)
+        times = {}
+
+        def measure(label, action):
+            start = time.perf_counter()
+            result = action()
+            times[label] = time.perf_counter() - start
+            return result
+
+        measure("conexión", uploader.connect)
+        measure("subir 4 MB aleatorios", lambda: uploader.upload_file(source, f"{remote}/blob.bin"))
+        measure(f"subir {len(text) // 1024} KB de JSON", lambda: uploader.upload_string(text, f"{remote}/m.json"))
+        downloaded = measure("descargar el JSON", lambda: uploader.download_string(f"{remote}/m.json"))
+        measure("subir 50 páginas pequeñas", lambda: [
+            uploader.upload_string(page, f"{remote}/p{i}.html") for i, page in enumerate(pages)])
+        uploader.disconnect()
+        assert downloaded == text and (remote / "blob.bin").read_bytes() == blob
+
+    print(f"RTT {args.delay * 2000:.0f} ms, {server}")
+    for label, elapsed in times.items():
+        print(f"  {label}: {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
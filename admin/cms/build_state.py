@@ -0,0 +1,55 @@
+"""
+Estado de la última generación del sitio para CTPFA CMS
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+
+class BuildState:
+    """Recuerda la huella de cada página publicada para no regenerar ni subir lo que no cambia"""
+    
+    FILENAME = ".build_state.json"
+    
+    def __init__(self, state_file, target=""):
+        self.state_file = Path(state_file)
+        # Servidor y ruta a los que corresponde el estado guardado
+        self.target = target
+        self.pages = self.load()
+    
+    def load(self):
+        if self.state_file.exists():
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return {}
+            # Si ha cambiado el servidor de destino, el estado anterior no sirve
+            if data.get("target") == self.target:
+                return data.get("pages", {})
+        return {}
+    
+    def save(self):
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump({"target": self.target, "pages": self.pages}, f, indent=4, ensure_ascii=False, sort_keys=True)
+    
+    @staticmethod
+    def fingerprint(data):
+        """Calcula una huella estable de cualquier estructura serializable a JSON"""
+        serialized = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+    
+    def is_current(self, path, fingerprint):
+        """Indica si la página publicada ya tiene esa huella"""
+        return self.pages.get(path) == fingerprint
+    
+    def update(self, path, fingerprint):
+        self.pages[path] = fingerprint
+    
+    def forget(self, path):
+        self.pages.pop(path, None)
+    
+    def paths(self, prefix=""):
+        """Lista las páginas registradas cuya ruta empieza por el prefijo dado"""
+        return [path for path in self.pages if path.startswith(prefix)]
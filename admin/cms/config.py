@@ -3,6 +3,7 @@ Gestión de configuración para CTPFA CMS
 """
 
 import json
+import numbers
 import os
 
 # Configuración por defecto
@@ -21,15 +22,45 @@ class ConfigManager:
             "username": "",
             "password": "",
             "key_file": "",
-            "remote_path": "/var/www/html/webRetro"
+            "remote_path": "/var/www/html/webRetro",
+            "keepalive": 30,
+            "max_connections": 4,
+            "atomic_uploads": True,
+            "staged_release": False,
+            "bundle_deploy": False,
+            "idle_timeout": 300,
+            "pipelining": True,
+            "compression": False,
+            "window_size": 4194304,
+            "max_packet_size": 32768,
+            "resume_min_size": 1048576,
+            "timeout": 30,
+            "retries": 3,
+            "retry_backoff": 0.5,
+            "breaker_threshold": 5,
+            "breaker_cooldown": 30
         },
         "local": {
             "articles_path": "./articles",
-            "templates_path": "./templates"
+            "templates_path": "./templates",
+            "output_path": "./public",
+            "images_path": "./images"
         },
         "site": {
             "name": "Cualquier Tiempo Pasado Fue Anterior",
             "author": "Admin"
+        },
+        "build": {
+            "page_size": 12,
+            "precompress": True,
+            "minify": False,
+            "article_data": "inline",
+            "deterministic": True,
+            "search": True,
+            "feed_size": 20,
+            "related": 4,
+            "image_widths": [480, 960, 1600],
+            "image_quality": 80
         }
     }
     
@@ -59,3 +90,33 @@ class ConfigManager:
             d = d.setdefault(key, {})
         d[keys[-1]] = value
         self.save()
+
+
+def get_option(config, *keys):
+    """Lee una opción de la configuración con su valor por defecto.
+
+    Si no hay configuración, o el config.json es antiguo y no tiene la opción
+    (o tiene un valor de otro tipo), se usa el valor de DEFAULT_CONFIG. Si el
+    valor por defecto es un número con decimales vale cualquier número (30 o
+    0.5, pero no true/false); si es un entero, solo los números enteros (30 o
+    30.0, pero no 7.5).
+    """
+    default = ConfigManager.DEFAULT_CONFIG
+    for key in keys:
+        default = default[key]
+    if config:
+        value = config.get(*keys)
+        if isinstance(default, int) and not isinstance(default, bool):
+            # 30.0 en lugar de 30 sigue siendo un entero (para tamaños y recuentos)
+            if _is_number(value) and float(value).is_integer():
+                return int(value)
+        elif _is_number(default):
+            if _is_number(value):
+                return value
+        elif isinstance(value, type(default)):
+            return value
+    return default
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
@@ -0,0 +1,218 @@
+"""
+Conexiones persistentes al servidor para CTPFA CMS
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from .config import get_option
+from .retry import CircuitBreaker, call_with_retries
+from .uploader import FileUploader
+
+
+class ConnectionPool:
+    """Mantiene abiertas las sesiones FTP/SFTP entre una operación y la siguiente.
+
+    La aplicación pide una sesión con session(); al terminar se devuelve al
+    pool en lugar de cerrarse, así que la siguiente publicación, importación
+    o borrado se ahorra la conexión TCP, el saludo SSH y la autenticación.
+    Antes de reutilizar una sesión se comprueba que sigue viva (una petición
+    mínima) y, si el servidor la cerró, se abre otra sin que se note.
+
+    Un hilo en segundo plano mantiene vivas las sesiones inactivas (NOOP en
+    FTP; en SFTP lo hace el keepalive del transporte SSH) y cierra las que
+    llevan más de server.idle_timeout segundos sin usarse.
+
+    Nunca hay más de server.max_connections sesiones prestadas a la vez
+    (muchos alojamientos limitan los accesos FTP simultáneos); en SFTP las
+    sesiones adicionales son canales nuevos sobre una conexión SSH ya abierta.
+
+    Todas las sesiones comparten un cortacircuitos (ver retry.CircuitBreaker):
+    si el servidor deja de responder, ni las conexiones nuevas ni las
+    operaciones de las abiertas lo siguen intentando durante un rato.
+    """
+
+    # Campos de la configuración que identifican el servidor
+    SERVER_KEYS = ("protocol", "host", "port", "username", "password", "key_file")
+
+    def __init__(self, config, uploader_class=FileUploader):
+        self.config = config
+        self.uploader_class = uploader_class
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        # Sesiones libres: [uploader, momento del último uso]
+        self._idle = []
+        # Sesiones prestadas y huecos reservados (para respetar server.max_connections)
+        self._lent = []
+        self._busy = 0
+        self._server = None
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+        self.breaker = CircuitBreaker(config)
+        # Instrumentación: conexiones abiertas (y su coste), reutilizaciones y reconexiones
+        self.stats = {'connects': 0, 'connect_time': 0.0, 'channels': 0, 'reuses': 0, 'reconnects': 0}
+
+    def server_signature(self):
+        """Datos del servidor configurado; si cambian, las sesiones abiertas no sirven"""
+        server = self.config.get("server")
+        server = server if isinstance(server, dict) else {}
+        return tuple(server.get(key) for key in self.SERVER_KEYS)
+
+    def limit(self):
+        """Sesiones simultáneas permitidas con el servidor (server.max_connections)"""
+        return max(1, get_option(self.config, "server", "max_connections"))
+
+    def acquire(self, blocking=True):
+        """Sesión lista para usar: una libre que siga viva, un canal nuevo o una conexión nueva.
+
+        Si ya hay server.max_connections sesiones prestadas espera a que se
+        devuelva una; con blocking=False devuelve None en ese caso.
+        """
+        with self._available:
+            signature = self.server_signature()
+            stale = []
+            if signature != self._server:
+                stale, self._idle = self._idle, []
+                self._server = signature
+                self.breaker.success()
+            while self._busy >= self.limit() and blocking:
+                self._available.wait()
+            reserved = self._busy < self.limit()
+            if reserved:
+                self._busy += 1
+            base = next((u for u in self._lent if u.protocol == "sftp"), None)
+        for uploader, _ in stale:
+            self._close(uploader)
+        if not reserved:
+            return None
+
+        try:
+            uploader = self._checkout(base)
+        except BaseException:
+            with self._available:
+                self._busy -= 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self._lent.append(uploader)
+        return uploader
+
+    def _checkout(self, base):
+        """Busca o abre la sesión de un hueco ya reservado"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                uploader, _ = self._idle.pop()
+            if uploader.is_alive():
+                self._count('reuses')
+                uploader.connect_time = None
+                return uploader
+            # El servidor cerró la sesión: se descarta y se abre otra
+            self._count('reconnects')
+            self._close(uploader)
+
+        start = time.perf_counter()
+        uploader = None
+        if base is not None:
+            try:
+                uploader = base.open_channel()
+                self._count('channels')
+            except Exception:
+                uploader = None  # La conexión SSH ya no sirve: se abre otra
+        if uploader is None:
+            uploader = self.uploader_class(self.config)
+            uploader.breaker = self.breaker
+            call_with_retries(uploader.connect, self.config, self.breaker)
+            self._count('connects', connect_time=time.perf_counter() - start)
+        uploader.connect_time = time.perf_counter() - start
+        self._start_keepalive()
+        return uploader
+
+    def _count(self, key, connect_time=0.0):
+        """Suma a la instrumentación (desde varios hilos a la vez)"""
+        with self._lock:
+            self.stats[key] += 1
+            self.stats['connect_time'] += connect_time
+
+    def release(self, uploader):
+        """Devuelve una sesión al pool para la siguiente operación"""
+        with self._available:
+            if uploader in self._lent:
+                self._lent.remove(uploader)
+                self._busy -= 1
+                self._available.notify()
+            if not self._stop.is_set() and self.server_signature() == self._server:
+                self._idle.append([uploader, time.monotonic()])
+                return
+        self._close(uploader)
+
+    @contextmanager
+    def session(self):
+        """Sesión del pool durante un bloque 'with'.
+
+        Se devuelve también si el bloque falla: si la conexión quedó rota,
+        la comprobación de la siguiente operación la sustituye.
+        """
+        uploader = self.acquire()
+        try:
+            yield uploader
+        finally:
+            self.release(uploader)
+
+    def describe(self, uploader):
+        """Texto para el registro: conexión nueva (con su coste) o reutilizada"""
+        if uploader.connect_time is None:
+            return "Conexión reutilizada"
+        return f"Conexión establecida ({uploader.connect_time:.2f} s)"
+
+    def summary(self):
+        """Resumen de la instrumentación del pool"""
+        with self._lock:
+            stats = dict(self.stats)
+        return (f"{stats['connects']} conexión(es) en {stats['connect_time']:.2f} s, "
+                f"{stats['channels']} canal(es), {stats['reuses']} reutilizada(s), "
+                f"{stats['reconnects']} reconexión(es)")
+
+    def _start_keepalive(self):
+        with self._lock:
+            if self._keepalive_thread is None or not self._keepalive_thread.is_alive():
+                self._stop.clear()
+                self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+                self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        """Hilo de mantenimiento de las sesiones libres"""
+        interval = get_option(self.config, "server", "keepalive")
+        while not self._stop.wait(interval):
+            self.keepalive()
+
+    def keepalive(self):
+        """Cierra las sesiones libres caducadas y mantiene vivas las demás"""
+        idle_timeout = get_option(self.config, "server", "idle_timeout")
+        with self._lock:
+            sessions, self._idle = self._idle, []
+        keep = []
+        for uploader, last_used in sessions:
+            if time.monotonic() - last_used > idle_timeout or not uploader.is_alive():
+                self._close(uploader)
+            else:
+                keep.append([uploader, last_used])
+        with self._lock:
+            self._idle = keep + self._idle
+
+    def close(self):
+        """Cierra todas las sesiones libres y detiene el mantenimiento"""
+        self._stop.set()
+        with self._lock:
+            sessions, self._idle = self._idle, []
+        for uploader, _ in sessions:
+            self._close(uploader)
+
+    @staticmethod
+    def _close(uploader):
+        try:
+            uploader.disconnect()
+        except Exception:
+            pass  # La conexión ya estaba rota
@@ -0,0 +1,131 @@
+"""
+Generación de feed.xml (RSS) y sitemap.xml para CTPFA CMS
+"""
+
+from datetime import datetime
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from .build_state import BuildState
+from .config import get_option
+from .uploader import build_web_url
+
+
+class FeedGenerator:
+    """Genera el feed RSS y el sitemap a partir del índice de artículos.
+
+    Solo se usan los campos del índice (título, subtítulo, categoría y
+    fechas), así que no se abre ningún artículo.
+    """
+
+    FEED_FILE = "feed.xml"
+    SITEMAP_FILE = "sitemap.xml"
+
+    def __init__(self, articles_manager, config):
+        self.am = articles_manager
+        self.config = config
+
+    def published_entries(self):
+        """Artículos publicados del índice, del más reciente al más antiguo"""
+        published = [art for art in self.am.list_articles() if art.get('published', False)]
+        return sorted(published, key=lambda x: (x['created'], x['id']), reverse=True)
+
+    def url(self, filename=""):
+        """URL absoluta de un archivo del sitio"""
+        server = self.config.get("server") if self.config else None
+        return build_web_url(server if isinstance(server, dict) else {}, filename)
+
+    @staticmethod
+    def parse_date(value):
+        return datetime.strptime(value, "%Y-%m-%d %H:%M")
+
+    def generate_feed(self, entries):
+        """RSS 2.0 con los últimos build.feed_size artículos publicados.
+
+        La fecha del canal es la del artículo más reciente, no la de generación,
+        para que el feed solo cambie cuando cambian los artículos.
+        """
+        site_name = get_option(self.config, "site", "name")
+        items = entries[:get_option(self.config, "build", "feed_size")]
+        last_change = max((art.get('modified', art['created']) for art in items), default=None)
+
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">',
+            '<channel>',
+            f'    <title>{escape(site_name)}</title>',
+            f'    <link>{escape(self.url())}</link>',
+            f'    <atom:link href="{escape(self.url(self.FEED_FILE))}" rel="self" type="application/rss+xml"/>',
+            f'    <description>{escape(site_name)} - Artículos de los años 80 y 90</description>',
+            '    <language>es</language>',
+        ]
+        if last_change:
+            lines.append(f'    <lastBuildDate>{format_datetime(self.parse_date(last_change))}</lastBuildDate>')
+
+        for art in items:
+            link = escape(self.url(f"{art['id']}.html"))
+            lines += [
+                '    <item>',
+                f'        <title>{escape(art["title"])}</title>',
+                f'        <link>{link}</link>',
+                f'        <guid isPermaLink="true">{link}</guid>',
+                f'        <category>{escape(art["category"].upper())}</category>',
+                f'        <pubDate>{format_datetime(self.parse_date(art["created"]))}</pubDate>',
+            ]
+            if art.get('subtitle'):
+                lines.append(f'        <description>{escape(art["subtitle"])}</description>')
+            lines.append('    </item>')
+
+        lines += ['</channel>', '</rss>']
+        return '\n'.join(lines) + '\n'
+
+    def generate_sitemap(self, entries):
+        """sitemap.xml con la portada, las páginas de categoría y cada artículo publicado.
+
+        lastmod sale del campo 'modified' de cada artículo; el de la portada y
+        las categorías es el del artículo más reciente que contienen.
+        """
+        lastmods = {}
+
+        def touch(filename, modified):
+            lastmods[filename] = max(lastmods.get(filename, ''), modified[:10])
+
+        for art in entries:
+            modified = art.get('modified', art['created'])
+            touch("", modified)
+            touch(f"categoria/{self.am.slugify(art['category'].upper())}.html", modified)
+            touch(f"{art['id']}.html", modified)
+
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+        ]
+        for filename in sorted(lastmods):
+            lines += [
+                '    <url>',
+                f'        <loc>{escape(self.url(filename))}</loc>',
+                f'        <lastmod>{lastmods[filename]}</lastmod>',
+                '    </url>',
+            ]
+        lines.append('</urlset>')
+        return '\n'.join(lines) + '\n'
+
+    def generate_files(self, state=None):
+        """feed.xml y sitemap.xml si han cambiado respecto al estado guardado.
+
+        Devuelve (archivos, obsoletos) con el mismo formato que el índice de
+        búsqueda: cada archivo es un dict con 'path', 'fingerprint' y 'content'.
+        """
+        entries = self.published_entries()
+        files = {
+            self.FEED_FILE: self.generate_feed(entries),
+            self.SITEMAP_FILE: self.generate_sitemap(entries),
+        }
+
+        changed = []
+        for path, content in files.items():
+            fingerprint = BuildState.fingerprint(content)
+            if state and state.is_current(path, fingerprint):
+                continue
+            changed.append({'path': path, 'fingerprint': fingerprint, 'content': content})
+        return changed, []
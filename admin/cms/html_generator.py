@@ -2,184 +2,100 @@
 Generación de HTML para CTPFA CMS
 """
 
+import json
 import re
+from collections import Counter
 from datetime import datetime
-from string import Template
+from html import escape
+
+from .build_state import BuildState
+from .config import ConfigManager, get_option
+from .images import IMAGE_PATTERN
+from .template_engine import TemplateEngine
+
+# Tamaño de los bloques al generar páginas por trozos
+CHUNK_SIZE = 64 * 1024
 
 
 class HTMLGenerator:
     """Genera HTML a partir de los artículos"""
     
-    ARTICLE_TEMPLATE = '''<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <meta name="description" content="${subtitle} - Cualquier Tiempo Pasado Fue Anterior">
-    <title>${title} | Cualquier Tiempo Pasado Fue Anterior</title>
-    <link rel="stylesheet" href="css/style.css">
-    <link rel="stylesheet" href="css/article.css">
-</head>
-<body>
-    <div class="scanlines"></div>
-    
-    <header class="header">
-        <div class="header-content">
-            <a href="index.html" class="logo">
-                <span class="logo-text">CTPFA</span>
-                <span class="logo-zone">·</span>
-            </a>
-            <nav class="nav">
-                <a href="index.html" class="nav-link">INICIO</a>
-                <a href="index.html#articulos" class="nav-link active">ARTÍCULOS</a>
-                <a href="index.html#about" class="nav-link">ABOUT</a>
-                <a href="index.html#contacto" class="nav-link">CONTACTO</a>
-                <button class="theme-toggle" id="themeToggle" aria-label="Cambiar tema">
-                    <span class="icon">☀</span>
-                    <span class="label">CLARO</span>
-                </button>
-            </nav>
-        </div>
-    </header>
-
-    <main>
-        <article class="article">
-            <header class="article-header">
-                <div class="article-meta">
-                    <span class="article-category">${category}</span>
-                    <span class="article-date">${date}</span>
-                    <span class="article-author">✍ ${author}</span>
-                    <span class="article-reading">⏱ ${reading_time} min lectura</span>
-                </div>
-                <h1 class="article-title">${title}</h1>
-                <p class="article-subtitle">${subtitle}</p>
-            </header>
-
-            <div class="article-content">
-                ${content}
-            </div>
-
-            <footer class="article-footer">
-                <div class="article-tags">
-                    ${tags}
-                </div>
-                <div class="article-nav">
-                    <a href="index.html#articulos" class="btn-back">[ ← VOLVER A ARTÍCULOS ]</a>
-                </div>
-            </footer>
-        </article>
-    </main>
-
-            <footer class="footer">
-        <div class="footer-content">
-            <p class="footer-text">════════════════════════════════════════════════════════</p>
-            <p class="footer-copy">© 2026 Cualquier Tiempo Pasado Fue Anterior - Ni derechos ni torcidos</p>
-            <div class="footer-links">
-                <a href="#" id="downloadMd" class="footer-link">[ ↓ DESCARGAR .MD ]</a>
-            </div>
-            <p class="footer-info">Optimizado para Netscape Navigator 4.0+ | Resolución: 800x600</p>
-            <p class="footer-text">════════════════════════════════════════════════════════</p>
-        </div>
-    </footer>
-
-    <script>
-        // Sistema de cambio de tema y Descarga MD
-        (function() {
-            // TEMA
-            const themeToggle = document.getElementById('themeToggle');
-            const icon = themeToggle.querySelector('.icon');
-            const label = themeToggle.querySelector('.label');
-            
-            const savedTheme = localStorage.getItem('ctpfa-theme') || 'dark';
-            document.documentElement.setAttribute('data-theme', savedTheme);
-            updateButton(savedTheme);
-            
-            themeToggle.addEventListener('click', function() {
-                const currentTheme = document.documentElement.getAttribute('data-theme');
-                const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
-                
-                document.documentElement.setAttribute('data-theme', newTheme);
-                localStorage.setItem('ctpfa-theme', newTheme);
-                updateButton(newTheme);
-            });
-            
-            function updateButton(theme) {
-                if (theme === 'dark') {
-                    icon.textContent = '☀';
-                    label.textContent = 'CLARO';
-                } else {
-                    icon.textContent = '☾';
-                    label.textContent = 'OSCURO';
-                }
-            }
-
-            // DESCARGA MARKDOWN
-            const downloadBtn = document.getElementById('downloadMd');
-            if (downloadBtn) {
-                downloadBtn.addEventListener('click', function(e) {
-                    e.preventDefault();
-                    
-                    try {
-                        const script = document.getElementById('ctpfa-data');
-                        if (!script) {
-                            alert('Error: Datos no encontrados');
-                            return;
-                        }
-                        
-                        const data = JSON.parse(script.textContent);
-                        
-                        // Construir contenido Markdown
-                        const frontmatter = [
-                            '---',
-                            `title: ${data.title}`,
-                            `category: ${data.category}`,
-                            `tags: ${(data.tags || []).join(', ')}`,
-                            `date: ${data.created}`,
-                            '---',
-                            '',
-                            ''
-                        ].join('\\n');
-                        
-                        const mdContent = frontmatter + data.content;
-                        
-                        // Crear Blob y descargar
-                        const blob = new Blob([mdContent], { type: 'text/markdown' });
-                        const url = URL.createObjectURL(blob);
-                        const a = document.createElement('a');
-                        a.href = url;
-                        a.download = (data.id || 'article') + '.md';
-                        document.body.appendChild(a);
-                        a.click();
-                        document.body.removeChild(a);
-                        URL.revokeObjectURL(url);
-                        
-                    } catch (err) {
-                        console.error(err);
-                        alert('Error al generar la descarga');
-                    }
-                });
-            }
-        })();
-    </script>
-</body>
-</html>'''
-
-    CARD_TEMPLATE = '''                <article class="card">
-                    <div class="card-header">
-                        <span class="card-category">${category}</span>
-                        <span class="card-date">${date}</span>
-                    </div>
-                    <h3 class="card-title">${title}</h3>
-                    <p class="card-excerpt">${excerpt}</p>
-                    <a href="${filename}" class="card-link">[ LEER MÁS → ]</a>
-                </article>'''
-
+    # Cambiar al modificar las plantillas para forzar la regeneración de páginas
+    LAYOUT_VERSION = 9
+    
+    # Marca donde se insertan las tarjetas al generar el index por trozos
+    CARDS_SLOT = '\x00cards\x00'
+    
+    # Plantillas que componen el sitio (ver cms/templates/)
+    TEMPLATE_NAMES = [
+        "article.html", "card.html", "index.html", "listing.html",
+        "partials/header.html", "partials/footer.html",
+        "partials/counter.html", "partials/theme_script.html",
+        "partials/search.html", "partials/related.html"
+    ]
+    
     def __init__(self, articles_manager, config=None):
         self.am = articles_manager
         self.config = config
+        self.templates = TemplateEngine(self.get_templates_path())
+        self._partials = {}
+        # Nombre con huella de cada recurso estático ('css/style.css' -> 'css/style.<hash>.css').
+        # Lo rellena SiteBuilder.build_assets(); sin él se enlazan los nombres originales
+        self.asset_paths = {}
+        # Procesado de imágenes (ImagePipeline) que asigna SiteBuilder; sin él se enlazan tal cual
+        self.images = None
+    
+    def get_templates_path(self):
+        """Directorio de plantillas propias (local.templates_path), si está configurado"""
+        if self.config:
+            templates_path = self.config.get("local", "templates_path")
+            if isinstance(templates_path, str) and templates_path:
+                return templates_path
+        return None
+    
+    def render_partial(self, name, **values):
+        """Genera un parcial compartido (cabecera, pie, script del tema...).
+
+        Cada combinación de valores se genera una sola vez y se reutiliza en
+        todas las páginas mientras la plantilla no cambie en disco.
+        """
+        template = self.templates.get(f"partials/{name}.html")
+        key = (name, template.version, tuple(sorted(values.items())))
+        html = self._partials.get(key)
+        if html is None:
+            html = template.render(values)
+            self._partials[key] = html
+        return html
+    
+    def layout_signature(self):
+        """Huella del diseño: versión del generador, plantillas, opciones de build y recursos"""
+        return BuildState.fingerprint([
+            self.LAYOUT_VERSION,
+            self.templates.signature(self.TEMPLATE_NAMES),
+            get_option(self.config, "build", "minify"),
+            get_option(self.config, "build", "search"),
+            get_option(self.config, "build", "related"),
+            sorted(self.asset_paths.items()),
+        ])
+    
+    def asset_url(self, name, root=''):
+        """Ruta de un recurso estático (con su huella de contenido si se conoce)"""
+        return root + self.asset_paths.get(name, name)
     
     def generate_article_html(self, article):
         """Genera el HTML de un artículo"""
+        return ''.join(self._iter_article_parts(article))
+    
+    def iter_article_html(self, article):
+        """Genera el HTML de un artículo como trozos de bytes UTF-8.
+
+        Permite escribir la página directamente en disco o en el servidor
+        sin construir antes el documento completo en memoria.
+        """
+        return self.encode_chunks(self._iter_article_parts(article))
+    
+    def _iter_article_parts(self, article):
+        """Recorre la plantilla del artículo produciendo sus trozos de texto"""
         # Procesar contenido (markdown básico a HTML)
         content = self.process_content(article['content'])
         
@@ -204,36 +120,101 @@ class HTMLGenerator:
             if isinstance(author_config, str) and author_config:
                 author = author_config
         
-        # Preparar datos JSON para incrustar (para importación sin pérdidas)
-        import json
-        article_data = article.copy()
-        # Asegurar que no hay datos sensibles si los hubiera (en este caso no, pero buena práctica)
-        json_data = json.dumps(article_data, ensure_ascii=False)
-        
-        template = Template(self.ARTICLE_TEMPLATE)
-        # Inyectar el script con datos JSON antes del cierre del body
-        # Como no tenemos una variable para eso en el template original, lo añadiremos
-        # modificando el template on-the-fly o simplemente concatenando, 
-        # pero es más limpio modificar el TEMPLATE si es posible.
-        # Dado que el template es una constante de clase, lo mejor es inyectar el script
-        # al final del contenido o modificar el template para incluir una variable ${json_data}
-        # Sin embargo, el template actual no tiene esa variable logica.
-        # Estrategia: Reemplazar </body> con el script + </body>
+        values = {
+            'title': article['title'],
+            'subtitle': article.get('subtitle', ''),
+            'category': article['category'].upper(),
+            'date': date_formatted,
+            'author': author,
+            'reading_time': str(reading_time),
+            'content': content,
+            'tags': tags_html,
+            'related': self.render_related(article),
+            'style_css': self.asset_url('css/style.css'),
+            'article_css': self.asset_url('css/article.css'),
+            'header': self.render_partial('header', root=''),
+            'theme_script': self.render_partial('theme_script', site_js=self.asset_url('js/site.js'))
+        }
         
-        html = template.safe_substitute(
-            title=article['title'],
-            subtitle=article.get('subtitle', ''),
-            category=article['category'].upper(),
-            date=date_formatted,
-            author=author,
-            reading_time=reading_time,
-            content=content,
-            tags=tags_html
-        )
-        
-        # Inyectar script de datos
-        script_tag = f'<script type="application/json" id="ctpfa-data">{json_data}</script>'
-        return html.replace('</body>', f'{script_tag}\n</body>')
+        for is_var, text in self.templates.get('article.html').parts:
+            if is_var:
+                yield str(values[text]) if text in values else f'${{{text}}}'
+            elif '</body>' in text:
+                # Inyectar los datos JSON (para importación sin pérdidas) antes
+                # del cierre del body, serializándolos por trozos. En modo "file"
+                # solo se indica dónde están: el botón de descarga los pide al pulsarlo
+                before, after = text.rsplit('</body>', 1)
+                yield before
+                data_file = self.article_data_file(article)
+                if data_file:
+                    yield f'<script type="application/json" id="ctpfa-data" data-src="{data_file}"></script>\n</body>'
+                else:
+                    yield '<script type="application/json" id="ctpfa-data">'
+                    yield from self.iter_article_data(article)
+                    yield '</script>\n</body>'
+                yield after
+            else:
+                yield text
+    
+    def render_related(self, article):
+        """Lista de artículos relacionados (precalculada en el índice por RelatedArticles)"""
+        entry = self.am.get_index_entry(article.get('id'))
+        items = []
+        for related_id in (entry or {}).get('related', []):
+            related = self.am.get_index_entry(related_id)
+            if related:
+                items.append(
+                    f'                        <li><a href="{related_id}.html">{related["title"]}</a>'
+                    f'<span class="related-category">{related["category"].upper()}</span></li>'
+                )
+        if not items:
+            return ''
+        return self.templates.get('partials/related.html').render({'items': '\n'.join(items)})
+    
+    def article_data_file(self, article):
+        """Archivo <id>.json con los datos del artículo si se publican aparte (build.article_data = "file")"""
+        if get_option(self.config, "build", "article_data") == "file" and article.get('id'):
+            return f"{article['id']}.json"
+        return None
+    
+    def iter_article_data(self, article):
+        """Serializa por trozos los datos completos del artículo (JSON).
+
+        En modo reproducible (build.deterministic) las claves van ordenadas, así
+        que el resultado no depende del orden en que se guardó el artículo.
+        """
+        sort_keys = get_option(self.config, "build", "deterministic")
+        return json.JSONEncoder(ensure_ascii=False, sort_keys=sort_keys).iterencode(article)
+    
+    @staticmethod
+    def encode_chunks(parts, chunk_size=CHUNK_SIZE):
+        """Codifica trozos de texto en bloques UTF-8 de tamaño acotado.
+
+        Agrupa los trozos pequeños para no hacer una escritura por cada uno y
+        nunca retiene en memoria más de un bloque.
+        """
+        buffer = []
+        buffered = 0
+        for part in parts:
+            if not part:
+                continue
+            buffer.append(part)
+            buffered += len(part)
+            if buffered >= chunk_size:
+                yield ''.join(buffer).encode('utf-8')
+                buffer = []
+                buffered = 0
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+    
+    @staticmethod
+    def write_chunks(chunks, sink):
+        """Escribe trozos de bytes en un objeto tipo archivo. Devuelve los bytes escritos"""
+        written = 0
+        for chunk in chunks:
+            sink.write(chunk)
+            written += len(chunk)
+        return written
     
     def strip_markdown(self, text):
         """Elimina el formato markdown del texto para generar texto plano"""
@@ -260,10 +241,20 @@ class HTMLGenerator:
         text = re.sub(r'\s+', ' ', text)
         return text.strip()
 
-    def generate_index_cards(self, articles):
-        """Genera las tarjetas para el index"""
+    def collect_index_data(self, articles, render_cards=True):
+        """Recorre una sola vez los artículos y agrega todo lo que necesita el index.
+
+        Cada artículo se lee del disco una única vez; de esa misma pasada salen
+        las tarjetas, el recuento de tags y el número de artículos publicados.
+        Con render_cards=False solo se guardan los datos de cada tarjeta y el
+        HTML se genera después, bajo demanda.
+        """
+        entries = []
         cards = []
-        for art in sorted(articles, key=lambda x: x['created'], reverse=True):
+        tag_counts = Counter()
+        
+        # Desempate por id: el orden no depende de cómo esté guardado el índice
+        for art in sorted(articles, key=lambda x: (x['created'], x['id']), reverse=True):
             full_article = self.am.get_article(art['id'])
             if not full_article or not full_article.get('published', False):
                 continue
@@ -274,31 +265,54 @@ class HTMLGenerator:
             
             # Formatear fecha
             date_obj = datetime.strptime(art['created'], "%Y-%m-%d %H:%M")
-            date_formatted = date_obj.strftime("%d-%m-%Y")
             
-            template = Template(self.CARD_TEMPLATE)
-            cards.append(template.safe_substitute(
-                title=art['title'],
-                category=art['category'].upper(),
-                date=date_formatted,
-                excerpt=excerpt,
-                filename=f"{art['id']}.html"
-            ))
+            entry = {
+                'id': art['id'],
+                'title': art['title'],
+                'category': art['category'].upper(),
+                'date': date_obj.strftime("%d-%m-%Y"),
+                'excerpt': excerpt,
+                'tags': full_article.get('tags', [])
+            }
+            entries.append(entry)
+            if render_cards:
+                cards.append(self.render_card(entry))
+            
+            for tag in entry['tags']:
+                clean_tag = tag.strip().upper()
+                if clean_tag:
+                    tag_counts[clean_tag] += 1
         
-        return '\n\n'.join(cards)
+        return {
+            'entries': entries,
+            'cards': cards,
+            'tag_counts': tag_counts,
+            'published_count': len(entries)
+        }
+    
+    def render_card(self, entry, root=''):
+        """Genera el HTML de una tarjeta del index"""
+        return self.templates.get('card.html').render({
+            'title': entry['title'],
+            'category': entry['category'],
+            'date': entry['date'],
+            'excerpt': entry['excerpt'],
+            'filename': f"{root}{entry['id']}.html"
+        })
+    
+    def generate_index_cards(self, articles):
+        """Genera las tarjetas para el index"""
+        return '\n\n'.join(self.collect_index_data(articles)['cards'])
     
     def generate_tag_cloud(self, articles):
         """Genera la nube de etiquetas HTML"""
-        # Contar tags
-        tag_counts = {}
-        for art in articles:
-            full_article = self.am.get_article(art['id'])
-            if full_article and full_article.get('published', False):
-                for tag in full_article.get('tags', []):
-                    clean_tag = tag.strip().upper()
-                    if clean_tag:
-                        tag_counts[clean_tag] = tag_counts.get(clean_tag, 0) + 1
-        
+        return self.render_tag_cloud(self.collect_index_data(articles, render_cards=False)['tag_counts'])
+    
+    def render_tag_cloud(self, tag_counts):
+        """Genera la nube de etiquetas HTML a partir del recuento de tags.
+
+        Cada tag enlaza con su página de archivo tag/<slug>.html.
+        """
         if not tag_counts:
             return ""
             
@@ -312,7 +326,8 @@ class HTMLGenerator:
             # Tamaño entre 0.8rem y 2.0rem
             size = 0.8 + ((count - min_count) / diff) * 1.2
             tags_html.append(
-                f'<span style="font-size: {size:.1f}rem" class="cloud-tag" title="{count} artículos">#{tag}</span>'
+                f'<a href="tag/{self.am.slugify(tag)}.html" style="font-size: {size:.1f}rem" '
+                f'class="cloud-tag" title="{count} artículos">#{tag}</a>'
             )
             
         return f'''
@@ -329,216 +344,228 @@ class HTMLGenerator:
 
     def generate_index_html(self, articles):
         """Genera el index.html completo con los artículos publicados"""
-        cards_html = self.generate_index_cards(articles)
-        tag_cloud_html = self.generate_tag_cloud(articles)
-        
-        # Contar artículos publicados
-        published_count = 0
-        for art in articles:
-            full_article = self.am.get_article(art['id'])
-            if full_article and full_article.get('published', False):
-                published_count += 1
+        return ''.join(self._iter_index_parts(articles))
+    
+    def iter_index_html(self, articles):
+        """Genera el index.html completo como trozos de bytes UTF-8.
+
+        Las tarjetas se generan una a una mientras se escribe la página, así
+        que la memoria no crece con el tamaño del index sin paginar.
+        """
+        return self.encode_chunks(self._iter_index_parts(articles))
+    
+    def _iter_index_parts(self, articles):
+        """Produce la portada sin paginar por trozos: cabecera, tarjetas y cierre"""
+        # Una sola pasada por los artículos para tags y recuento
+        index_data = self.collect_index_data(articles, render_cards=False)
+        head, tail = self.render_index_page(index_data, self.CARDS_SLOT).split(self.CARDS_SLOT)
         
-        # Timestamp para evitar caché
-        cache_buster = datetime.now().strftime("%Y%m%d%H%M%S")
+        yield head
+        for i, entry in enumerate(index_data['entries']):
+            if i:
+                yield '\n\n'
+            yield self.render_card(entry)
+        yield tail
+    
+    def get_page_size(self):
+        """Número de tarjetas por página del index (configurable en build.page_size)"""
+        page_size = get_option(self.config, "build", "page_size")
+        return page_size if page_size > 0 else ConfigManager.DEFAULT_CONFIG["build"]["page_size"]
+    
+    @staticmethod
+    def index_page_path(number):
+        """Ruta relativa de la página N del index: index.html, page/2.html, ..."""
+        return "index.html" if number == 1 else f"page/{number}.html"
+    
+    def paginate_index(self, index_data, page_size=None):
+        """Reparte las entradas del index en páginas con su huella de contenido.
+
+        La huella solo depende de lo que se ve en cada página (tarjetas,
+        navegación y, en la portada, tags y recuento), así que una página
+        cuya huella no cambia no necesita regenerarse ni subirse.
+        """
+        page_size = page_size or self.get_page_size()
+        layout = self.layout_signature()
+        entries = index_data['entries']
+        total_pages = max(1, -(-len(entries) // page_size))
         
-        return f'''<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <meta name="description" content="Cualquier Tiempo Pasado Fue Anterior - Artículos de los años 80 y 90">
-    <meta http-equiv="Cache-Control" content="no-cache, no-store, must-revalidate">
-    <meta http-equiv="Pragma" content="no-cache">
-    <meta http-equiv="Expires" content="0">
-    <title>⚡ Cualquier Tiempo Pasado Fue Anterior ⚡</title>
-    <link rel="stylesheet" href="css/style.css?v={cache_buster}">
-    <style>
-        .tag-cloud {{
-            padding: 4rem 2rem;
-            background: var(--bg-secondary);
-            text-align: center;
-        }}
-        .cloud-content {{
-            max_width: 800px;
-            margin: 2rem auto;
-            line-height: 2.5;
-        }}
-        .cloud-tag {{
-            color: var(--neon-cyan);
-            margin: 0 0.5rem;
-            text-decoration: none;
-            display: inline-block;
-            transition: all 0.3s ease;
-            cursor: default;
-        }}
-        .cloud-tag:hover {{
-            color: var(--neon-pink);
-            text-shadow: 0 0 10px var(--neon-pink);
-            transform: scale(1.1);
-        }}
-    </style>
-</head>
-<body>
-    <div class="scanlines"></div>
-    
-    <header class="header">
-        <div class="header-content">
-            <h1 class="logo">
-                <span class="logo-text">CTPFA</span>
-                <span class="logo-zone">·</span>
-            </h1>
-            <nav class="nav">
-                <a href="#" class="nav-link active">INICIO</a>
-                <a href="#articulos" class="nav-link">ARTÍCULOS</a>
-                <a href="#about" class="nav-link">ABOUT</a>
-                <a href="#contacto" class="nav-link">CONTACTO</a>
-                <button class="theme-toggle" id="themeToggle" aria-label="Cambiar tema">
-                    <span class="icon">☀</span>
-                    <span class="label">CLARO</span>
-                </button>
-            </nav>
-        </div>
-    </header>
-
-    <main>
-        <section class="hero">
-            <div class="hero-content">
-                <p class="hero-subtitle">※ BIENVENIDO AL PORTAL ※</p>
-                <h2 class="hero-title">CUALQUIER TIEMPO PASADO FUE ANTERIOR</h2>
-                <p class="hero-desc">Tomando malas de decisiones desde 1982</p>
-                <div class="hero-stats">
-                    <div class="stat">
-                        <span class="stat-num">{published_count}</span>
-                        <span class="stat-label">ARTÍCULOS</span>
-                    </div>
-                    <div class="stat">
-                        <span class="stat-num">64K</span>
-                        <span class="stat-label">VISITAS</span>
-                    </div>
-                    <div class="stat">
-                        <span class="stat-num">1337</span>
-                        <span class="stat-label">USUARIOS</span>
-                    </div>
-                </div>
-            </div>
-        </section>
+        pages = []
+        for number in range(1, total_pages + 1):
+            page_entries = entries[(number - 1) * page_size:number * page_size]
+            signature = {
+                'layout': layout,
+                'entries': page_entries,
+                'total_pages': total_pages
+            }
+            if number == 1:
+                signature['tag_counts'] = sorted(index_data['tag_counts'].items())
+                signature['published_count'] = index_data['published_count']
+            pages.append({
+                'path': self.index_page_path(number),
+                'number': number,
+                'total_pages': total_pages,
+                'entries': page_entries,
+                'fingerprint': BuildState.fingerprint(signature)
+            })
+        return pages
+    
+    def generate_listing_pages(self, articles, state=None):
+        """Genera las páginas de listado (index paginado y archivos) que han cambiado.
 
-        {tag_cloud_html}
+        Los artículos se leen una sola vez y de esa pasada salen tanto el index
+        como los archivos por categoría y tag. Las páginas del index van al
+        final, con index.html como última, para que el sitio nunca enlace a
+        páginas que aún no existen en el servidor.
+        """
+        index_data = self.collect_index_data(articles, render_cards=False)
+        archive_pages, archive_stale = self.generate_archive_pages(index_data, state)
+        index_pages, index_stale = self.generate_index_pages(index_data, state)
+        return archive_pages + index_pages, archive_stale + index_stale
+    
+    def generate_index_pages(self, index_data, state=None, page_size=None):
+        """Genera las páginas del index que han cambiado respecto al estado guardado.
 
-        <section id="articulos" class="articles">
-            <h2 class="section-title">
-                <span class="title-deco">▓▓▓</span>
-                ÚLTIMOS ARTÍCULOS
-                <span class="title-deco">▓▓▓</span>
-            </h2>
+        Devuelve la lista de páginas a subir (la portada siempre al final) y la
+        lista de páginas antiguas que ya sobran.
+        """
+        pages = self.paginate_index(index_data, page_size)
+        
+        changed = []
+        for page in reversed(pages):
+            if state and state.is_current(page['path'], page['fingerprint']):
+                continue
+            page['html'] = self.render_paginated_page(index_data, page)
+            changed.append(page)
+        
+        return changed, self._stale_paths(state, pages, "page/")
+    
+    def group_archives(self, index_data):
+        """Agrupa en una sola pasada las entradas del index por categoría y por tag"""
+        layout = self.layout_signature()
+        groups = {}
+        for entry in index_data['entries']:
+            names = [('categoria', entry['category'])]
+            names += [('tag', tag) for tag in sorted({t.strip().upper() for t in entry['tags']}) if tag]
             
-            <div class="articles-grid">
-{cards_html}
-            </div>
-        </section>
-
-        <section id="about" class="about">
-            <div class="about-content">
-                <div class="terminal">
-                    <div class="terminal-header">
-                        <span class="terminal-btn"></span>
-                        <span class="terminal-btn"></span>
-                        <span class="terminal-btn"></span>
-                        <span class="terminal-title">ABOUT.TXT</span>
-                    </div>
-                    <div class="terminal-body">
-                        <p><span class="prompt">C:\\CTPFA></span> ABOUT-y0.EXE</p>
-                        <p class="terminal-text">
-                            ╔════════════════════════════════════════╗<br>
-                            ║  CTPFA - EST. 1982                     ║<br>
-                            ╠════════════════════════════════════════╣<br>
-                            ║  Esto es un portal dedicado a preservar║<br>
-                            ║  la memoria de la era dorada de cuando ║<br>
-                            ║  las cosas se hacían divertidas.       ║<br>
-                            ║                                        ║<br>
-                            ║  Desde los primeros ordenadores hasta  ║<br>
-                            ║  los apuntes de seguridad informática, ║<br>
-                            ║  aquí encontrarás todo esto y más ...  ║<br>
-                            ║  hasta que me canse                    ║<br>
-                            ╚════════════════════════════════════════╝
-                        </p>
-                        <p><span class="prompt">C:\\CTPFA></span> <span class="cursor">█</span></p>
-                    </div>
-                </div>
-            </div>
-        </section>
+            for kind, name in names:
+                path = f"{kind}/{self.am.slugify(name)}.html"
+                if path not in groups:
+                    heading = f"CATEGORÍA: {name}" if kind == 'categoria' else f"#{name}"
+                    groups[path] = {'path': path, 'heading': heading, 'entries': []}
+                groups[path]['entries'].append(entry)
+        
+        for group in groups.values():
+            group['fingerprint'] = BuildState.fingerprint({
+                'layout': layout,
+                'heading': group['heading'],
+                'entries': group['entries']
+            })
+        return list(groups.values())
+    
+    def generate_archive_pages(self, index_data, state=None):
+        """Genera las páginas categoria/<slug>.html y tag/<slug>.html que han cambiado.
 
-        <section id="contacto" class="contact">
-            <h2 class="section-title">
-                <span class="title-deco">▓▓▓</span>
-                CONTACTO
-                <span class="title-deco">▓▓▓</span>
-            </h2>
-            <form class="contact-form" action="#" method="post">
-                <div class="form-group">
-                    <label for="nombre">NOMBRE:</label>
-                    <input type="text" id="nombre" name="nombre" required>
-                </div>
-                <div class="form-group">
-                    <label for="email">E-MAIL:</label>
-                    <input type="email" id="email" name="email" required>
-                </div>
-                <div class="form-group">
-                    <label for="mensaje">MENSAJE:</label>
-                    <textarea id="mensaje" name="mensaje" rows="5" required></textarea>
-                </div>
-                <button type="submit" class="btn-submit">[ ENVIAR TRANSMISIÓN ]</button>
-            </form>
-        </section>
-    </main>
-
-    <footer class="footer">
-        <div class="footer-content">
-            <p class="footer-text">════════════════════════════════════════════════════════</p>
-            <p class="footer-copy">© 2026 Cualquier Tiempo Pasado Fue Anterior - Ni derechos ni ná</p>
-            <p class="footer-info">Optimizado para Netscape Navigator 4.0+ | Resolución: 800x600</p>
-            <p class="footer-counter">
-                <img src="data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='88' height='31'%3E%3Crect fill='%23000' width='88' height='31'/%3E%3Ctext x='44' y='20' text-anchor='middle' fill='%2300ff00' font-family='monospace' font-size='12'%3E{published_count:06d}%3C/text%3E%3C/svg%3E" alt="Contador de visitas" width="88" height="31">
-            </p>
-            <p class="footer-text">════════════════════════════════════════════════════════</p>
-        </div>
-    </footer>
-
-    <script>
-        // Sistema de cambio de tema
-        (function() {{
-            const themeToggle = document.getElementById('themeToggle');
-            const icon = themeToggle.querySelector('.icon');
-            const label = themeToggle.querySelector('.label');
-            
-            // Cargar tema guardado o usar oscuro por defecto
-            const savedTheme = localStorage.getItem('ctpfa-theme') || 'dark';
-            document.documentElement.setAttribute('data-theme', savedTheme);
-            updateButton(savedTheme);
-            
-            themeToggle.addEventListener('click', function() {{
-                const currentTheme = document.documentElement.getAttribute('data-theme');
-                const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
-                
-                document.documentElement.setAttribute('data-theme', newTheme);
-                localStorage.setItem('ctpfa-theme', newTheme);
-                updateButton(newTheme);
-            }});
-            
-            function updateButton(theme) {{
-                if (theme === 'dark') {{
-                    icon.textContent = '☀';
-                    label.textContent = 'CLARO';
-                }} else {{
-                    icon.textContent = '☾';
-                    label.textContent = 'OSCURO';
-                }}
-            }}
-        }})();
-    </script>
-</body>
-</html>'''
+        Solo se regeneran los grupos cuyas entradas han cambiado, así que al
+        publicar un artículo únicamente se tocan su categoría y sus tags.
+        """
+        groups = self.group_archives(index_data)
+        
+        changed = []
+        for group in groups:
+            if state and state.is_current(group['path'], group['fingerprint']):
+                continue
+            cards_html = '\n\n'.join(self.render_card(entry, '../') for entry in group['entries'])
+            group['html'] = self.render_listing_page(group['heading'], cards_html, root='../')
+            changed.append(group)
+        
+        return changed, self._stale_paths(state, groups, "categoria/", "tag/")
+    
+    @staticmethod
+    def _stale_paths(state, pages, *prefixes):
+        """Páginas registradas en el estado con esos prefijos que ya no se generan"""
+        if not state:
+            return []
+        current_paths = {page['path'] for page in pages}
+        return [
+            path for prefix in prefixes for path in state.paths(prefix)
+            if path not in current_paths
+        ]
+    
+    def render_paginated_page(self, index_data, page):
+        """Genera el HTML de una página del index paginado"""
+        number = page['number']
+        root = '' if number == 1 else '../'
+        cards_html = '\n\n'.join(self.render_card(entry, root) for entry in page['entries'])
+        pagination_html = self.render_pagination(number, page['total_pages'], root)
+        
+        if number == 1:
+            return self.render_index_page(index_data, cards_html, pagination_html)
+        return self.render_listing_page(
+            f"ARCHIVO · PÁGINA {number}",
+            cards_html,
+            root=root,
+            pagination_html=pagination_html
+        )
+    
+    def render_pagination(self, number, total_pages, root=''):
+        """Genera la navegación anterior/siguiente entre páginas del index"""
+        if total_pages <= 1:
+            return ""
+        
+        links = []
+        if number > 1:
+            links.append(f'<a href="{root}{self.index_page_path(number - 1)}" class="page-link">[ ← RECIENTES ]</a>')
+        links.append(f'<span class="page-info">PÁGINA {number} / {total_pages}</span>')
+        if number < total_pages:
+            links.append(f'<a href="{root}{self.index_page_path(number + 1)}" class="page-link">[ ANTERIORES → ]</a>')
+        
+        links_html = '\n                '.join(links)
+        return f'''
+            <nav class="pagination">
+                {links_html}
+            </nav>'''
+    
+    def render_listing_page(self, heading, cards_html, root='', pagination_html=''):
+        """Genera una página de listado de tarjetas (páginas 2..N del index y archivos)"""
+        return self.templates.get('listing.html').render({
+            'heading': heading,
+            'root': root,
+            'style_css': self.asset_url('css/style.css', root),
+            'header': self.render_partial('header', root=root),
+            'cards': cards_html,
+            'pagination': pagination_html,
+            'footer': self.render_partial('footer', footer_counter=''),
+            'theme_script': self.render_partial('theme_script', site_js=self.asset_url('js/site.js', root))
+        })
+    
+    def render_index_page(self, index_data, cards_html, pagination_html=''):
+        """Genera la portada (index.html) con las tarjetas indicadas"""
+        published_count = index_data['published_count']
+        counter_html = self.render_partial('counter', counter=f"{published_count:06d}")
+        
+        return self.templates.get('index.html').render({
+            'style_css': self.asset_url('css/style.css'),
+            'published_count': published_count,
+            'tag_cloud': self.render_tag_cloud(index_data['tag_counts']),
+            'search': self.render_search(),
+            'cards': cards_html,
+            'pagination': pagination_html,
+            'footer': self.render_partial('footer', footer_counter=f"\n{counter_html}"),
+            'theme_script': self.render_partial('theme_script', site_js=self.asset_url('js/site.js'))
+        })
+    
+    def render_search(self, root=''):
+        """Buscador del archivo (vacío si build.search está desactivado)"""
+        if not get_option(self.config, "build", "search"):
+            return ''
+        return self.render_partial('search', root=root, search_js=self.asset_url('js/search.js', root))
+    
+    def render_image(self, match):
+        """HTML de una imagen Markdown (![alt](ruta "título"))"""
+        alt, src, title = match.group(1), match.group(2), match.group(3) or ''
+        if self.images:
+            return self.images.render(src, alt, title)
+        return f'<img src="{escape(src)}" alt="{escape(alt)}" loading="lazy" decoding="async">'
     
     def process_content(self, content):
         """Procesa el contenido con formato básico.
@@ -575,9 +602,16 @@ class HTMLGenerator:
                         parts.append(' ')
 
             para_text = ''.join(parts).strip()
+            # Las imágenes se apartan para que los formatos no toquen su texto alternativo
+            images = []
+            def hold_image(match):
+                images.append(self.render_image(match))
+                return f'\x00{len(images) - 1}\x00'
+            para_text = IMAGE_PATTERN.sub(hold_image, para_text)
             # Aplicar formatos inline
             para_text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', para_text)
             para_text = re.sub(r'\*(.+?)\*', r'<em>\1</em>', para_text)
+            para_text = re.sub(r'\x00(\d+)\x00', lambda m: images[int(m.group(1))], para_text)
             html_lines.append(f'<p>{para_text}</p>')
             para_buf = []
 
@@ -0,0 +1,246 @@
+"""
+Procesado de imágenes de los artículos para CTPFA CMS
+"""
+
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .config import ConfigManager, get_option
+
+try:
+    from PIL import Image
+except ImportError:
+    # Sin Pillow las imágenes se copian tal cual (con huella), sin redimensionar
+    Image = None
+
+
+# Cambiar al modificar el procesado para regenerar todas las variantes
+IMAGE_VERSION = 1
+
+# Directorio de las imágenes dentro del sitio
+IMAGE_DIR = "img"
+
+# Caracteres de la huella en el nombre de las variantes (foto-480.<hash>.webp); los
+# mismos que en los recursos, para que les apliquen las reglas de caché del .htaccess
+IMAGE_HASH_LENGTH = 10
+
+# Imagen en Markdown: ![texto alternativo](ruta "título opcional")
+IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\(\s*([^)\s]+)(?:\s+"([^"]*)")?\s*\)')
+
+# Ancho de la columna del artículo (para el atributo sizes)
+CONTENT_WIDTH = 800
+
+
+def valid_widths(widths):
+    """Anchos de build.image_widths válidos (enteros positivos, sin repetir y en orden).
+
+    Si no queda ninguno se usan los de la configuración por defecto, así que
+    siempre hay al menos una variante de cada formato.
+    """
+    widths = sorted({w for w in widths if isinstance(w, int) and not isinstance(w, bool) and w > 0})
+    return widths or list(ConfigManager.DEFAULT_CONFIG["build"]["image_widths"])
+
+
+def find_images(content):
+    """Rutas de las imágenes Markdown de un texto, sin repetir y en orden de aparición"""
+    return list(dict.fromkeys(match.group(2) for match in IMAGE_PATTERN.finditer(content)))
+
+
+def is_remote(src):
+    """Indica si una imagen es externa (URL o ruta absoluta del servidor)"""
+    return '://' in src or src.startswith(('/', 'data:'))
+
+
+def process_image(source, output_path, widths, quality):
+    """Genera las variantes de una imagen en el directorio de salida.
+
+    Se ejecuta en un proceso aparte. El nombre de cada variante lleva una
+    huella del archivo original y de las opciones, así que las que ya
+    existen no se vuelven a generar. Devuelve la entrada de la caché:
+    huella, tamaño original y variantes [formato, ancho, alto, ruta].
+    """
+    source = Path(source)
+    output_path = Path(output_path)
+    content = source.read_bytes()
+    digest = hashlib.sha256(content)
+    digest.update(json.dumps([IMAGE_VERSION, widths, quality]).encode('utf-8'))
+    digest = digest.hexdigest()[:IMAGE_HASH_LENGTH]
+    stem = source.stem.lower()
+
+    if Image is None:
+        relpath = f"{IMAGE_DIR}/{stem}.{digest}{source.suffix.lower()}"
+        target = output_path / relpath
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+        return {'digest': digest, 'size': None, 'variants': [['original', None, None, relpath]]}
+
+    with Image.open(source) as image:
+        image.load()
+        width, height = image.size
+        # Con transparencia el formato de respaldo es PNG; si no, JPEG
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        fallback = ('png', 'PNG') if has_alpha else ('jpg', 'JPEG')
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        # Nunca se amplía: los anchos mayores que el original se sustituyen por el original
+        sizes = sorted({min(w, width) for w in widths})
+        variants = []
+        for target_width in sizes:
+            target_height = max(1, round(height * target_width / width))
+            resized = None
+            for ext, fmt in (('webp', 'WEBP'), fallback):
+                relpath = f"{IMAGE_DIR}/{stem}-{target_width}.{digest}.{ext}"
+                target = output_path / relpath
+                if not target.exists():
+                    if resized is None:
+                        resized = image if target_width == width else image.resize(
+                            (target_width, target_height), Image.LANCZOS)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    # Se escribe a un temporal para no dejar variantes a medias
+                    tmp = target.with_name(target.name + '.tmp')
+                    options = {'quality': quality} if fmt != 'PNG' else {'optimize': True}
+                    resized.save(tmp, fmt, **options)
+                    os.replace(tmp, target)
+                variants.append([ext, target_width, target_height, relpath])
+    return {'digest': digest, 'size': [width, height], 'variants': variants}
+
+
+class ImagePipeline:
+    """Redimensiona las imágenes de los artículos y genera su HTML.
+
+    Las rutas de las imágenes en Markdown son relativas a local.images_path.
+    Cada imagen se convierte a WebP (y JPEG/PNG de respaldo) en los anchos de
+    build.image_widths; los resultados se guardan en una caché local
+    (articles/.image_cache.json) junto con la marca del archivo original, así
+    que las imágenes que no cambian no se vuelven a abrir.
+    """
+
+    CACHE_FILENAME = ".image_cache.json"
+
+    def __init__(self, articles_manager, config, output_path):
+        self.am = articles_manager
+        self.config = config
+        self.output_path = Path(output_path)
+        self.images_path = Path(get_option(config, "local", "images_path"))
+        self.cache_file = self.am.articles_path / self.CACHE_FILENAME
+        self.cache = self.load_cache()
+
+    def load_cache(self):
+        """Carga la caché de imágenes (se descarta si es de otra versión)"""
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == IMAGE_VERSION:
+                    return data.get("images", {})
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {}
+
+    def save_cache(self):
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": IMAGE_VERSION, "images": self.cache}, f,
+                      ensure_ascii=False, sort_keys=True)
+
+    def settings(self):
+        """Opciones de procesado (anchos, calidad y si hay Pillow)"""
+        widths = valid_widths(get_option(self.config, "build", "image_widths"))
+        return [widths, get_option(self.config, "build", "image_quality"), Image is not None]
+
+    def source_file(self, src):
+        """Archivo local de una imagen del artículo"""
+        return self.images_path / src
+
+    def _is_current(self, src):
+        """Indica si la imagen está en la caché y sus variantes siguen en el directorio de salida"""
+        cached = self.cache.get(src)
+        if not cached or cached['settings'] != self.settings():
+            return False
+        try:
+            stat = self.source_file(src).stat()
+        except OSError:
+            return False
+        if cached['stamp'] != [stat.st_mtime_ns, stat.st_size]:
+            return False
+        return all((self.output_path / variant[3]).exists() for variant in cached['variants'])
+
+    def process(self, articles):
+        """Procesa en paralelo las imágenes de los artículos indicados.
+
+        Devuelve las rutas relativas de todas sus variantes (para subirlas);
+        las imágenes que faltan se ignoran y se enlazan tal cual.
+        """
+        sources = {}
+        for article in articles:
+            for src in find_images(article.get('content', '')):
+                if not is_remote(src) and self.source_file(src).is_file():
+                    sources[src] = True
+
+        pending = [src for src in sources if not self._is_current(src)]
+        if pending:
+            widths, quality, _ = self.settings()
+            jobs = {}
+            # spawn y no fork: el proceso puede tener hilos (bucle de eventos, conexiones)
+            # y un hijo creado con fork hereda sus bloqueos tal como estén
+            with ProcessPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                for src in pending:
+                    jobs[src] = pool.submit(process_image, str(self.source_file(src)),
+                                            str(self.output_path), widths, quality)
+                for src, job in jobs.items():
+                    stat = self.source_file(src).stat()
+                    entry = job.result()
+                    entry['stamp'] = [stat.st_mtime_ns, stat.st_size]
+                    entry['settings'] = self.settings()
+                    self.cache[src] = entry
+            self.save_cache()
+
+        return [variant[3] for src in sources for variant in self.cache[src]['variants']]
+
+    def render(self, src, alt, title=''):
+        """HTML de una imagen: <picture> con WebP, srcset, tamaño y carga diferida"""
+        alt = html.escape(alt, quote=True)
+        title_attr = f' title="{html.escape(title, quote=True)}"' if title else ''
+        entry = self.cache.get(src)
+        if not entry or not entry['size']:
+            url = src if is_remote(src) or not entry else entry['variants'][0][3]
+            return self._plain_img(url, alt, title_attr)
+
+        by_format = {}
+        for ext, width, height, relpath in entry['variants']:
+            by_format.setdefault(ext, []).append((width, height, relpath))
+        fallback_ext = next((ext for ext in by_format if ext != 'webp'), None)
+        if fallback_ext is None:
+            # Sin variantes JPEG/PNG (caché incompleta): se enlaza la original
+            return self._plain_img(src, alt, title_attr)
+        fallback = by_format[fallback_ext]
+        largest_width, largest_height, _ = fallback[-1]
+        # Respaldo por defecto: la variante más cercana al ancho de la columna
+        default = min(fallback, key=lambda v: (abs(v[0] - CONTENT_WIDTH), v[0]))[2]
+        sizes = f"(max-width: {CONTENT_WIDTH}px) 100vw, {min(largest_width, CONTENT_WIDTH)}px"
+
+        def srcset(items):
+            return ', '.join(f"{relpath} {width}w" for width, _, relpath in items)
+
+        webp = by_format.get('webp')
+        return (
+            f'<picture>'
+            + (f'<source type="image/webp" srcset="{srcset(webp)}" sizes="{sizes}">' if webp else '')
+            + f'<img src="{default}" srcset="{srcset(fallback)}" sizes="{sizes}" '
+            f'width="{largest_width}" height="{largest_height}" alt="{alt}"{title_attr} '
+            f'loading="lazy" decoding="async">'
+            f'</picture>'
+        )
+
+    @staticmethod
+    def _plain_img(url, alt, title_attr):
+        """<img> sencillo (alt y title ya escapados)"""
+        return f'<img src="{html.escape(url, quote=True)}" alt="{alt}"{title_attr} loading="lazy" decoding="async">'
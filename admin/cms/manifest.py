@@ -0,0 +1,98 @@
+"""
+Manifiesto de lo publicado en el servidor para CTPFA CMS
+"""
+
+import hashlib
+import json
+
+from .build_state import BuildState
+
+
+# Archivo del manifiesto en la raíz remota
+MANIFEST_FILENAME = "ctpfa-manifest.json"
+MANIFEST_VERSION = 1
+
+# Tamaño de los bloques al calcular la huella de un archivo
+HASH_BLOCK_SIZE = 1 << 16
+
+# Campos del artículo que forman su huella: los que se editan, no las fechas
+CONTENT_FIELDS = ("title", "subtitle", "category", "tags", "content")
+
+
+class RemoteManifest:
+    """ctpfa-manifest.json: qué ha publicado el CMS en el servidor.
+
+    Guarda la huella sha256 y el tamaño de cada archivo subido ('files') y,
+    por cada artículo publicado, su título, la huella de su contenido, la
+    fecha de modificación y el tamaño de su página ('articles'). Basta
+    descargar este archivo para saber qué hay en el servidor sin listar
+    directorios ni abrir cada página.
+
+    Se reescribe en cada publicación y borrado: primero a un temporal y
+    después se renombra, así que nunca se lee a medio escribir.
+    """
+
+    def __init__(self, remote_path):
+        self.remote_path = remote_path
+        self.files = {}
+        self.articles = {}
+        # Si el servidor ya tenía manifiesto (de esta versión)
+        self.found = False
+
+    @property
+    def remote_file(self):
+        return f"{self.remote_path}/{MANIFEST_FILENAME}"
+
+    def load(self, uploader):
+        """Descarga el manifiesto del servidor; si no hay, queda vacío"""
+        content = uploader.download_string(self.remote_file)
+        if content:
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError:
+                data = {}
+            if data.get("version") == MANIFEST_VERSION:
+                self.files = data.get("files", {})
+                self.articles = data.get("articles", {})
+                self.found = True
+        return self
+
+    def save(self, uploader):
+        """Sube el manifiesto sustituyendo el anterior de una vez"""
+        content = json.dumps(
+            {"version": MANIFEST_VERSION, "files": self.files, "articles": self.articles},
+            ensure_ascii=False, sort_keys=True, separators=(',', ':'),
+        )
+        # Siempre por un temporal, aunque server.atomic_uploads esté desactivado
+        uploader.upload_string(content, self.remote_file, atomic=True)
+
+    @staticmethod
+    def content_hash(article):
+        """Huella del contenido editable de un artículo (igual en local y en el servidor)"""
+        return BuildState.fingerprint({field: article.get(field) for field in CONTENT_FIELDS})
+
+    def add_file(self, relpath, local_path):
+        """Anota un archivo recién subido con la huella de su copia local"""
+        digest = hashlib.sha256()
+        size = 0
+        # Por bloques: los archivos grandes no se cargan enteros en memoria
+        with open(local_path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+                size += len(block)
+        self.files[relpath] = {'hash': digest.hexdigest(), 'size': size}
+
+    def remove_file(self, relpath):
+        self.files.pop(relpath, None)
+
+    def add_article(self, article, page_path):
+        """Anota un artículo publicado; page_path es su página generada en local"""
+        self.articles[article['id']] = {
+            'title': article['title'],
+            'hash': self.content_hash(article),
+            'modified': article.get('modified', ''),
+            'size': page_path.stat().st_size,
+        }
+
+    def remove_article(self, article_id):
+        self.articles.pop(article_id, None)
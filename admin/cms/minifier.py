@@ -0,0 +1,102 @@
+"""
+Minificación de HTML y CSS para CTPFA CMS
+"""
+
+import re
+
+
+# Bloques cuyo contenido no se toca al colapsar espacios
+_PROTECTED_HTML = re.compile(
+    r'(<pre\b[^>]*>.*?</pre>|<textarea\b[^>]*>.*?</textarea>'
+    r'|<script\b[^>]*>.*?</script>|<style\b[^>]*>.*?</style>)',
+    re.S | re.I,
+)
+_STYLE_BLOCK = re.compile(r'(<style\b[^>]*>)(.*?)(</style>)', re.S | re.I)
+_SCRIPT_BLOCK = re.compile(r'(<script\b[^>]*>)(.*?)(</script>)', re.S | re.I)
+
+# Comentarios HTML (se conservan los condicionales <!--[if ...]>)
+_HTML_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.S)
+
+# Etiquetas de bloque: los espacios a su alrededor no se ven en la página
+_BLOCK_TAGS = (
+    'html|head|body|meta|link|title|div|header|footer|nav|main|section|article|'
+    'aside|ul|ol|li|p|h[1-6]|blockquote|table|thead|tbody|tr|td|th|br|hr|!DOCTYPE'
+)
+_BLOCK_TAG_SPACE = re.compile(r'\s*(</?(?:' + _BLOCK_TAGS + r')\b[^>]*>)\s*', re.I)
+_WHITESPACE = re.compile(r'\s+')
+
+# Cadenas y comentarios de CSS
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON = re.compile(r':\s+')
+
+
+def _collapse_css(css):
+    """Colapsa los espacios de un trozo de CSS sin cadenas ni comentarios"""
+    css = _WHITESPACE.sub(' ', css)
+    css = _CSS_PUNCTUATION.sub(r'\1', css)
+    return _CSS_COLON.sub(':', css)
+
+
+def minify_css(css):
+    """Quita comentarios y espacios sobrantes de una hoja de estilos.
+
+    Las cadenas entre comillas se copian tal cual. Los espacios alrededor
+    de '+' y '~' se conservan porque calc() los necesita.
+    """
+    # Primero fuera los comentarios, luego los espacios entre cadenas
+    css = _CSS_TOKENS.sub(lambda match: match.group(1) or ' ', css)
+    parts = []
+    pos = 0
+    for match in _CSS_TOKENS.finditer(css):
+        parts.append(_collapse_css(css[pos:match.start()]))
+        parts.append(match.group(1))
+        pos = match.end()
+    parts.append(_collapse_css(css[pos:]))
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+def _minify_script(block):
+    """Quita la sangría de un <script>; el código no se reescribe"""
+    opening, body, closing = _SCRIPT_BLOCK.match(block).groups()
+    # Las plantillas de JS (`...`) pueden contener espacios significativos
+    if '`' in body:
+        return block
+    lines = [line.strip() for line in body.split('\n')]
+    return opening + '\n'.join(line for line in lines if line) + closing
+
+
+def _minify_text(html):
+    """Colapsa los espacios de un trozo de HTML sin bloques protegidos"""
+    html = _HTML_COMMENT.sub('', html)
+    html = _WHITESPACE.sub(' ', html)
+    return _BLOCK_TAG_SPACE.sub(r'\1', html)
+
+
+def minify_html(html):
+    """Colapsa espacios y quita comentarios de una página HTML.
+
+    El contenido de <pre> (los bloques <pre class="code-block"> de los
+    artículos) y <textarea> se respeta byte a byte; los <style> se minifican
+    como CSS y a los <script> solo se les quita la sangría.
+    """
+    segments = _PROTECTED_HTML.split(html)
+    parts = []
+    for i, segment in enumerate(segments):
+        if i % 2:
+            lowered = segment[:9].lower()
+            if lowered.startswith('<style'):
+                opening, body, closing = _STYLE_BLOCK.match(segment).groups()
+                segment = opening + minify_css(body) + closing
+            elif lowered.startswith('<script'):
+                segment = _minify_script(segment)
+            parts.append(segment)
+            continue
+        text = _minify_text(segment)
+        # Junto a un bloque protegido (siempre de bloque o invisible) el espacio sobra
+        if i > 0:
+            text = text.lstrip()
+        if i < len(segments) - 1:
+            text = text.rstrip()
+        parts.append(text)
+    return ''.join(parts).strip() + '\n'
@@ -0,0 +1,248 @@
+"""
+Artículos relacionados para CTPFA CMS
+"""
+
+import math
+from collections import Counter, defaultdict
+
+from .config import get_option
+
+try:
+    import numpy as np
+except ImportError:
+    # Sin NumPy se calcula en Python puro: mismas listas, más lento
+    np = None
+
+
+# Número máximo de términos del vocabulario (los tags siempre entran); con
+# NumPy la matriz ocupa artículos x MAX_FEATURES x 4 bytes
+MAX_FEATURES = 2048
+
+# Rasgos (los de mayor IDF) que se conservan de cada artículo
+TERMS_PER_ARTICLE = 32
+
+# Peso extra de un tag compartido frente a una palabra compartida
+TAG_WEIGHT = 2.0
+
+# Filas que se multiplican a la vez contra la matriz completa (acota la memoria)
+BLOCK_ROWS = 512
+
+# Holgura con la que se preseleccionan candidatos en la matriz de float32
+SCORE_MARGIN = 1e-3
+
+# Decimales con los que se comparan las puntuaciones (empates estables entre backends)
+SCORE_DECIMALS = 4
+
+# Si hay que recalcular más de esta fracción de filas se recalculan todas
+FULL_REBUILD_RATIO = 0.25
+
+
+class RelatedArticles:
+    """Calcula los artículos relacionados de cada artículo publicado.
+
+    Cada artículo es un vector TF-IDF de sus términos (los del índice de
+    búsqueda) y sus tags; la similitud es el coseno y para cada artículo se
+    guardan los build.related más parecidos en su entrada del índice de
+    artículos ('related' y 'related_score', la puntuación del último).
+
+    Tras un cambio solo se recalculan las filas afectadas: las de los
+    artículos modificados, las que enlazaban a alguno de ellos y aquellas en
+    las que un artículo modificado supera al último relacionado guardado.
+    Las demás conservan su lista aunque el IDF haya variado ligeramente.
+    """
+
+    VERSION = 1
+
+    def __init__(self, articles_manager, search_index, config):
+        self.am = articles_manager
+        self.search = search_index
+        self.config = config
+
+    def count(self):
+        """Número de relacionados por artículo (build.related, 0 para desactivar)"""
+        return max(get_option(self.config, "build", "related"), 0)
+
+    @staticmethod
+    def features(cache):
+        """Rasgos de cada artículo: sus términos y sus tags (con prefijo #)"""
+        return {
+            article_id: set(entry['terms']) | {f"#{tag}" for tag in entry.get('tags', [])}
+            for article_id, entry in cache.items()
+        }
+
+    @staticmethod
+    def build_vectors(features):
+        """Vectores TF-IDF normalizados: (ids ordenados, tamaño del vocabulario, id -> {columna: peso}).
+
+        Se descartan los términos que solo aparecen en un artículo (no relacionan
+        nada) y los que aparecen en más de la mitad (no distinguen nada), y de
+        cada artículo solo se usan sus TERMS_PER_ARTICLE rasgos más raros.
+        """
+        ids = sorted(features)
+        total = len(ids)
+        df = Counter(feature for article_features in features.values() for feature in article_features)
+
+        candidates = [
+            feature for feature, count in df.items()
+            if count >= 2 and (count <= total / 2 or feature.startswith('#'))
+        ]
+        candidates.sort(key=lambda f: (not f.startswith('#'), -df[f], f))
+        vocabulary = {feature: column for column, feature in enumerate(candidates[:MAX_FEATURES])}
+        idf = {
+            feature: math.log(total / df[feature]) * (TAG_WEIGHT if feature.startswith('#') else 1.0)
+            for feature in vocabulary
+        }
+
+        vectors = {}
+        for article_id in ids:
+            weights = sorted(
+                ((vocabulary[f], idf[f]) for f in features[article_id] if f in vocabulary and idf[f] > 0),
+                key=lambda item: (-item[1], item[0]),
+            )
+            weights = dict(weights[:TERMS_PER_ARTICLE])
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            vectors[article_id] = {column: w / norm for column, w in weights.items()} if norm else {}
+        return ids, len(vocabulary), vectors
+
+    @staticmethod
+    def dot(vector, other):
+        """Producto escalar de dos vectores dispersos (columna -> peso)"""
+        total = 0.0
+        for column, weight in vector.items():
+            other_weight = other.get(column)
+            if other_weight is not None:
+                total += weight * other_weight
+        return total
+
+    def _best(self, scores, limit):
+        """Los 'limit' mejores (id, puntuación) con puntuación positiva; empates por id"""
+        ranked = sorted(
+            ((round(score, SCORE_DECIMALS), other) for other, score in scores),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return [(other, score) for score, other in ranked if score > 0][:limit]
+
+    def _similarities_numpy(self, rows, ids, dimension, vectors, full):
+        """Similitudes de las filas pedidas con todas, por bloques de productos de matrices"""
+        matrix = np.zeros((len(ids), max(dimension, 1)), dtype=np.float32)
+        for row, article_id in enumerate(ids):
+            vector = vectors[article_id]
+            if vector:
+                matrix[row, list(vector)] = list(vector.values())
+
+        position = {article_id: row for row, article_id in enumerate(ids)}
+        limit = len(ids) if full else self.count()
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            positions = [position[article_id] for article_id in block]
+            scores = matrix[positions] @ matrix.T
+            scores[np.arange(len(block)), positions] = 0
+
+            for article_id, row in zip(block, scores):
+                if full:
+                    # Solo sirven para decidir qué filas recalcular: basta la precisión simple
+                    candidates = np.nonzero(row > 0)[0]
+                    yield article_id, self._best(((ids[c], float(row[c])) for c in candidates), limit)
+                    continue
+                if limit >= len(ids):
+                    candidates = np.nonzero(row > 0)[0]
+                else:
+                    # Los k mejores y los que quedan a menos de SCORE_MARGIN del último
+                    kth = np.partition(row, -limit)[-limit]
+                    candidates = np.nonzero((row >= kth - SCORE_MARGIN) & (row > 0))[0]
+                # Las puntuaciones definitivas se calculan en doble precisión, como sin NumPy
+                vector = vectors[article_id]
+                yield article_id, self._best(
+                    ((ids[c], self.dot(vector, vectors[ids[c]])) for c in candidates), limit
+                )
+
+    def _similarities_python(self, rows, ids, vectors, full):
+        """Similitudes de las filas pedidas con todas, recorriendo un índice invertido"""
+        postings = defaultdict(list)
+        for article_id in ids:
+            for column, weight in vectors[article_id].items():
+                postings[column].append((article_id, weight))
+
+        limit = len(ids) if full else self.count()
+        for article_id in rows:
+            scores = defaultdict(float)
+            for column, weight in vectors[article_id].items():
+                for other, other_weight in postings[column]:
+                    scores[other] += weight * other_weight
+            scores.pop(article_id, None)
+            yield article_id, self._best(scores.items(), limit)
+
+    def similarities(self, rows, ids, dimension, vectors, full=False):
+        """(id, [(relacionado, puntuación), ...]) para cada fila pedida.
+
+        Con full=True se devuelven todas las puntuaciones positivas, no solo
+        las build.related mejores.
+        """
+        if np is not None:
+            return self._similarities_numpy(rows, ids, dimension, vectors, full)
+        return self._similarities_python(rows, ids, vectors, full)
+
+    def update(self):
+        """Recalcula las listas afectadas por los cambios y las guarda en el índice.
+
+        Devuelve los ids de los artículos publicados cuya lista ha cambiado o
+        incluye algún artículo modificado (sus páginas hay que regenerarlas).
+        """
+        count = self.count()
+        changed = self.search.refresh()
+        ids, dimension, vectors = self.build_vectors(self.features(self.search.cache))
+        published = set(ids)
+        entries = {art['id']: art for art in self.am.list_articles()}
+
+        settings = {'version': self.VERSION, 'count': count}
+        full_rebuild = self.am.articles.get('related') != settings
+        stored = {} if full_rebuild else {
+            article_id: (entries[article_id].get('related'), entries[article_id].get('related_score', 0))
+            for article_id in ids if article_id in entries
+        }
+
+        rows = set()
+        if count and not full_rebuild:
+            rows = {article_id for article_id in ids if stored.get(article_id, (None,))[0] is None}
+            rows |= changed & published
+            rows |= {
+                article_id for article_id, (related, _) in stored.items()
+                if related and changed.intersection(related)
+            }
+            # Filas en las que un artículo modificado entra entre los mejores
+            modified_rows = sorted(changed & published)
+            if modified_rows and len(rows) <= len(ids) * FULL_REBUILD_RATIO:
+                for _, scores in self.similarities(modified_rows, ids, dimension, vectors, full=True):
+                    for other, score in scores:
+                        related, last_score = stored.get(other, (None, 0))
+                        if related is not None and (len(related) < count or score >= last_score - SCORE_MARGIN):
+                            rows.add(other)
+        if count and (full_rebuild or len(rows) > len(ids) * FULL_REBUILD_RATIO):
+            rows = set(ids)
+
+        updated = []
+        for article_id, scores in self.similarities(sorted(rows), ids, dimension, vectors):
+            entry = entries.get(article_id)
+            if entry is None:
+                continue
+            related = [other for other, _ in scores]
+            last_score = scores[-1][1] if len(scores) == count else 0
+            # La página muestra el título de cada relacionado: también cambia si cambia alguno
+            if entry.get('related') != related or changed.intersection(related):
+                updated.append(article_id)
+            entry['related'] = related
+            entry['related_score'] = last_score
+
+        # Los no publicados (o todos, si se ha desactivado) no tienen relacionados
+        stale = [
+            entry for entry in entries.values()
+            if 'related' in entry and (not count or entry['id'] not in published)
+        ]
+        for entry in stale:
+            del entry['related']
+            entry.pop('related_score', None)
+
+        if rows or stale or full_rebuild:
+            self.am.articles['related'] = settings
+            self.am.save_index()
+        return updated
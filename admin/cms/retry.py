@@ -0,0 +1,136 @@
+"""
+Reintentos y cortacircuitos de las operaciones con el servidor para CTPFA CMS
+"""
+
+import errno
+import ftplib
+import functools
+import random
+import socket
+import threading
+import time
+
+import paramiko
+
+from .config import get_option
+
+
+# Espera máxima entre dos intentos, en segundos
+MAX_BACKOFF = 10.0
+
+# Errores de red que no son ConnectionError
+NETWORK_ERRNOS = {errno.ETIMEDOUT, errno.ENETUNREACH, errno.ENETDOWN, errno.EHOSTUNREACH, errno.EHOSTDOWN}
+
+
+def is_transient(error):
+    """Indica si un error se debe a un corte o a una sobrecarga pasajera.
+
+    Lo son los de red (conexión cortada o rechazada, tiempo agotado, fallos
+    del transporte SSH) y las respuestas 4xx de FTP; no lo son las
+    respuestas del servidor (archivo inexistente, permiso denegado, 5xx).
+    paramiko da un OSError sin errno tanto si el canal se ha cerrado como
+    para varios estados SFTP: esos casos los distingue
+    FileUploader.connection_lost.
+    """
+    if isinstance(error, (paramiko.AuthenticationException, paramiko.BadHostKeyException)):
+        return False
+    if isinstance(error, (ftplib.error_temp, EOFError, paramiko.SSHException, ConnectionError, socket.timeout)):
+        return True
+    return isinstance(error, OSError) and error.errno in NETWORK_ERRNOS
+
+
+def backoff_delay(attempt, base):
+    """Espera antes del reintento número 'attempt' (desde 0): exponencial con azar.
+
+    Se elige al azar entre 0 y base·2^attempt (hasta MAX_BACKOFF), para que
+    varias sesiones que fallan a la vez no vuelvan a la vez.
+    """
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** attempt))
+
+
+def call_with_retries(operation, config, breaker, session=None):
+    """Ejecuta operation() repitiéndola si falla por un error pasajero.
+
+    Como mucho se repite server.retries veces, con esperas crecientes
+    (server.retry_backoff es la primera). Con 'session' (un FileUploader),
+    también se repite si la conexión se ha perdido y, antes de cada
+    repetición, session.recover(error) la vuelve a abrir si hace falta.
+    Cada fallo cuenta para el cortacircuitos: si está abierto no se intenta nada.
+    """
+    retries = get_option(config, "server", "retries")
+    attempt = 0
+    while True:
+        breaker.check()
+        try:
+            result = operation()
+        except Exception as e:
+            if not (is_transient(e) or (session is not None and session.connection_lost())):
+                raise
+            breaker.failure()
+            if attempt >= retries or breaker.is_open():
+                raise
+            time.sleep(backoff_delay(attempt, get_option(config, "server", "retry_backoff")))
+            attempt += 1
+            if session is not None:
+                try:
+                    session.recover(e)
+                except Exception as recover_error:
+                    if not is_transient(recover_error):
+                        raise
+                    # El siguiente intento fallará enseguida y contará como tal
+        else:
+            breaker.success()
+            return result
+
+
+def retrying(method):
+    """Decorador de métodos de FileUploader: call_with_retries con reconexión de la sesión"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return call_with_retries(lambda: method(self, *args, **kwargs), self.config, self.breaker, self)
+    return wrapper
+
+
+class CircuitBreaker:
+    """Deja de intentar operaciones con un servidor que no responde.
+
+    Tras server.breaker_threshold fallos pasajeros seguidos (de cualquier
+    sesión que lo comparta), durante server.breaker_cooldown segundos toda
+    operación falla al momento con ConnectionError en lugar de esperar a
+    que se agote el tiempo. Pasado ese plazo se vuelve a probar: un acierto
+    lo cierra y un fallo lo abre otra vez.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None and self._remaining() > 0
+
+    def _remaining(self):
+        return self.opened_at + get_option(self.config, "server", "breaker_cooldown") - time.monotonic()
+
+    def check(self):
+        """Lanza ConnectionError si el cortacircuitos está abierto"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self._remaining()
+        if remaining > 0:
+            raise ConnectionError(f"El servidor no responde ({self.failures} fallos seguidos); "
+                                  f"se volverá a intentar en {remaining:.0f} s")
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= get_option(self.config, "server", "breaker_threshold"):
+                self.opened_at = time.monotonic()
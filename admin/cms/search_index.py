@@ -0,0 +1,196 @@
+"""
+Índice de búsqueda estático (por fragmentos) para CTPFA CMS
+"""
+
+import json
+import re
+import unicodedata
+
+from .build_state import BuildState
+
+
+# Letras iniciales que agrupan los términos en un mismo fragmento (search/<prefijo>.json)
+PREFIX_LENGTH = 2
+
+# Palabras demasiado comunes para ayudar a encontrar nada
+STOPWORDS = {
+    "al", "como", "con", "de", "del", "el", "en", "es", "esta", "este", "ha", "la",
+    "las", "le", "lo", "los", "mas", "me", "mi", "muy", "no", "nos", "para", "pero",
+    "por", "que", "se", "si", "sin", "sobre", "su", "sus", "te", "tu", "un", "una",
+    "unos", "unas", "ya", "yo", "and", "the", "of", "to", "in", "is",
+}
+
+_WORD = re.compile(r'[a-z0-9]+')
+_MARKUP = re.compile(r'[`*#>\[\]()_~|-]')
+
+
+def normalize_terms(text):
+    """Términos normalizados de un texto: minúsculas, sin tildes y sin palabras vacías.
+
+    js/search.js aplica exactamente la misma normalización a la consulta.
+    """
+    text = unicodedata.normalize('NFD', text.lower().replace('ñ', 'n'))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = _MARKUP.sub(' ', text)
+    return {
+        word for word in _WORD.findall(text)
+        if len(word) >= PREFIX_LENGTH and word not in STOPWORDS
+    }
+
+
+class SearchIndex:
+    """Genera los fragmentos del índice de búsqueda a partir de los artículos publicados.
+
+    Los términos de cada artículo se guardan en una caché local
+    (articles/.search_cache.json) junto con la marca de su archivo, así que
+    en cada publicación solo se vuelven a leer los artículos modificados.
+    """
+
+    CACHE_FILENAME = ".search_cache.json"
+    DIRECTORY = "search"
+    META_FILE = "search/meta.json"
+    VERSION = 2
+
+    def __init__(self, articles_manager):
+        self.am = articles_manager
+        self.cache_file = self.am.articles_path / self.CACHE_FILENAME
+        self.cache = self.load_cache()
+        # Último contenido generado de cada fragmento (ruta -> dict con 'fingerprint' y
+        # 'content') y fragmentos afectados por los artículos releídos desde entonces
+        self.shards = None
+        self.dirty_shards = set()
+
+    def load_cache(self):
+        """Carga la caché de términos (se descarta si es de otra versión)"""
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    return data.get("articles", {})
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {}
+
+    def save_cache(self):
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "articles": self.cache}, f,
+                      ensure_ascii=False, sort_keys=True)
+
+    def _stamp(self, article_id):
+        """Marca del archivo del artículo (fecha de modificación y tamaño)"""
+        stat = (self.am.articles_path / f"{article_id}.json").stat()
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def refresh(self):
+        """Actualiza la caché con los artículos publicados.
+
+        Devuelve los ids que han cambiado: releídos, borrados o despublicados.
+        """
+        published = [art['id'] for art in self.am.list_articles() if art.get('published', False)]
+        changed = set()
+
+        for article_id in published:
+            try:
+                stamp = self._stamp(article_id)
+            except OSError:
+                continue
+            cached = self.cache.get(article_id)
+            if cached and cached['stamp'] == stamp:
+                continue
+
+            article = self.am.get_article(article_id)
+            if not article or not article.get('published', False):
+                continue
+            self._mark_dirty(cached)
+            text = ' '.join([
+                article['title'], article.get('subtitle', ''), article['category'],
+                ' '.join(article.get('tags', [])), article['content'],
+            ])
+            self.cache[article_id] = {
+                'stamp': stamp,
+                'terms': sorted(normalize_terms(text)),
+                'tags': sorted(normalize_terms(' '.join(article.get('tags', [])))),
+                'meta': [article['title'], article['category'].upper(), article['created'][:10]],
+            }
+            self._mark_dirty(self.cache[article_id])
+            changed.add(article_id)
+
+        # Fuera los que se han borrado o despublicado
+        for article_id in set(self.cache) - set(published):
+            self._mark_dirty(self.cache.pop(article_id))
+            changed.add(article_id)
+
+        if changed:
+            self.save_cache()
+        return changed
+
+    def _mark_dirty(self, entry):
+        """Anota los fragmentos en los que aparecen los términos de una entrada de la caché"""
+        if entry:
+            self.dirty_shards.update(self.shard_path(term) for term in entry['terms'])
+
+    def shard_path(self, term):
+        """Fragmento al que pertenece un término"""
+        return f"{self.DIRECTORY}/{term[:PREFIX_LENGTH]}.json"
+
+    def build_files(self, paths=None):
+        """Contenido de los archivos del índice: ruta -> JSON.
+
+        Cada fragmento asocia término -> ids de artículo; meta.json guarda el
+        título, la categoría y la fecha de cada id para pintar los resultados,
+        y las palabras vacías para que el navegador normalice igual la consulta.
+        Con 'paths' solo se generan esos fragmentos (y meta.json); los que
+        se han quedado sin términos no aparecen.
+        """
+        shards = {}
+        for article_id in sorted(self.cache):
+            for term in self.cache[article_id]['terms']:
+                path = self.shard_path(term)
+                if paths is None or path in paths:
+                    shards.setdefault(path, {}).setdefault(term, []).append(article_id)
+
+        meta = {
+            'version': self.VERSION,
+            'prefix': PREFIX_LENGTH,
+            'stopwords': sorted(STOPWORDS),
+            'articles': {article_id: entry['meta'] for article_id, entry in self.cache.items()},
+        }
+        files = {self.META_FILE: meta}
+        files.update(shards)
+        return {
+            path: json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+            for path, data in files.items()
+        }
+
+    def generate_files(self, state=None):
+        """Archivos del índice que han cambiado y fragmentos que ya no existen.
+
+        Devuelve (archivos, obsoletos) con el mismo formato que las páginas de
+        listado: cada archivo es un dict con 'path', 'fingerprint' y 'content'.
+        Solo se vuelven a generar los fragmentos con términos de artículos
+        releídos, borrados o despublicados desde la última vez; el resto se
+        reutiliza tal cual (y con la misma huella).
+        """
+        self.refresh()
+        if self.shards is None:
+            paths, self.shards = None, {}
+        else:
+            paths = self.dirty_shards | {self.META_FILE}
+        files = self.build_files(paths)
+        for path in paths or ():
+            self.shards.pop(path, None)
+        for path, content in files.items():
+            self.shards[path] = {'fingerprint': BuildState.fingerprint(content), 'content': content}
+        self.dirty_shards = set()
+
+        changed = []
+        for path, shard in sorted(self.shards.items()):
+            if state and state.is_current(path, shard['fingerprint']):
+                continue
+            changed.append(dict(shard, path=path))
+
+        stale = []
+        if state:
+            stale = [path for path in state.paths(f"{self.DIRECTORY}/") if path not in self.shards]
+        return changed, stale
@@ -0,0 +1,472 @@
+"""
+Generación del sitio estático en local para CTPFA CMS
+"""
+
+import copy
+import filecmp
+import gzip
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .config import get_option
+from .feeds import FeedGenerator
+from .html_generator import HTMLGenerator
+from .images import ImagePipeline
+from .minifier import minify_css, minify_html
+from .related import RelatedArticles
+from .search_index import SearchIndex
+from .uploader import STAGING_DIR, TEMP_SUFFIX
+
+try:
+    import brotli
+except ImportError:
+    # brotli es opcional: sin él solo se generan las variantes .gz
+    brotli = None
+
+
+# Raíz del sitio estático (donde están index.html, css/ y js/)
+SITE_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# Recursos estáticos que se copian al directorio de salida
+ASSETS = ['css/style.css', 'css/article.css', 'js/site.js', 'js/search.js']
+
+# Caracteres de la huella de contenido en el nombre de los recursos (style.<hash>.css)
+ASSET_HASH_LENGTH = 10
+
+# Tipos de archivo que merece la pena servir precomprimidos
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json', '.xml')
+
+# Marcas del bloque que el CMS gestiona dentro del .htaccess del servidor
+HTACCESS_BEGIN = "# BEGIN CTPFA"
+HTACCESS_END = "# END CTPFA"
+
+
+def _compressors():
+    """Variantes a generar: sufijo y función de compresión"""
+    # mtime=0 para que el mismo HTML produzca siempre el mismo .gz
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.insert(0, ('.br', lambda data: brotli.compress(data, quality=11)))
+    return compressors
+
+
+def compress_file(source):
+    """Escribe las variantes precomprimidas de un archivo que estén desactualizadas.
+
+    Una variante se considera al día si es más reciente que el original, así
+    que los archivos que no han cambiado no se vuelven a comprimir. Devuelve
+    la lista de variantes escritas.
+    """
+    source = Path(source)
+    source_mtime = source.stat().st_mtime_ns
+    data = None
+    written = []
+
+    for suffix, compress in _compressors():
+        target = source.with_name(source.name + suffix)
+        if target.exists() and target.stat().st_mtime_ns >= source_mtime:
+            continue
+        if data is None:
+            data = source.read_bytes()
+        with open(target, 'wb') as f:
+            f.write(compress(data))
+        written.append(target)
+
+    return written
+
+
+class SiteBuilder:
+    """Escribe las páginas generadas en el directorio de salida local (local.output_path)"""
+
+    def __init__(self, articles_manager, generator, config, output_path=None):
+        self.am = articles_manager
+        self.generator = generator
+        self.config = config
+        self.output_path = Path(output_path or get_option(config, "local", "output_path"))
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        # Bytes ahorrados por la minificación: ruta -> (original, minificado)
+        self.savings = {}
+        # Huella de los archivos de datos (búsqueda, feeds) escritos en esta sesión
+        self.data_fingerprints = {}
+        self.search = SearchIndex(articles_manager)
+        self.feeds = FeedGenerator(articles_manager, config)
+        self.related = RelatedArticles(articles_manager, self.search, config)
+        self.images = ImagePipeline(articles_manager, config, self.output_path)
+        self.generator.images = self.images
+
+    def output_file(self, relpath):
+        """Ruta local de un archivo del sitio"""
+        return self.output_path / relpath
+
+    def write_page(self, relpath, chunks):
+        """Escribe una página por trozos en el directorio de salida.
+
+        Se escribe primero en un temporal; si el resultado es idéntico a lo que
+        ya hay en disco, el archivo no se toca (conserva su fecha), así que sus
+        variantes .gz/.br siguen al día y no se vuelven a comprimir. Con
+        build.minify activado la página se reúne entera para minificarla.
+        """
+        path = self.output_file(relpath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.minify_enabled() and relpath.endswith('.html'):
+            original = b''.join(chunks)
+            minified = minify_html(original.decode('utf-8')).encode('utf-8')
+            self.savings[relpath] = (len(original), len(minified))
+            chunks = [minified]
+        temporary = path.with_name(f".{path.name}{TEMP_SUFFIX}")
+        with open(temporary, 'wb') as f:
+            self.generator.write_chunks(chunks, f)
+        if path.exists() and filecmp.cmp(temporary, path, shallow=False):
+            temporary.unlink()
+        else:
+            os.replace(temporary, path)
+        return path
+    
+    def minify_enabled(self):
+        """Indica si hay que minificar el HTML y el CSS (build.minify)"""
+        return get_option(self.config, "build", "minify")
+    
+    def build_assets(self):
+        """Copia los recursos estáticos (CSS y JS) al directorio de salida.
+
+        Cada recurso se escribe con una huella de su contenido en el nombre
+        (css/style.<hash>.css), así que puede cachearse indefinidamente: si
+        cambia, cambia el nombre. Los que ya existen no se reescriben. Devuelve
+        el mapa nombre original -> nombre con huella, que también usa el
+        generador para enlazarlos desde las páginas.
+        """
+        manifest = {}
+        for relpath in ASSETS:
+            content = (SITE_ROOT / relpath).read_bytes()
+            if self.minify_enabled() and relpath.endswith('.css'):
+                minified = minify_css(content.decode('utf-8')).encode('utf-8')
+                self.savings[relpath] = (len(content), len(minified))
+                content = minified
+            
+            hashed = self.hashed_name(relpath, content)
+            path = self.output_file(hashed)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(content)
+                self._remove_old_versions(relpath, hashed)
+            manifest[relpath] = hashed
+        
+        self.generator.asset_paths = manifest
+        return manifest
+    
+    @staticmethod
+    def hashed_name(relpath, content):
+        """Nombre del recurso con la huella de su contenido: css/style.css -> css/style.<hash>.css"""
+        stem, ext = os.path.splitext(relpath)
+        digest = hashlib.sha256(content).hexdigest()[:ASSET_HASH_LENGTH]
+        return f"{stem}.{digest}{ext}"
+    
+    def _remove_old_versions(self, relpath, current):
+        """Borra del directorio de salida las versiones anteriores de un recurso.
+
+        En el servidor se conservan: las páginas no republicadas las siguen enlazando.
+        """
+        stem, ext = os.path.splitext(relpath)
+        folder = self.output_file(relpath).parent
+        for old in folder.glob(f"{Path(stem).name}.*{ext}"):
+            if old.name != Path(current).name and len(old.suffixes) == 2:
+                self.remove_page(str(old.relative_to(self.output_path)))
+    
+    def savings_report(self):
+        """Líneas con el ahorro de la minificación por archivo (y vacía el registro)"""
+        lines = []
+        for relpath, (original, minified) in sorted(self.savings.items()):
+            saved = original - minified
+            percent = saved * 100 // original if original else 0
+            lines.append(f"{relpath}: {original} → {minified} bytes (-{saved}, {percent}%)")
+        if self.savings:
+            original = sum(o for o, _ in self.savings.values())
+            saved = original - sum(m for _, m in self.savings.values())
+            lines.append(f"TOTAL: -{saved} bytes de {original}")
+        self.savings = {}
+        return lines
+
+    def remove_page(self, relpath):
+        """Elimina del directorio de salida una página y sus variantes"""
+        for suffix in ('', '.br', '.gz'):
+            path = self.output_file(relpath + suffix)
+            if path.exists():
+                path.unlink()
+
+    def build_images(self, articles):
+        """Genera las variantes de las imágenes de los artículos (antes de sus páginas).
+
+        Devuelve sus rutas relativas; llevan huella en el nombre, como los recursos.
+        """
+        return self.images.process(articles)
+
+    def build_article(self, article):
+        """Genera la página de un artículo (y su <id>.json si va aparte).
+
+        Devuelve las rutas relativas en el orden de subida: los datos antes que
+        la página que los pide.
+        """
+        relpaths = []
+        data_file = self.generator.article_data_file(article)
+        if data_file:
+            self.write_page(data_file, self.generator.encode_chunks(self.generator.iter_article_data(article)))
+            relpaths.append(data_file)
+        
+        relpath = f"{article['id']}.html"
+        self.write_page(relpath, self.generator.iter_article_html(article))
+        relpaths.append(relpath)
+        return relpaths
+
+    def update_related(self):
+        """Actualiza los artículos relacionados del índice.
+
+        Devuelve los artículos publicados (completos) cuya página hay que
+        regenerar porque su lista de relacionados ha cambiado.
+        """
+        articles = []
+        for article_id in self.related.update():
+            article = self.am.get_article(article_id)
+            if article and article.get('published', False):
+                articles.append(article)
+        return articles
+
+    def build_listing_pages(self, state=None):
+        """Genera las páginas de listado que han cambiado (index paginado y archivos).
+
+        También feed.xml, sitemap.xml y, con build.search, los fragmentos del
+        índice de búsqueda, que van antes que las páginas en la lista devuelta.
+        """
+        pages, stale = self.generator.generate_listing_pages(self.am.list_articles(), state)
+        for page in pages:
+            self.write_page(page['path'], self.generator.encode_chunks([page['html']]))
+        
+        sources = [self.feeds]
+        if get_option(self.config, "build", "search"):
+            sources.insert(0, self.search)
+        for source in reversed(sources):
+            data_files, data_stale = source.generate_files(state)
+            for data_file in data_files:
+                # Los que no han cambiado desde la última escritura ni se comparan
+                path = data_file['path']
+                if self.data_fingerprints.get(path) == data_file['fingerprint'] and self.output_file(path).exists():
+                    continue
+                self.write_page(path, [data_file['content'].encode('utf-8')])
+                self.data_fingerprints[path] = data_file['fingerprint']
+            pages = data_files + pages
+            stale = data_stale + stale
+        
+        for relpath in stale:
+            self.remove_page(relpath)
+        return pages, stale
+
+    def build_site(self):
+        """Genera el sitio completo (recursos, artículos publicados y listados).
+
+        No usa el estado de publicación: se escriben todas las páginas.
+        Devuelve las rutas relativas generadas.
+        """
+        relpaths = list(self.build_assets().values())
+        self.related.update()
+        articles = []
+        for art in self.am.list_articles():
+            article = self.am.get_article(art['id'])
+            if article and article.get('published', False):
+                articles.append(article)
+        relpaths += self.build_images(articles)
+        for article in articles:
+            relpaths += self.build_article(article)
+        pages, _ = self.build_listing_pages()
+        relpaths += [page['path'] for page in pages]
+        self.build_htaccess()
+        relpaths.append('.htaccess')
+        self.precompress(relpaths)
+        return relpaths
+    
+    def precompress(self, relpaths):
+        """Genera en paralelo las variantes .br/.gz de los archivos indicados.
+
+        zlib y brotli liberan el GIL mientras comprimen, así que un pool de
+        hilos reparte el trabajo entre todos los núcleos.
+        """
+        if not get_option(self.config, "build", "precompress"):
+            return []
+
+        sources = [
+            self.output_file(relpath) for relpath in relpaths
+            if relpath.endswith(COMPRESSIBLE_EXTENSIONS)
+        ]
+        if not sources:
+            return []
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            results = pool.map(compress_file, sources)
+            return [path for written in results for path in written]
+
+    def htaccess_rules(self):
+        """Bloque de reglas de Apache para la caché y las variantes precomprimidas"""
+        types = '|'.join(ext.lstrip('.') for ext in COMPRESSIBLE_EXTENSIONS)
+        mime_types = [
+            ('html', 'text/html'),
+            ('css', 'text/css'),
+            ('js', 'application/javascript'),
+            ('json', 'application/json'),
+            ('xml', 'application/xml'),
+        ]
+
+        lines = [
+            HTACCESS_BEGIN,
+            "# Generado por CTPFA CMS",
+            "AddDefaultCharset UTF-8",
+        ]
+        
+        if get_option(self.config, "build", "precompress"):
+            lines += [
+                "",
+                "# Variantes precomprimidas (.br / .gz)",
+                "<IfModule mod_rewrite.c>",
+                "    RewriteEngine On",
+            ]
+            for suffix, encoding in (('br', 'br'), ('gz', 'gzip')):
+                lines += [
+                    "",
+                    f"    RewriteCond %{{HTTP:Accept-Encoding}} {encoding}",
+                    f"    RewriteCond %{{REQUEST_FILENAME}}.{suffix} -f",
+                    f"    RewriteRule ^(.+)\\.({types})$ $1.$2.{suffix} [L]",
+                ]
+            lines.append("")
+            for ext, mime in mime_types:
+                lines.append(f"    RewriteRule \\.{ext}\\.(br|gz)$ - [T={mime},E=no-gzip:1,E=no-brotli:1]")
+            lines += [
+                "</IfModule>",
+                "<IfModule mod_headers.c>",
+            ]
+            for suffix, encoding in (('br', 'br'), ('gz', 'gzip')):
+                lines += [
+                    f'    <FilesMatch "\\.({types})\\.{suffix}$">',
+                    f"        Header set Content-Encoding {encoding}",
+                    "        Header append Vary Accept-Encoding",
+                    "    </FilesMatch>",
+                ]
+            lines.append("</IfModule>")
+        
+        # Temporales de las subidas atómicas y directorio de la publicación escalonada
+        staging = STAGING_DIR.replace('.', '\\.')
+        temporary = TEMP_SUFFIX.replace('.', '\\.')
+        lines += [
+            "",
+            "# Subidas en curso (no se sirven)",
+            "<IfModule mod_alias.c>",
+            f'    RedirectMatch 404 "/({staging}/|\\.[^/]+{temporary}$)"',
+            "</IfModule>",
+        ]
+        
+        # Los recursos con huella no cambian nunca; las páginas y los datos se revalidan siempre
+        lines += [
+            "",
+            "# Caché",
+            "<IfModule mod_headers.c>",
+            f'    <FilesMatch "\\.[0-9a-f]{{{ASSET_HASH_LENGTH}}}\\.(css|js|webp|jpe?g|png|gif)(\\.(br|gz))?$">',
+            '        Header set Cache-Control "public, max-age=31536000, immutable"',
+            "    </FilesMatch>",
+            '    <FilesMatch "\\.(html|json|xml)(\\.(br|gz))?$">',
+            '        Header set Cache-Control "no-cache"',
+            "    </FilesMatch>",
+            "</IfModule>",
+            HTACCESS_END,
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def build_htaccess(self):
+        """Escribe el .htaccess del sitio en el directorio de salida"""
+        rules = self.htaccess_rules()
+        self.write_page('.htaccess', [rules.encode('utf-8')])
+        return rules
+
+    @staticmethod
+    def merge_htaccess(existing, rules):
+        """Sustituye (o añade) el bloque del CMS en un .htaccess existente.
+
+        Todo lo que haya fuera de las marcas BEGIN/END CTPFA se conserva.
+        """
+        existing = existing or ""
+        start = existing.find(HTACCESS_BEGIN)
+        end = existing.find(HTACCESS_END)
+        if start != -1 and end != -1:
+            end += len(HTACCESS_END)
+            if existing[end:end + 1] == '\n':
+                end += 1
+            return existing[:start] + rules + existing[end:]
+        if existing and not existing.endswith('\n'):
+            existing += '\n'
+        return existing + rules
+
+
+def _hash_tree(root):
+    """Huella de cada archivo bajo un directorio: ruta relativa -> sha256"""
+    root = Path(root)
+    return {
+        path.relative_to(root).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+        for path in sorted(root.rglob('*')) if path.is_file()
+    }
+
+
+def verify_reproducible(articles_manager, config):
+    """Genera el sitio dos veces desde cero y compara el resultado byte a byte.
+
+    Cada pasada usa un generador nuevo y su propio directorio temporal, y
+    después se deja articles/ como estaba (índice con los relacionados y
+    cachés de búsqueda e imágenes), así que las dos parten de lo mismo y la
+    comprobación no cambia nada fuera de sus temporales. Devuelve la lista
+    ordenada de archivos que difieren o que solo aparecen en una de las dos;
+    vacía si el build es reproducible.
+    """
+    articles_path = articles_manager.articles_path
+    state_files = [
+        articles_manager.index_file,
+        articles_path / SearchIndex.CACHE_FILENAME,
+        articles_path / ImagePipeline.CACHE_FILENAME,
+    ]
+    trees = []
+    for _ in range(2):
+        saved = _snapshot(state_files)
+        index = copy.deepcopy(articles_manager.articles)
+        try:
+            with tempfile.TemporaryDirectory(prefix="ctpfa-build-") as output_path:
+                generator = HTMLGenerator(articles_manager, config)
+                SiteBuilder(articles_manager, generator, config, output_path).build_site()
+                trees.append(_hash_tree(output_path))
+        finally:
+            articles_manager.articles = index
+            _restore(saved)
+    
+    first, second = trees
+    return sorted(
+        relpath for relpath in first.keys() | second.keys()
+        if first.get(relpath) != second.get(relpath)
+    )
+
+
+def _snapshot(paths):
+    """Contenido y fechas de unos archivos (None si no existen)"""
+    saved = {}
+    for path in paths:
+        path = Path(path)
+        saved[path] = (path.read_bytes(), path.stat()) if path.exists() else None
+    return saved
+
+
+def _restore(saved):
+    """Deja los archivos como estaban en _snapshot (sin tocar los que no han cambiado)"""
+    for path, original in saved.items():
+        if original is None:
+            if path.exists():
+                path.unlink()
+            continue
+        data, stat = original
+        if path.exists() and path.read_bytes() == data:
+            continue
+        path.write_bytes(data)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
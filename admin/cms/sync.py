@@ -0,0 +1,338 @@
+"""
+Sincronización por diferencias con el servidor para CTPFA CMS
+"""
+
+import hashlib
+import json
+
+import paramiko
+
+from .config import get_option
+from .manifest import RemoteManifest, MANIFEST_FILENAME
+from .uploader import COMPRESSED_SUFFIXES, STAGING_DIR, TEMP_SUFFIX
+
+
+# Versión de la caché de huellas locales
+CACHE_VERSION = 1
+
+# Archivos del directorio de salida que no se sincronizan: el .htaccess se
+# fusiona con el del servidor aparte (ver RetroCMSApp.upload_htaccess)
+EXCLUDED = ('.htaccess', MANIFEST_FILENAME)
+
+
+class SyncPlanner:
+    """Compara el sitio generado en local con lo que hay en el servidor y sube solo las diferencias.
+
+    El estado remoto se lee del manifiesto (ctpfa-manifest.json), que guarda
+    la huella sha256 y el tamaño de cada archivo subido. Si no existe (primera
+    sincronización, o sitio subido a mano) se recurre al listado del servidor:
+    un archivo se da por igual si coincide el tamaño y la copia remota es
+    posterior al último cambio de contenido en local.
+
+    Las variantes .br/.gz viajan siempre con su archivo y no cuentan aparte.
+    Las huellas locales se guardan en una caché (articles/.sync_cache.json)
+    junto con la marca de cada archivo para no releer los que no cambian.
+
+    Si la conexión se pierde antes de poder guardar el manifiesto, lo que
+    sí llegó se anota en articles/.sync_pending.json y la siguiente
+    sincronización con el mismo servidor continúa desde ahí.
+    """
+
+    CACHE_FILENAME = ".sync_cache.json"
+    PENDING_FILENAME = ".sync_pending.json"
+
+    def __init__(self, site_builder):
+        self.builder = site_builder
+        self.cache_file = site_builder.am.articles_path / self.CACHE_FILENAME
+        self.pending_file = site_builder.am.articles_path / self.PENDING_FILENAME
+        self.cache = self.load_cache()
+
+    def load_cache(self):
+        """Carga la caché de huellas locales (se descarta si es de otra versión)"""
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    return data.get("files", {})
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {}
+
+    def save_cache(self):
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_VERSION, "files": self.cache}, f,
+                      ensure_ascii=False, sort_keys=True)
+
+    def pending_target(self, manifest):
+        """Servidor y manifiesto a los que corresponde una sincronización a medias"""
+        return f"{get_option(self.builder.config, 'server', 'host')}:{manifest.remote_file}"
+
+    def load_pending(self, manifest):
+        """Añade al manifiesto lo que llegó en una sincronización que no pudo guardarlo"""
+        if not self.pending_file.exists():
+            return False
+        try:
+            with open(self.pending_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if data.get("version") != CACHE_VERSION or data.get("target") != self.pending_target(manifest):
+            return False
+        manifest.files.update(data.get("files", {}))
+        manifest.articles.update(data.get("articles", {}))
+        return True
+
+    def save_pending(self, manifest):
+        with open(self.pending_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_VERSION, "target": self.pending_target(manifest),
+                       "files": manifest.files, "articles": manifest.articles},
+                      f, ensure_ascii=False, sort_keys=True)
+
+    def clear_pending(self):
+        if self.pending_file.exists():
+            self.pending_file.unlink()
+
+    def local_files(self, relpaths):
+        """Huella, tamaño y fecha del último cambio de contenido de los archivos generados.
+
+        'bytes' incluye las variantes comprimidas, que se suben con el archivo.
+        """
+        files = {}
+        for relpath in relpaths:
+            if relpath in EXCLUDED or relpath.endswith(COMPRESSED_SUFFIXES):
+                continue
+            path = self.builder.output_file(relpath)
+            stat = path.stat()
+            stamp = [stat.st_mtime_ns, stat.st_size]
+            cached = self.cache.get(relpath)
+            if not cached or cached['stamp'] != stamp:
+                digest = hashlib.sha256(path.read_bytes()).hexdigest()
+                # Reescribir un archivo con el mismo contenido no cuenta como cambio;
+                # si no hay caché, el cambio es de cuando se escribió el archivo
+                changed = cached['changed'] if cached and cached['hash'] == digest else int(stat.st_mtime)
+                cached = {'stamp': stamp, 'hash': digest, 'size': stat.st_size, 'changed': changed}
+                self.cache[relpath] = cached
+            variants = sum(
+                self.builder.output_file(relpath + suffix).stat().st_size
+                for suffix in COMPRESSED_SUFFIXES
+                if self.builder.output_file(relpath + suffix).exists()
+            )
+            files[relpath] = dict(cached, bytes=stat.st_size + variants)
+        self.save_cache()
+        return files
+
+    def remote_files(self, uploader, remote_path):
+        """Estado remoto: (manifiesto, archivos, origen).
+
+        El origen es 'manifest', 'listing' (listado del servidor) o 'none'
+        (el servidor no permite listar: se sube todo).
+        """
+        manifest = RemoteManifest(remote_path).load(uploader)
+        if self.load_pending(manifest):
+            manifest.found = True
+        if manifest.found:
+            return manifest, manifest.files, 'manifest'
+
+        listing = uploader.list_tree(remote_path)
+        if listing is None:
+            return manifest, {}, 'none'
+        return manifest, {
+            path: entry for path, entry in listing.items()
+            if path not in EXCLUDED and not path.endswith(COMPRESSED_SUFFIXES)
+            and not path.endswith(TEMP_SUFFIX) and not path.startswith(f"{STAGING_DIR}/")
+        }, 'listing'
+
+    def plan(self, uploader, remote_path, relpaths):
+        """Plan de sincronización: qué archivos añadir, cambiar y borrar.
+
+        Solo se borran archivos que figuran en el manifiesto, es decir, que
+        subió el propio CMS; lo que haya en el servidor por otras vías no se toca.
+        """
+        local = self.local_files(relpaths)
+        manifest, remote, source = self.remote_files(uploader, remote_path)
+
+        add, change = [], []
+        for path, entry in sorted(local.items()):
+            current = remote.get(path)
+            if current is None:
+                add.append(path)
+            elif source == 'manifest':
+                if current.get('hash') != entry['hash']:
+                    change.append(path)
+            elif current['size'] != entry['size'] or (current['mtime'] or 0) < entry['changed']:
+                change.append(path)
+
+        delete = sorted(set(remote) - set(local)) if source == 'manifest' else []
+        return {
+            'source': source,
+            'add': add,
+            'change': change,
+            'delete': delete,
+            'unchanged': len(local) - len(add) - len(change),
+            'bytes': sum(local[path]['bytes'] for path in add + change),
+            'local': local,
+            'manifest': manifest,
+        }
+
+    @staticmethod
+    def describe(plan, limit=None):
+        """Líneas de texto con el plan (simulación): cada archivo y los totales"""
+        sources = {
+            'manifest': "según el manifiesto del servidor",
+            'listing': "según el listado del servidor (sin manifiesto)",
+            'none': "sin datos del servidor: se sube todo",
+        }
+        lines = [f"Plan de sincronización ({sources[plan['source']]}):"]
+        for mark, key in (('+', 'add'), ('~', 'change'), ('-', 'delete')):
+            paths = plan[key]
+            for path in paths[:limit]:
+                size = plan['local'][path]['bytes'] if key != 'delete' else None
+                lines.append(f"  {mark} {path}" + (f" ({size} bytes)" if size is not None else ""))
+            if limit is not None and len(paths) > limit:
+                lines.append(f"  {mark} ... y {len(paths) - limit} más")
+        lines.append(f"Añadir: {len(plan['add'])} · Cambiar: {len(plan['change'])} · "
+                     f"Borrar: {len(plan['delete'])} · Sin cambios: {plan['unchanged']}")
+        lines.append(f"Total a subir: {plan['bytes']} bytes")
+        return lines
+
+    def execute(self, plan, transfers, uploader, remote_path, progress=None, articles=()):
+        """Aplica el plan: sube, borra y deja el manifiesto actualizado en el servidor.
+
+        Si server.bundle_deploy está activo y el servidor permite ejecutar
+        órdenes por SSH, todo va en un solo paquete (ver _execute_bundle);
+        si no, los datos, recursos e imágenes se suben antes que las páginas
+        HTML, e index.html el último. Si algo falla no se borra nada y el
+        manifiesto solo recoge lo que llegó, así que la siguiente
+        sincronización lo repite. 'articles' son los artículos publicados,
+        que pasan a ser los del manifiesto. Devuelve el informe de la subida
+        con la lista 'deleted', 'bundle' (si se desplegó en paquete) y
+        'bundle_error' (por qué no, si se intentó).
+        """
+        def job(path, directory=remote_path):
+            return (self.builder.output_file(path), f"{directory}/{path}")
+
+        uploads = plan['add'] + plan['change']
+        resources = [path for path in uploads if not path.endswith('.html')]
+        pages = [path for path in uploads if path.endswith('.html') and path != 'index.html']
+        final = [path for path in uploads if path == 'index.html']
+
+        report, bundle_error = None, None
+        if get_option(self.builder.config, "server", "bundle_deploy") and uploads:
+            report, bundle_error = self._execute_bundle(uploader, remote_path, progress,
+                                                        resources + pages + final, plan['delete'])
+        if report is None:
+            if get_option(self.builder.config, "server", "staged_release") and uploads:
+                report = self._execute_staged(transfers, uploader, remote_path, progress, job,
+                                              resources, pages, final)
+            else:
+                report = transfers.upload_many([job(path) for path in resources], progress, uploader=uploader)
+                if report['errors']:
+                    report['skipped'] = [job(path)[1] for path in pages + final]
+                else:
+                    pages_report = transfers.upload_many([job(path) for path in pages], progress,
+                                                         final=[job(path) for path in final], uploader=uploader)
+                    for key in ('files', 'bytes'):
+                        report[key] += pages_report[key]
+                    report['errors'] = pages_report['errors']
+                    report['skipped'] = pages_report['skipped']
+
+            report['bundle'] = False
+            report['deleted'] = []
+            if not report['errors']:
+                for path in plan['delete']:
+                    try:
+                        uploader.delete_with_variants(f"{remote_path}/{path}")
+                    except Exception:
+                        pass  # Ya no estaba en el servidor
+                    report['deleted'].append(path)
+        report['bundle_error'] = bundle_error
+
+        # Manifiesto: lo que ya estaba, más lo subido, menos lo borrado
+        manifest = plan['manifest']
+        missing = {remote for remote, _ in report['errors']} | set(report['skipped'])
+        if plan['source'] != 'manifest':
+            manifest.files = {}
+        for path, entry in plan['local'].items():
+            if f"{remote_path}/{path}" not in missing:
+                manifest.files[path] = {'hash': entry['hash'], 'size': entry['size']}
+        for path in report['deleted']:
+            manifest.remove_file(path)
+        published = {}
+        for article in articles:
+            page = f"{article['id']}.html"
+            if f"{remote_path}/{page}" in missing:
+                # Sigue lo que hubiera antes: la página nueva no llegó
+                if article['id'] in manifest.articles:
+                    published[article['id']] = manifest.articles[article['id']]
+            else:
+                manifest.add_article(article, self.builder.output_file(page))
+                published[article['id']] = manifest.articles[article['id']]
+        manifest.articles = published
+        try:
+            manifest.save(uploader)
+        except Exception:
+            # Sin manifiesto en el servidor, lo subido se recuerda en local
+            self.save_pending(manifest)
+            raise
+        self.clear_pending()
+        return report
+
+    def _execute_bundle(self, uploader, remote_path, progress, uploads, delete):
+        """Despliegue en un solo paquete tar.gz por SSH (ver FileUploader.upload_bundle).
+
+        Un viaje en lugar de varios por archivo, y el sitio cambia de golpe
+        con los borrados incluidos. Devuelve (informe, None) o, si hay que
+        subir archivo a archivo, (None, motivo).
+        """
+        done = []
+
+        def added(relpath, size):
+            done.append(relpath)
+            if progress:
+                progress(len(done), len(uploads), f"{remote_path}/{relpath}", size, None)
+
+        files = [(self.builder.output_file(path), path) for path in uploads]
+        try:
+            sent = uploader.upload_bundle(files, remote_path, delete, added)
+        except (IOError, paramiko.SSHException) as e:
+            return None, str(e)
+        if sent is None:
+            return None, "el servidor no permite ejecutar órdenes por SSH"
+        return {'files': len(uploads), 'bytes': sent, 'errors': [], 'skipped': [],
+                'bundle': True, 'deleted': list(delete)}, None
+
+    @staticmethod
+    def _execute_staged(transfers, uploader, remote_path, progress, job, resources, pages, final):
+        """Publicación escalonada: todo se sube a STAGING_DIR y después se pasa a su sitio renombrando.
+
+        Mientras dura la subida el sitio publicado no cambia; si algo falla
+        no se mueve nada. El paso a producción solo son renombrados (sin
+        datos), en el mismo orden que una subida normal: recursos, páginas
+        e index.html.
+        """
+        staging = f"{remote_path}/{STAGING_DIR}"
+        uploads = resources + pages + final
+        report = transfers.upload_many([job(path, staging) for path in uploads], progress,
+                                       uploader=uploader, atomic=False)
+        failed = {remote for remote, _ in report['errors']}
+        report['errors'] = [(remote.replace(staging, remote_path, 1), message)
+                            for remote, message in report['errors']]
+        if failed:
+            # Lo que llegó a la preparación se queda allí: la próxima vez se vuelve a subir
+            report['skipped'] = [job(path)[1] for path in uploads if job(path, staging)[1] not in failed]
+            return report
+
+        def move(path):
+            local, target = job(path)
+            return (local, job(path, staging)[1], target)
+
+        moved = transfers.move_many([move(path) for path in resources], uploader=uploader)
+        if moved['errors']:
+            moved['skipped'] = [job(path)[1] for path in pages + final]
+        else:
+            moved = transfers.move_many([move(path) for path in pages], final=[move(path) for path in final],
+                                        uploader=uploader)
+        report['errors'] = moved['errors']
+        report['skipped'] = moved['skipped']
+        return report
@@ -0,0 +1,97 @@
+"""
+Motor de plantillas compiladas para CTPFA CMS
+"""
+
+from pathlib import Path
+from string import Template
+
+# Plantillas de serie incluidas con el CMS
+DEFAULT_TEMPLATES_DIR = Path(__file__).parent / "templates"
+
+
+class CompiledTemplate:
+    """Plantilla ${variable} partida una sola vez en trozos fijos y variables"""
+    
+    def __init__(self, text, version=None):
+        self.parts = self.compile(text)
+        # Identifica la versión cargada (ruta y fecha de modificación)
+        self.version = version
+    
+    @staticmethod
+    def compile(text):
+        """Parte el texto en una lista de tuplas (es_variable, texto).
+
+        Los marcadores que no son variables válidas (como los ${...} de
+        JavaScript) se conservan tal cual, igual que con safe_substitute.
+        """
+        parts = []
+        pos = 0
+        for match in Template.pattern.finditer(text):
+            name = match.group('named') or match.group('braced')
+            if match.group('escaped') is not None:
+                literal = '$'
+            elif name is not None:
+                literal = None
+            else:
+                continue
+            parts.append((False, text[pos:match.start()]))
+            parts.append((True, name) if literal is None else (False, literal))
+            pos = match.end()
+        parts.append((False, text[pos:]))
+        return parts
+    
+    def iter_render(self, values):
+        """Produce los trozos de la plantilla con las variables sustituidas"""
+        for is_var, text in self.parts:
+            if is_var:
+                yield str(values[text]) if text in values else f'${{{text}}}'
+            else:
+                yield text
+    
+    def render(self, values):
+        return ''.join(self.iter_render(values))
+
+
+class TemplateEngine:
+    """Carga las plantillas de templates_path (o las de serie) y las mantiene compiladas.
+
+    Una plantilla de templates_path sustituye a la de serie con el mismo nombre.
+    Cada plantilla se compila una vez y solo se vuelve a leer del disco cuando
+    cambia su fecha de modificación.
+    """
+    
+    def __init__(self, templates_path=None):
+        self.search_path = [Path(templates_path)] if templates_path else []
+        self.search_path.append(DEFAULT_TEMPLATES_DIR)
+        self._cache = {}
+    
+    def locate(self, name):
+        """Devuelve la ruta y la fecha de modificación de la plantilla a usar"""
+        for directory in self.search_path:
+            path = directory / name
+            try:
+                return path, path.stat().st_mtime_ns
+            except OSError:
+                continue
+        raise FileNotFoundError(f"Plantilla {name} no encontrada")
+    
+    def get(self, name):
+        """Obtiene la plantilla compilada, recargándola si ha cambiado en disco"""
+        path, mtime = self.locate(name)
+        cached = self._cache.get(name)
+        if cached is not None and cached.version == (str(path), mtime):
+            return cached
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # El salto de línea final que añaden los editores no forma parte de la plantilla
+        if text.endswith('\n'):
+            text = text[:-1]
+        
+        template = CompiledTemplate(text, version=(str(path), mtime))
+        self._cache[name] = template
+        return template
+    
+    def signature(self, names):
+        """Versiones de las plantillas indicadas; cambia al editar cualquiera de ellas"""
+        return [(name, *map(str, self.locate(name))) for name in names]
@@ -0,0 +1,150 @@
+"""
+Subidas en paralelo por varias conexiones para CTPFA CMS
+"""
+
+import queue
+import threading
+
+
+class TransferEngine:
+    """Reparte un lote de subidas entre varias sesiones del pool de conexiones.
+
+    Cada hilo trabaja con su propia sesión (otra conexión FTP u otro canal
+    SFTP) y va tomando archivos de una cola común; como mucho se usan
+    server.max_connections sesiones. El progreso y los errores se reúnen en
+    el hilo que llama, así que el callback de progreso nunca se ejecuta en
+    paralelo consigo mismo.
+
+    No necesita bucle de eventos: es el motor del código bloqueante que no
+    corre dentro de la aplicación (scripts). La aplicación usa
+    AsyncTransferEngine, cuyos lotes se pueden cancelar, y su
+    BlockingTransfers tiene esta misma interfaz.
+    """
+
+    # Aviso de que un hilo ha terminado (cola vacía, sin sesión o sesión rota)
+    _NO_SESSION = object()
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def upload_many(self, files, progress=None, final=(), uploader=None, atomic=None):
+        """Sube [(ruta local, ruta remota)] y, después, los archivos de 'final'.
+
+        Los de 'final' (p. ej. index.html) solo se suben si todo lo anterior
+        ha llegado bien, para que el sitio nunca enlace páginas que no están.
+        Si el llamante ya tiene una sesión del pool la puede pasar en
+        'uploader': la usa uno de los hilos, así que no cuenta dos veces.
+
+        progress(hechos, total, ruta remota, bytes, error) se llama tras cada
+        archivo. Devuelve un dict con 'files', 'bytes', 'errors' (lista de
+        (ruta remota, mensaje)) y 'skipped' (los finales que no se subieron).
+        'atomic' se pasa a FileUploader.upload_with_variants.
+        """
+        def upload(session, job):
+            local, remote = job
+            return session.upload_with_variants(local, remote, atomic)
+        return self._batch(upload, files, final, progress, uploader)
+
+    def move_many(self, moves, progress=None, final=(), uploader=None):
+        """Mueve en el servidor [(ruta local, origen, destino)] con sus variantes.
+
+        Igual que upload_many, pero solo renombra: sirve para pasar a su
+        sitio lo que se ha subido antes a otro directorio. La ruta local
+        indica qué variantes comprimidas acompañan a cada archivo.
+        """
+        def move(session, job):
+            local, source, target = job
+            return session.rename_with_variants(source, target, local)
+        return self._batch(move, moves, final, progress, uploader)
+
+    def _batch(self, operation, jobs, final, progress, uploader):
+        """Aplica la operación a los trabajos en paralelo y después, si nada ha fallado, a los finales"""
+        jobs, final = list(jobs), list(final)
+        report = {'files': 0, 'bytes': 0, 'errors': [], 'skipped': []}
+        total = len(jobs) + len(final)
+
+        self._run(operation, jobs, progress, report, total, uploader)
+        if report['errors']:
+            report['skipped'] = [job[-1] for job in final]
+        else:
+            self._run(operation, final, progress, report, total, uploader)
+        return report
+
+    def _run(self, operation, jobs, progress, report, total, uploader):
+        """Procesa una tanda de archivos en paralelo y espera a que terminen todos"""
+        if not jobs:
+            return
+        tasks = queue.Queue()
+        for job in jobs:
+            tasks.put(job)
+        results = queue.Queue()
+
+        workers = min(self.pool.limit(), len(jobs))
+        threads = [
+            threading.Thread(target=self._worker, args=(operation, tasks, results, uploader if i == 0 else None),
+                             daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        pending = len(jobs)
+        alive = workers
+        while pending:
+            remote, sent, error = results.get()
+            if remote is self._NO_SESSION:
+                alive -= 1
+                if alive:
+                    continue
+                # Ningún hilo pudo conectarse: lo que queda en la cola falla con ese error
+                while True:
+                    try:
+                        job = tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    results.put((job[-1], 0, error))
+                continue
+            pending -= 1
+            if error is None:
+                report['files'] += 1
+                report['bytes'] += sent
+            else:
+                report['errors'].append((remote, str(error)))
+            if progress:
+                progress(report['files'] + len(report['errors']), total, remote, sent, error)
+
+        for thread in threads:
+            thread.join()
+
+    def _worker(self, operation, tasks, results, uploader=None):
+        """Hilo de trabajo: toma archivos de la cola mientras su sesión funcione"""
+        own_session = uploader is None
+        if own_session:
+            try:
+                # Los hilos extra no esperan: si el servidor no admite más sesiones, sobran
+                uploader = self.pool.acquire(blocking=False)
+            except Exception as e:
+                results.put((self._NO_SESSION, 0, e))
+                return
+            if uploader is None:
+                results.put((self._NO_SESSION, 0, ConnectionError("Sin conexiones libres con el servidor")))
+                return
+        try:
+            while True:
+                try:
+                    job = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    results.put((job[-1], operation(uploader, job), None))
+                except Exception as e:
+                    results.put((job[-1], 0, e))
+                    # Los reintentos y la reconexión ya los hace la sesión (ver retry.py)
+                    if self.pool.breaker.is_open() or not uploader.is_alive():
+                        # Servidor caído o sesión rota: los demás hilos siguen con el resto de la cola
+                        results.put((self._NO_SESSION, 0, e))
+                        return
+            results.put((self._NO_SESSION, 0, None))
+        finally:
+            if own_session:
+                self.pool.release(uploader)
@@ -0,0 +1,58 @@
+"""
+Registro de transferencias a medias para CTPFA CMS
+"""
+
+import json
+import threading
+from pathlib import Path
+
+
+class TransferJournal:
+    """Anota en local las transferencias grandes en curso para poder reanudarlas.
+
+    Cada entrada identifica un archivo que se está subiendo o descargando
+    (dónde va y la marca de la copia de origen); lo que ya se ha transferido
+    no se anota, se mide al reanudar (tamaño del temporal remoto o del .part
+    local). Si el origen ha cambiado desde entonces, la entrada no sirve y se
+    empieza de cero. Las entradas se borran al terminar bien la transferencia.
+
+    Varias sesiones del pool comparten el archivo: cada operación lo lee y lo
+    escribe entero bajo un mismo cerrojo.
+    """
+
+    FILENAME = ".transfer_journal.json"
+
+    _lock = threading.Lock()
+
+    def __init__(self, journal_file):
+        self.journal_file = Path(journal_file)
+
+    def load(self):
+        if self.journal_file.exists():
+            try:
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {}
+
+    def save(self, entries):
+        self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=4, ensure_ascii=False, sort_keys=True)
+
+    def get(self, key):
+        with self._lock:
+            return self.load().get(key)
+
+    def record(self, key, entry):
+        with self._lock:
+            entries = self.load()
+            entries[key] = entry
+            self.save(entries)
+
+    def remove(self, key):
+        with self._lock:
+            entries = self.load()
+            if entries.pop(key, None) is not None:
+                self.save(entries)
@@ -2,11 +2,68 @@
 Gestión de subida de archivos por FTP/SFTP para CTPFA CMS
 """
 
+import calendar
+import errno
 import ftplib
+import gzip
+import hashlib
 import io
 import os
+import shlex
+import socket
+import stat
+import tarfile
+import threading
+import time
+from pathlib import Path
 import paramiko
 
+from .config import get_option
+from .retry import CircuitBreaker, call_with_retries, is_transient, retrying
+from .transfer_journal import TransferJournal
+
+
+# Variantes precomprimidas que acompañan a un archivo en el servidor
+COMPRESSED_SUFFIXES = ('.br', '.gz')
+
+# Los archivos se suben a un temporal (.<nombre>.tmp) y se renombran al terminar
+TEMP_SUFFIX = ".tmp"
+
+# Directorio de la ruta remota donde se prepara una publicación escalonada
+STAGING_DIR = ".ctpfa-staging"
+
+# Tamaño de bloque de las subidas por FTP (el de ftplib.storbinary)
+FTP_BLOCK_SIZE = 8192
+
+# Búfer de lectura y escritura de los archivos SFTP; cada petición lleva
+# como mucho 32 KB, así que un bloque son varias peticiones encadenadas
+SFTP_BUFFER_SIZE = 1024 * 1024
+
+# Directorios hermanos de la ruta remota donde se prepara un despliegue en
+# paquete (el sitio nuevo) y donde queda un momento el anterior
+BUNDLE_NEW_SUFFIX = ".ctpfa-new"
+BUNDLE_OLD_SUFFIX = ".ctpfa-old"
+
+# Si la ruta remota es un enlace simbólico, las versiones se alternan entre
+# estos dos directorios hermanos y se cambia el enlace
+BUNDLE_RELEASE_SUFFIXES = (".ctpfa-a", ".ctpfa-b")
+BUNDLE_LINK_SUFFIX = ".ctpfa-link"
+
+# Nivel gzip del paquete: buena parte son variantes .br/.gz que ya no encogen
+BUNDLE_COMPRESSLEVEL = 1
+
+# Sufijo de las descargas a medias en local
+PARTIAL_SUFFIX = ".part"
+
+# Lecturas SFTP anticipadas en vuelo a la vez al descargar a disco (32 KB cada una)
+PREFETCH_REQUESTS = 64
+
+# Algoritmos que se piden a la extensión SFTP check-file, por orden de
+# preferencia; el servidor responde con el primero que tenga y se reconoce
+# por la longitud de la huella
+CHECK_ALGORITHMS = "sha256,sha1,md5"
+DIGEST_ALGORITHMS = {32: "sha256", 20: "sha1", 16: "md5"}
+
 
 def build_web_url(server_config, filename=""):
     """Construye la URL web a partir de la configuración del servidor FTP.
@@ -53,6 +110,66 @@ def build_web_url(server_config, filename=""):
     return url
 
 
+def temporary_path(remote_path):
+    """Temporal de subida de un archivo remoto: .<nombre>.tmp en el mismo directorio"""
+    directory, name = os.path.split(remote_path)
+    return os.path.join(directory, f".{name}{TEMP_SUFFIX}")
+
+
+def file_digest(path, algorithm="sha256"):
+    """Huella (objeto de hashlib) de un archivo local, leído por bloques"""
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(SFTP_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest
+
+
+def _mlsd_time(value):
+    """Fecha 'modify' de MLSD (AAAAMMDDHHMMSS en UTC) como marca de tiempo"""
+    if not value:
+        return None
+    return calendar.timegm(time.strptime(value[:14], '%Y%m%d%H%M%S'))
+
+
+class ChunkReader:
+    """Adapta un iterador de trozos de bytes a un objeto con read() (para ftplib)"""
+    
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.bytes_read += len(data)
+        return data
+
+
+class ChannelWriter:
+    """Objeto con write() que envía por la entrada estándar de un canal SSH (para gzip/tarfile)"""
+    
+    def __init__(self, channel):
+        self.channel = channel
+        self.bytes_written = 0
+    
+    def write(self, data):
+        self.channel.sendall(data)
+        self.bytes_written += len(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+
+
 class FileUploader:
     """Gestiona la subida de archivos por FTP o SFTP"""
     
@@ -65,6 +182,15 @@ class FileUploader:
         self.sftp: paramiko.SFTPClient | None = None
         # FTP
         self.ftp: ftplib.FTP | None = None
+        # Sesiones SFTP que comparten la conexión SSH (ver open_channel) y su cerrojo
+        self._ssh_users = None
+        # Directorios remotos que ya se sabe que existen (ahorra una consulta por archivo)
+        self._known_dirs = set()
+        # Transferencias grandes a medias, para reanudarlas
+        self.journal = TransferJournal(
+            Path(get_option(config, "local", "articles_path")) / TransferJournal.FILENAME)
+        # Cortacircuitos de las operaciones con el servidor (el pool lo comparte entre sus sesiones)
+        self.breaker = CircuitBreaker(config)
     
     def connect(self):
         """Establece conexión según el protocolo configurado"""
@@ -79,8 +205,8 @@ class FileUploader:
         
         self.ftp = ftplib.FTP()
         self.ftp.set_debuglevel(0)
-        # Timeout de 30 segundos
-        self.ftp.connect(server["host"], server["port"], timeout=30)
+        # Tiempo máximo de espera (server.timeout) de la conexión y de cada respuesta
+        self.ftp.connect(server["host"], server["port"], timeout=get_option(self.config, "server", "timeout"))
         self.ftp.login(server["username"], server.get("password", ""))
         # Intentar modo pasivo (más compatible con firewalls)
         self.ftp.set_pasv(True)
@@ -112,9 +238,43 @@ class FileUploader:
         else:
             connect_kwargs["look_for_keys"] = True
             connect_kwargs["allow_agent"] = True
+        # Compresión zlib del transporte SSH (si el servidor la admite)
+        connect_kwargs["compress"] = get_option(self.config, "server", "compression")
+        # Tiempo máximo de espera (server.timeout) en cada fase de la conexión
+        timeout = get_option(self.config, "server", "timeout")
+        for phase in ("timeout", "banner_timeout", "auth_timeout", "channel_timeout"):
+            connect_kwargs[phase] = timeout
         
         self.ssh_client.connect(**connect_kwargs)
-        self.sftp = self.ssh_client.open_sftp()
+        transport = self.ssh_client.get_transport()
+        # Paquetes de keepalive para que el servidor no cierre la sesión inactiva
+        transport.set_keepalive(get_option(self.config, "server", "keepalive"))
+        # Ventana y paquete de los canales que se abran (este y los de open_channel):
+        # con más ventana caben más datos en vuelo antes de esperar al otro extremo
+        transport.default_window_size = get_option(self.config, "server", "window_size")
+        transport.default_max_packet_size = get_option(self.config, "server", "max_packet_size")
+        self.sftp = self._open_sftp(self.ssh_client)
+        self._ssh_users = {'count': 1, 'lock': threading.Lock()}
+    
+    def _open_sftp(self, ssh_client):
+        """Sesión SFTP cuyas peticiones fallan si no hay respuesta en server.timeout segundos"""
+        sftp = ssh_client.open_sftp()
+        sftp.get_channel().settimeout(get_option(self.config, "server", "timeout"))
+        return sftp
+    
+    def open_channel(self):
+        """Otra sesión SFTP sobre la misma conexión SSH: un canal más, sin volver a autenticarse.
+
+        La conexión SSH se cierra cuando se desconecta la última sesión que la usa.
+        """
+        channel = type(self)(self.config)
+        channel.ssh_client = self.ssh_client
+        channel.sftp = self._open_sftp(self.ssh_client)
+        channel.breaker = self.breaker
+        with self._ssh_users['lock']:
+            self._ssh_users['count'] += 1
+        channel._ssh_users = self._ssh_users
+        return channel
     
     def disconnect(self):
         """Cierra la conexión"""
@@ -122,7 +282,13 @@ class FileUploader:
             if self.sftp:
                 self.sftp.close()
             if self.ssh_client:
-                self.ssh_client.close()
+                last_user = True
+                if self._ssh_users:
+                    with self._ssh_users['lock']:
+                        self._ssh_users['count'] -= 1
+                        last_user = self._ssh_users['count'] <= 0
+                if last_user:
+                    self.ssh_client.close()
         else:
             if self.ftp:
                 try:
@@ -130,33 +296,426 @@ class FileUploader:
                 except:
                     self.ftp.close()
     
-    def upload_file(self, local_path, remote_path):
-        """Sube un archivo"""
+    def reconnect(self):
+        """Cierra lo que quede de la sesión y abre otra en el mismo objeto"""
+        try:
+            self.disconnect()
+        except Exception:
+            pass  # La conexión ya estaba rota
+        self.ssh_client = self.sftp = self.ftp = None
+        self._ssh_users = None
+        self.connect()
+    
+    def recover(self, error):
+        """Tras un fallo pasajero, vuelve a conectar si la sesión ya no sirve.
+
+        Si se agotó el tiempo de una petición se reconecta siempre: su
+        respuesta aún puede llegar y confundirse con la de la siguiente.
+        """
+        if isinstance(error, socket.timeout) or not self.is_alive():
+            self.reconnect()
+    
+    def connection_lost(self):
+        """Comprueba sin enviar nada si la conexión se ha cerrado"""
         if self.protocol == "sftp":
-            if self.sftp is None:
-                raise ConnectionError("No hay conexión SFTP activa")
-            self.sftp.put(str(local_path), remote_path)
-        else:
-            if self.ftp is None:
-                raise ConnectionError("No hay conexión FTP activa")
-            with open(local_path, 'rb') as f:
-                self.ftp.storbinary(f'STOR {remote_path}', f)
+            transport = self.ssh_client.get_transport() if self.ssh_client else None
+            return (self.sftp is None or transport is None or not transport.is_active()
+                    or self.sftp.get_channel().closed)
+        return self.ftp is None or self.ftp.sock is None
+    
+    def is_alive(self):
+        """Comprueba con una petición mínima que la sesión sigue abierta"""
+        try:
+            if self.protocol == "sftp":
+                transport = self.ssh_client.get_transport() if self.ssh_client else None
+                if self.sftp is None or transport is None or not transport.is_active():
+                    return False
+                self.sftp.normalize('.')
+            else:
+                if self.ftp is None:
+                    return False
+                self.ftp.voidcmd('NOOP')
+            return True
+        except (OSError, EOFError, ftplib.Error, paramiko.SSHException):
+            return False
+    
+    def atomic_uploads(self):
+        """Indica si las subidas pasan por un temporal (server.atomic_uploads)"""
+        return get_option(self.config, "server", "atomic_uploads")
+    
+    @retrying
+    def upload_file(self, local_path, remote_path, atomic=None):
+        """Sube un archivo.
+
+        Con subidas atómicas se escribe en un temporal y se renombra al final,
+        así que el servidor nunca sirve un archivo a medio subir. Los archivos
+        de server.resume_min_size bytes o más se suben por partes y se
+        reanudan donde se quedaron (ver _put_resumable).
+        """
+        if os.path.getsize(local_path) >= get_option(self.config, "server", "resume_min_size"):
+            self._put_resumable(local_path, remote_path, atomic)
+            return
+        with open(local_path, 'rb') as f:
+            self._put(f, remote_path, atomic)
     
-    def upload_string(self, content, remote_path):
+    def upload_with_variants(self, local_path, remote_path, atomic=None):
+        """Sube un archivo junto con sus variantes precomprimidas (.br / .gz).
+
+        Las variantes se suben antes que el original para que el servidor
+        nunca sirva una versión comprimida más antigua que la página.
+        Devuelve el número de bytes enviados.
+        """
+        local_path = str(local_path)
+        sent = 0
+        for suffix in COMPRESSED_SUFFIXES:
+            if os.path.exists(local_path + suffix):
+                self.upload_file(local_path + suffix, remote_path + suffix, atomic)
+                sent += os.path.getsize(local_path + suffix)
+        self.upload_file(local_path, remote_path, atomic)
+        return sent + os.path.getsize(local_path)
+    
+    def upload_bundle(self, files, remote_dir, delete=(), progress=None):
+        """Sube un lote entero como un tar.gz por un solo canal SSH y lo publica de una vez.
+
+        'files' son [(ruta local, ruta relativa a remote_dir)]; las variantes
+        comprimidas viajan con su archivo. En el servidor, una sola orden
+        copia remote_dir con enlaces duros a un directorio hermano, extrae
+        allí el paquete, borra las rutas de 'delete' (con sus variantes) y
+        pone el directorio nuevo en su lugar (ver _bundle_command). La copia
+        es de todo el sitio en cada despliegue: no mueve datos, pero crea un
+        enlace por archivo. progress(ruta relativa, bytes) se
+        llama al meter cada archivo en el paquete.
+
+        Devuelve los bytes enviados, o None si no se puede (FTP, o el
+        servidor no permite ejecutar órdenes). Si la orden remota falla
+        lanza IOError y el sitio publicado queda como estaba.
+        """
+        if self.protocol != "sftp":
+            return None
+        transport = self.ssh_client.get_transport() if self.ssh_client else None
+        if transport is None or not transport.is_active():
+            raise ConnectionError("No hay conexión SFTP activa")
+        
+        channel = transport.open_session()
+        try:
+            try:
+                channel.exec_command(self._bundle_command(remote_dir, delete))
+            except paramiko.SSHException:
+                return None
+            writer = ChannelWriter(channel)
+            stream_error = None
+            try:
+                with gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=BUNDLE_COMPRESSLEVEL, mtime=0) as gz:
+                    with tarfile.open(fileobj=gz, mode='w|') as tar:
+                        for local_path, relpath in files:
+                            local_path = str(local_path)
+                            for suffix in COMPRESSED_SUFFIXES + ('',):
+                                if suffix and not os.path.exists(local_path + suffix):
+                                    continue
+                                tar.add(local_path + suffix, arcname=relpath + suffix, recursive=False)
+                            if progress:
+                                progress(relpath, os.path.getsize(local_path))
+                channel.shutdown_write()
+            except OSError as e:
+                # El servidor cerró el canal (la orden falló): el motivo llega por stderr
+                stream_error = e
+            errors = channel.makefile_stderr('rb').read().decode('utf-8', 'replace').strip()
+            status = channel.recv_exit_status()
+        finally:
+            channel.close()
+        if status != 0:
+            raise IOError(f"La orden de despliegue falló ({status}): {errors or 'sin detalles'}")
+        if stream_error is not None:
+            raise stream_error
+        return writer.bytes_written
+    
+    @staticmethod
+    def _bundle_command(remote_dir, delete):
+        """Orden de shell que recibe el paquete por la entrada estándar y cambia el directorio.
+
+        Si la ruta remota es un enlace simbólico, la versión nueva se prepara
+        en el directorio de BUNDLE_RELEASE_SUFFIXES al que no apunta y el
+        enlace se sustituye de una vez (ln -sfn a un enlace temporal y
+        mv -T); la versión anterior se queda para poder volver a ella. Si es
+        un directorio se intercambia con mv --exchange donde exista y, si
+        no, con dos renombrados seguidos: entre los dos, durante un instante,
+        la ruta no existe.
+        """
+        site = remote_dir.rstrip('/')
+        first, second = BUNDLE_RELEASE_SUFFIXES
+        removals = " ".join(shlex.quote(path + suffix) for path in delete for suffix in ('',) + COMPRESSED_SUFFIXES)
+        lines = [
+            "set -e",
+            f"site={shlex.quote(site)} new={shlex.quote(site + BUNDLE_NEW_SUFFIX)} "
+            f"old={shlex.quote(site + BUNDLE_OLD_SUFFIX)} link=",
+            'if [ -L "$site" ]; then',
+            f'  case "$(readlink "$site")" in *{first}) new="$site{second}" ;; *) new="$site{first}" ;; esac',
+            f'  link="$site{BUNDLE_LINK_SUFFIX}"',
+            'fi',
+            'trap \'rm -rf "$new"\' EXIT',
+            'rm -rf "$new" "$old"',
+            'mkdir -p "$site"',
+            # Enlaces duros: no se copian datos y tar sustituye los archivos en lugar de reescribirlos
+            'cp -al "$site/." "$new" 2>/dev/null || { rm -rf "$new"; cp -a "$site/." "$new"; }',
+            'tar -xzof - -C "$new"',
+        ]
+        if removals:
+            lines.append(f'(cd "$new" && rm -f -- {removals})')
+        lines += [
+            'if [ -n "$link" ]; then',
+            # Enlace relativo: el directorio nuevo es hermano del enlace
+            '  ln -sfn "${new##*/}" "$link"',
+            '  mv -T "$link" "$site"',
+            '  trap - EXIT',
+            '  exit 0',
+            'fi',
+            'if mv --exchange "$new" "$site" 2>/dev/null; then exit 0; fi',
+            'mv "$site" "$old"',
+            'mv "$new" "$site" || { mv "$old" "$site"; exit 1; }',
+            'rm -rf "$old" || true',
+        ]
+        # Con sh explícito, aunque el shell de la cuenta sea otro
+        return "sh -c " + shlex.quote("\n".join(lines))
+    
+    def rename_with_variants(self, remote_from, remote_to, local_path):
+        """Mueve un archivo subido con upload_with_variants, con las mismas variantes.
+
+        Las variantes se deducen de la copia local y, como al subir, se
+        mueven antes que el original.
+        """
+        self._ensure_dir(os.path.dirname(remote_to))
+        local_path = str(local_path)
+        for suffix in COMPRESSED_SUFFIXES:
+            if os.path.exists(local_path + suffix):
+                self.rename(remote_from + suffix, remote_to + suffix)
+        self.rename(remote_from, remote_to)
+        return 0
+    
+    def delete_with_variants(self, remote_path):
+        """Elimina un archivo remoto y sus variantes precomprimidas si existen"""
+        for suffix in COMPRESSED_SUFFIXES:
+            try:
+                self.delete_file(remote_path + suffix)
+            except Exception:
+                pass  # La variante no existía
+        self.delete_file(remote_path)
+    
+    @retrying
+    def upload_string(self, content, remote_path, atomic=None):
         """Sube contenido string como archivo"""
+        return self.upload_stream([content.encode('utf-8')], remote_path, atomic)
+    
+    def upload_stream(self, chunks, remote_path, atomic=None):
+        """Sube un archivo a partir de trozos de bytes, sin reunirlo entero en memoria.
+
+        Devuelve el número de bytes enviados.
+        """
+        reader = ChunkReader(chunks)
+        self._put(reader, remote_path, atomic)
+        return reader.bytes_read
+    
+    def _put(self, source, remote_path, atomic=None):
+        """Escribe en el servidor lo que se lea de 'source' (con read())"""
+        if atomic is None:
+            atomic = self.atomic_uploads()
+        target = temporary_path(remote_path) if atomic else remote_path
         if self.protocol == "sftp":
             if self.sftp is None:
                 raise ConnectionError("No hay conexión SFTP activa")
-            with self.sftp.file(remote_path, 'w') as f:
-                f.write(content)
+        elif self.ftp is None:
+            raise ConnectionError("No hay conexión FTP activa")
+        # Asegurarse de que el directorio existe (p. ej. page/)
+        self._ensure_dir(os.path.dirname(remote_path))
+        try:
+            if self.protocol == "sftp":
+                self._sftp_store(source, target)
+            else:
+                self._ftp_store(source, target)
+            # Dentro de una operación que ya se reintenta: sin reintentos propios
+            if atomic:
+                self._rename(target, remote_path)
+        except BaseException:
+            if atomic:
+                self._discard(target)
+            raise
+    
+    def _put_resumable(self, local_path, remote_path, atomic=None):
+        """Sube un archivo grande de forma que, si se corta, la siguiente vez siga donde iba.
+
+        Si falla, el temporal se queda en el servidor y la subida queda anotada
+        en el registro local. Al reintentar con el mismo archivo local se
+        continúa desde el tamaño del temporal (escritura con desplazamiento
+        en SFTP, REST + STOR en FTP). Al terminar se comprueba el tamaño y,
+        si el servidor SFTP admite check-file, la huella; si no coinciden se
+        borra el temporal y se lanza IOError.
+        """
+        if atomic is None:
+            atomic = self.atomic_uploads()
+        target = temporary_path(remote_path) if atomic else remote_path
+        if (self.sftp if self.protocol == "sftp" else self.ftp) is None:
+            raise ConnectionError(f"No hay conexión {self.protocol.upper()} activa")
+        self._ensure_dir(os.path.dirname(remote_path))
+
+        local_stat = os.stat(local_path)
+        size = local_stat.st_size
+        key = self._journal_key("upload", remote_path)
+        entry = {'local': str(local_path), 'stamp': [local_stat.st_mtime_ns, size], 'target': target}
+        offset = 0
+        if self.journal.get(key) == entry:
+            offset = self._remote_size(target) or 0
+            if offset > size:
+                offset = 0
         else:
-            if self.ftp is None:
-                raise ConnectionError("No hay conexión FTP activa")
-            # Asegurarse de que el directorio existe
-            self._ftp_ensure_dir(os.path.dirname(remote_path))
-            # Convertir string a bytes y subirlo
-            content_bytes = content.encode('utf-8')
-            self.ftp.storbinary(f'STOR {remote_path}', io.BytesIO(content_bytes))
+            self.journal.record(key, entry)
+
+        with open(local_path, 'rb') as f:
+            try:
+                self._store_from(f, target, offset)
+            except (ftplib.error_reply, ftplib.error_perm):
+                if not offset:
+                    raise
+                # El servidor no admite REST al subir: se empieza de cero
+                self._store_from(f, target, 0)
+        try:
+            self._verify(local_path, target, size)
+        except IOError:
+            self._discard(target)
+            self.journal.remove(key)
+            raise
+        if atomic:
+            self._rename(target, remote_path)
+        self.journal.remove(key)
+
+    def _store_from(self, source, remote_path, offset):
+        """Escribe 'source' a partir de 'offset' (en los dos lados)"""
+        source.seek(offset)
+        if self.protocol == "sftp":
+            self._sftp_store(source, remote_path, offset)
+        else:
+            self._ftp_store(source, remote_path, offset)
+
+    def _journal_key(self, direction, remote_path):
+        """Clave del registro de transferencias: sentido, servidor y ruta remota"""
+        server = self.config.get("server")
+        return f"{direction} {server.get('host', '')}:{server.get('port', '')}:{remote_path}"
+
+    def _remote_size(self, remote_path):
+        """Tamaño de un archivo remoto, o None si no existe"""
+        try:
+            if self.protocol == "sftp":
+                return self.sftp.stat(remote_path).st_size
+            return self.ftp.size(remote_path)
+        except (IOError, ftplib.error_perm):
+            return None
+
+    def _remote_digest(self, remote_path):
+        """(algoritmo, huella) de un archivo remoto calculada por el servidor.
+
+        Solo en SFTP y si el servidor admite la extensión check-file; si no, None.
+        """
+        if self.protocol != "sftp":
+            return None
+        try:
+            with self.sftp.open(remote_path, 'rb') as f:
+                digest = f.check(CHECK_ALGORITHMS)
+        except IOError:
+            return None
+        algorithm = DIGEST_ALGORITHMS.get(len(digest))
+        return (algorithm, digest) if algorithm else None
+
+    def _verify(self, local_path, remote_path, size):
+        """Comprueba que la copia remota es igual a la local (tamaño y, si se puede, huella)"""
+        remote_size = self._remote_size(remote_path)
+        if remote_size != size:
+            raise IOError(f"Tamaño distinto en el servidor: {remote_size} en lugar de {size} bytes")
+        remote_digest = self._remote_digest(remote_path)
+        if remote_digest:
+            algorithm, digest = remote_digest
+            if file_digest(local_path, algorithm).digest() != digest:
+                raise IOError(f"La huella {algorithm} del archivo en el servidor no coincide")
+
+    def pipelining(self):
+        """Indica si las transferencias SFTP encadenan peticiones (server.pipelining)"""
+        return get_option(self.config, "server", "pipelining")
+    
+    def _sftp_store(self, source, remote_path, offset=0):
+        """Escribe en el servidor por SFTP lo que se lea de 'source', por bloques grandes.
+
+        Con server.pipelining las escrituras se envían sin esperar la
+        respuesta de cada una; las respuestas se comprueban al cerrar el
+        archivo, así que un error sigue llegando antes del renombrado.
+        Con 'offset' se escribe a partir de esa posición sin truncar el archivo.
+        """
+        with self.sftp.open(remote_path, 'r+b' if offset else 'wb', bufsize=SFTP_BUFFER_SIZE) as f:
+            f.seek(offset)
+            f.set_pipelined(self.pipelining())
+            while True:
+                block = source.read(SFTP_BUFFER_SIZE)
+                if not block:
+                    break
+                f.write(block)
+    
+    def _ftp_store(self, source, remote_path, offset=0):
+        """STOR leyendo por bloques de 'source' (como storbinary).
+
+        Si la subida se corta, se lee igualmente la respuesta de fin de
+        transferencia para que la conexión de control no quede desfasada.
+        Con 'offset' se envía antes REST para escribir desde esa posición.
+        """
+        conn = self.ftp.transfercmd(f'STOR {remote_path}', offset or None)
+        try:
+            with conn:
+                while True:
+                    block = source.read(FTP_BLOCK_SIZE)
+                    if not block:
+                        break
+                    conn.sendall(block)
+        except BaseException:
+            try:
+                self.ftp.voidresp()
+            except (OSError, EOFError, ftplib.Error):
+                pass
+            raise
+        self.ftp.voidresp()
+    
+    def _discard(self, remote_path):
+        """Borra un temporal que ha quedado a medias (si la conexión lo permite, sin reintentos)"""
+        try:
+            self._delete(remote_path)
+        except Exception:
+            pass
+    
+    def _ensure_dir(self, remote_dir):
+        """Asegura que el directorio remoto existe"""
+        if not remote_dir or remote_dir in self._known_dirs:
+            return
+        if self.protocol == "sftp":
+            self._sftp_ensure_dir(remote_dir)
+        else:
+            self._ftp_ensure_dir(remote_dir)
+        self._known_dirs.add(remote_dir)
+    
+    def _sftp_ensure_dir(self, remote_dir):
+        """Asegura que el directorio remoto existe (SFTP)"""
+        if not remote_dir or self.sftp is None:
+            return
+        try:
+            self.sftp.stat(remote_dir)
+        except IOError:
+            # Crear directorio recursivamente
+            current = '/' if remote_dir.startswith('/') else ''
+            for d in remote_dir.split('/'):
+                if d:
+                    current += d
+                    try:
+                        self.sftp.stat(current)
+                    except IOError:
+                        try:
+                            self.sftp.mkdir(current)
+                        except IOError:
+                            # Otra sesión en paralelo puede haberlo creado entretanto
+                            self.sftp.stat(current)
+                    current += '/'
     
     def _ftp_ensure_dir(self, remote_dir):
         """Asegura que el directorio remoto existe (FTP)"""
@@ -179,15 +738,22 @@ class FileUploader:
                         except ftplib.error_perm:
                             pass  # Ya existe o no se puede crear
     
+    @retrying
     def file_exists(self, remote_path):
         """Verifica si existe un archivo remoto"""
+        return self._exists(remote_path)
+
+    def _exists(self, remote_path):
+        """file_exists sin reintentos, para usarlo dentro de otra operación que ya se reintenta"""
         if self.protocol == "sftp":
             if self.sftp is None:
                 raise ConnectionError("No hay conexión SFTP activa")
             try:
                 self.sftp.stat(remote_path)
                 return True
-            except IOError:
+            except IOError as e:
+                if is_transient(e) or self.connection_lost():
+                    raise
                 return False
         else:
             if self.ftp is None:
@@ -195,11 +761,36 @@ class FileUploader:
             try:
                 self.ftp.size(remote_path)
                 return True
-            except:
+            except Exception as e:
+                if is_transient(e) or self.connection_lost():
+                    raise
                 return False
     
     def delete_file(self, remote_path):
-        """Elimina un archivo remoto"""
+        """Elimina un archivo remoto.
+
+        Se reintenta como las demás operaciones; si un intento se cortó
+        después de que el servidor borrara, el siguiente ya no encuentra el
+        archivo y lo da por hecho.
+        """
+        interrupted = []
+
+        def attempt():
+            try:
+                self._delete(remote_path)
+            except FileNotFoundError:
+                if not interrupted:
+                    raise
+            except ftplib.error_perm:
+                # FTP responde 550 tanto si no existe como si no se puede borrar
+                if not interrupted or self._exists(remote_path):
+                    raise
+            except Exception:
+                interrupted.append(True)
+                raise
+        call_with_retries(attempt, self.config, self.breaker, self)
+
+    def _delete(self, remote_path):
         if self.protocol == "sftp":
             if self.sftp is None:
                 raise ConnectionError("No hay conexión SFTP activa")
@@ -209,6 +800,57 @@ class FileUploader:
                 raise ConnectionError("No hay conexión FTP activa")
             self.ftp.delete(remote_path)
 
+    def rename(self, remote_from, remote_to):
+        """Renombra un archivo remoto sustituyendo el destino si ya existe.
+
+        Se reintenta como las demás operaciones; si un intento se cortó
+        después de que el servidor renombrara, el siguiente encuentra el
+        origen ya movido y lo da por hecho.
+        """
+        interrupted = []
+
+        def attempt():
+            try:
+                self._rename(remote_from, remote_to)
+            except FileNotFoundError:
+                if not (interrupted and self._exists(remote_to)):
+                    raise
+            except Exception:
+                interrupted.append(True)
+                raise
+        call_with_retries(attempt, self.config, self.breaker, self)
+
+    def _rename(self, remote_from, remote_to):
+        if self.protocol == "sftp":
+            if self.sftp is None:
+                raise ConnectionError("No hay conexión SFTP activa")
+            try:
+                # posix-rename@openssh.com sustituye el destino de forma atómica
+                self.sftp.posix_rename(remote_from, remote_to)
+            except IOError as e:
+                # Sin origen no hay nada que hacer (y el destino no se debe tocar)
+                if isinstance(e, FileNotFoundError) or is_transient(e) or self.connection_lost():
+                    raise
+                # Servidor sin la extensión: el rename de SFTP no admite destino existente
+                try:
+                    self.sftp.remove(remote_to)
+                except IOError:
+                    pass
+                self.sftp.rename(remote_from, remote_to)
+        else:
+            if self.ftp is None:
+                raise ConnectionError("No hay conexión FTP activa")
+            try:
+                self.ftp.rename(remote_from, remote_to)
+            except ftplib.error_perm as e:
+                if not self._exists(remote_from):
+                    # Sin origen no hay nada que hacer (y el destino no se debe tocar)
+                    raise FileNotFoundError(errno.ENOENT, str(e), remote_from)
+                # Algunos servidores no sobrescriben con RNFR/RNTO
+                self.ftp.delete(remote_to)
+                self.ftp.rename(remote_from, remote_to)
+
+    @retrying
     def list_files(self, remote_path):
         """Lista archivos en un directorio remoto"""
         if self.protocol == "sftp":
@@ -216,7 +858,9 @@ class FileUploader:
                 raise ConnectionError("No hay conexión SFTP activa")
             try:
                 return self.sftp.listdir(remote_path)
-            except IOError:
+            except IOError as e:
+                if is_transient(e) or self.connection_lost():
+                    raise
                 return []
         else:
             if self.ftp is None:
@@ -225,18 +869,154 @@ class FileUploader:
                 # nlst devuelve lista de nombres de archivo (a veces con path)
                 items = self.ftp.nlst(remote_path)
                 return [os.path.basename(item) for item in items]
-            except:
+            except Exception as e:
+                if is_transient(e) or self.connection_lost():
+                    raise
                 return []
 
+    @retrying
+    def list_tree(self, remote_dir):
+        """Tamaño y fecha de modificación de todos los archivos bajo un directorio remoto.
+
+        Devuelve {ruta relativa: {'size', 'mtime'}}: con SFTP a partir de
+        listdir_attr y con FTP de los datos de MLSD (None si el servidor no
+        admite MLSD). Un directorio que no existe devuelve un dict vacío.
+        """
+        files = {}
+        pending = ['']
+        while pending:
+            relative = pending.pop()
+            current = f"{remote_dir}/{relative}".rstrip('/') if relative else remote_dir
+            if self.protocol == "sftp":
+                if self.sftp is None:
+                    raise ConnectionError("No hay conexión SFTP activa")
+                try:
+                    entries = [(attr.filename, stat.S_ISDIR(attr.st_mode or 0), attr.st_size, attr.st_mtime)
+                               for attr in self.sftp.listdir_attr(current)]
+                except IOError:
+                    entries = []
+            else:
+                if self.ftp is None:
+                    raise ConnectionError("No hay conexión FTP activa")
+                try:
+                    entries = [
+                        (name, facts.get('type') == 'dir', int(facts.get('size', 0)), _mlsd_time(facts.get('modify')))
+                        for name, facts in self.ftp.mlsd(current, facts=['type', 'size', 'modify'])
+                        if facts.get('type') in ('file', 'dir')
+                    ]
+                except ftplib.error_perm as e:
+                    if not str(e).startswith('550'):
+                        return None  # MLSD no disponible
+                    entries = []
+            for name, is_dir, size, mtime in entries:
+                path = f"{relative}/{name}" if relative else name
+                if is_dir:
+                    pending.append(path)
+                else:
+                    files[path] = {'size': size, 'mtime': mtime}
+        return files
+
+    @retrying
+    def download_file(self, remote_path, local_path, expected_hash=None):
+        """Descarga un archivo remoto a disco por bloques, sin tenerlo entero en memoria.
+
+        Se escribe en <local>.part y se renombra al terminar. Si se cortó una
+        descarga anterior del mismo archivo remoto (mismo tamaño y fecha), se
+        continúa desde el final del .part (lectura con desplazamiento en SFTP,
+        REST + RETR en FTP). Se comprueba el tamaño final y, con
+        'expected_hash' (sha256 en hexadecimal, p. ej. el del manifiesto), la
+        huella. Devuelve los bytes descargados en esta llamada, o None si el
+        archivo remoto no existe.
+        """
+        if (self.sftp if self.protocol == "sftp" else self.ftp) is None:
+            raise ConnectionError(f"No hay conexión {self.protocol.upper()} activa")
+        info = self._remote_info(remote_path)
+        if info is None:
+            return None
+        size, mtime = info
+        local_path = Path(local_path)
+        partial = local_path.with_name(local_path.name + PARTIAL_SUFFIX)
+        key = self._journal_key("download", remote_path)
+        entry = {'local': str(local_path), 'size': size, 'mtime': mtime}
+        offset = 0
+        if self.journal.get(key) == entry and partial.exists():
+            offset = min(partial.stat().st_size, size)
+        else:
+            self.journal.record(key, entry)
+
+        with open(partial, 'r+b' if offset else 'wb') as f:
+            try:
+                self._fetch_into(remote_path, f, offset, size)
+            except (ftplib.error_reply, ftplib.error_perm):
+                if not offset:
+                    raise
+                # El servidor no admite REST al descargar: se empieza de cero
+                offset = 0
+                self._fetch_into(remote_path, f, 0, size)
+
+        received = partial.stat().st_size
+        problem = None
+        if received != size:
+            problem = f"Descarga incompleta: {received} de {size} bytes"
+        elif expected_hash and file_digest(partial).hexdigest() != expected_hash:
+            problem = "La huella del archivo descargado no coincide"
+        if problem:
+            partial.unlink()
+            self.journal.remove(key)
+            raise IOError(problem)
+        os.replace(partial, local_path)
+        self.journal.remove(key)
+        return size - offset
+
+    def _fetch_into(self, remote_path, f, offset, size):
+        """Escribe en el archivo local 'f' el remoto a partir de 'offset'"""
+        f.seek(offset)
+        f.truncate()
+        if self.protocol == "sftp":
+            with self.sftp.open(remote_path, 'rb', bufsize=SFTP_BUFFER_SIZE) as remote:
+                remote.seek(offset)
+                if self.pipelining():
+                    remote.prefetch(size, PREFETCH_REQUESTS)
+                while True:
+                    block = remote.read(SFTP_BUFFER_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+        else:
+            self.ftp.retrbinary(f'RETR {remote_path}', f.write, FTP_BLOCK_SIZE, offset or None)
+
+    def _remote_info(self, remote_path):
+        """(tamaño, fecha de modificación) de un archivo remoto, o None si no existe"""
+        if self.protocol == "sftp":
+            try:
+                attributes = self.sftp.stat(remote_path)
+            except IOError:
+                return None
+            return attributes.st_size, attributes.st_mtime
+        size = self._remote_size(remote_path)
+        if size is None:
+            return None
+        try:
+            mtime = _mlsd_time(self.ftp.sendcmd(f'MDTM {remote_path}').split()[-1])
+        except (ftplib.error_perm, ValueError):
+            mtime = None
+        return size, mtime
+
+    @retrying
     def download_string(self, remote_path):
         """Descarga un archivo remoto como string"""
         if self.protocol == "sftp":
             if self.sftp is None:
                 raise ConnectionError("No hay conexión SFTP activa")
             try:
-                with self.sftp.open(remote_path, 'r') as f:
+                with self.sftp.open(remote_path, 'rb', bufsize=SFTP_BUFFER_SIZE) as f:
+                    if self.pipelining():
+                        # Pide todos los trozos de golpe en lugar de uno por viaje
+                        f.prefetch()
                     return f.read().decode('utf-8')
-            except IOError:
+            except IOError as e:
+                if is_transient(e) or self.connection_lost():
+                    raise
                 return None
         else:
             if self.ftp is None:
@@ -245,7 +1025,9 @@ class FileUploader:
                 bio = io.BytesIO()
                 self.ftp.retrbinary(f'RETR {remote_path}', bio.write)
                 return bio.getvalue().decode('utf-8')
-            except:
+            except Exception as e:
+                if is_transient(e) or self.connection_lost():
+                    raise
                 return None
 
 
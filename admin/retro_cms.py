@@ -11,23 +11,87 @@
 ║    - cms/config.py      → Gestión de configuración            ║
 ║    - cms/articles.py    → Gestión de artículos                ║
 ║    - cms/html_generator.py → Generación de HTML               ║
+║    - cms/template_engine.py → Plantillas compiladas           ║
+║    - cms/site_builder.py → Sitio local y precompresión        ║
+║    - cms/minifier.py    → Minificación de HTML y CSS          ║
+║    - cms/search_index.py → Índice de búsqueda estático        ║
+║    - cms/feeds.py       → feed.xml y sitemap.xml              ║
+║    - cms/related.py     → Artículos relacionados              ║
+║    - cms/images.py      → Imágenes WebP y srcset              ║
 ║    - cms/uploader.py    → Subida FTP/SFTP                     ║
+║    - cms/connection_pool.py → Sesiones FTP/SFTP persistentes  ║
+║    - cms/transfer.py    → Subidas en paralelo                 ║
+║    - cms/async_transfer.py → Transferencias con asyncio       ║
+║    - cms/sync.py        → Sincronización por diferencias      ║
+║    - cms/manifest.py    → Manifiesto remoto                   ║
+║    - cms/transfer_journal.py → Transferencias reanudables     ║
+║    - cms/retry.py       → Reintentos y cortacircuitos         ║
+║    - cms/bench/         → Mediciones de rendimiento           ║
 ║    - cms/app.py         → Aplicación principal                ║
 ╚═══════════════════════════════════════════════════════════════╝
 """
 
+import argparse
 import os
+import sys
 
 # Importar desde el paquete modularizado
-from cms import RetroCMSApp
+from cms import RetroCMSApp, ConfigManager, ArticleManager, HTMLGenerator, SiteBuilder, ConnectionPool, SyncPlanner
+from cms.site_builder import verify_reproducible
+
+
+def verify_build():
+    """Genera el sitio dos veces y comprueba que el resultado es idéntico"""
+    config = ConfigManager()
+    differences = verify_reproducible(ArticleManager(config), config)
+    if not differences:
+        print("✓ Build reproducible: las dos generaciones son idénticas byte a byte")
+        return 0
+    print(f"✗ {len(differences)} archivo(s) difieren entre las dos generaciones:")
+    for relpath in differences:
+        print(f"  - {relpath}")
+    return 1
+
+
+def sync_plan():
+    """Genera el sitio y muestra qué subiría una sincronización, sin modificar el servidor"""
+    config = ConfigManager()
+    server = config.get("server")
+    if not server.get("host"):
+        print("✗ Configura el servidor primero")
+        return 1
+    articles = ArticleManager(config)
+    builder = SiteBuilder(articles, HTMLGenerator(articles, config), config)
+    relpaths = builder.build_site()
+    connections = ConnectionPool(config)
+    try:
+        with connections.session() as uploader:
+            plan = SyncPlanner(builder).plan(uploader, server["remote_path"], relpaths)
+    finally:
+        connections.close()
+    for line in SyncPlanner.describe(plan):
+        print(line)
+    return 0
 
 
 def main():
     """Punto de entrada principal"""
+    parser = argparse.ArgumentParser(description="CTPFA CMS - Cliente de Escritorio")
+    parser.add_argument("--verify-build", action="store_true",
+                        help="genera el sitio dos veces y compara los resultados (sin interfaz)")
+    parser.add_argument("--sync-plan", action="store_true",
+                        help="muestra los archivos que se añadirían, cambiarían y borrarían al sincronizar (simulación)")
+    args = parser.parse_args()
+    
     # Crear directorios necesarios
     os.makedirs("articles", exist_ok=True)
     os.makedirs("templates", exist_ok=True)
     
+    if args.verify_build:
+        sys.exit(verify_build())
+    if args.sync_plan:
+        sys.exit(sync_plan())
+    
     app = RetroCMSApp()
     app.run()
 
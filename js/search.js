@@ -0,0 +1,132 @@
+/* ===========================================
+   CUALQUIER TIEMPO PASADO FUE ANTERIOR
+   Búsqueda en el archivo (índice estático por fragmentos)
+   =========================================== */
+
+(function() {
+    const form = document.getElementById('searchForm');
+    if (!form) {
+        return;
+    }
+    const input = document.getElementById('searchInput');
+    const results = document.getElementById('searchResults');
+    const base = form.dataset.index;
+    const root = form.dataset.root || '';
+    const MAX_RESULTS = 20;
+    
+    // Fragmentos ya descargados (prefijo -> promesa del JSON)
+    const shards = new Map();
+    let meta = null;
+    let timer = null;
+    
+    function fetchJson(path) {
+        return fetch(base + path).then(function(response) {
+            // Un fragmento que no existe es que no hay términos con ese prefijo
+            return response.ok ? response.json() : {};
+        });
+    }
+    
+    function loadMeta() {
+        if (!meta) {
+            meta = fetchJson('meta.json');
+        }
+        return meta;
+    }
+    
+    function loadShard(prefix) {
+        if (!shards.has(prefix)) {
+            shards.set(prefix, fetchJson(prefix + '.json'));
+        }
+        return shards.get(prefix);
+    }
+    
+    // Misma normalización que cms/search_index.py
+    function normalize(text, info) {
+        text = text.toLowerCase().replace(/ñ/g, 'n')
+            .normalize('NFD').replace(/[\u0300-\u036f]/g, '')
+            .replace(/[`*#>\[\]()_~|-]/g, ' ');
+        const stopwords = new Set(info.stopwords);
+        const words = text.match(/[a-z0-9]+/g) || [];
+        return words.filter(function(word) {
+            return word.length >= info.prefix && !stopwords.has(word);
+        });
+    }
+    
+    // Artículos que contienen algún término que empieza por la palabra buscada
+    function lookup(word, info) {
+        return loadShard(word.slice(0, info.prefix)).then(function(shard) {
+            const ids = new Set();
+            Object.keys(shard).forEach(function(term) {
+                if (term.startsWith(word)) {
+                    shard[term].forEach(function(id) { ids.add(id); });
+                }
+            });
+            return ids;
+        });
+    }
+    
+    function render(ids, info) {
+        results.innerHTML = '';
+        const found = ids
+            .filter(function(id) { return info.articles[id]; })
+            .sort(function(a, b) {
+                return info.articles[b][2].localeCompare(info.articles[a][2]);
+            });
+        
+        if (!found.length) {
+            const empty = document.createElement('li');
+            empty.className = 'search-empty';
+            empty.textContent = '> SIN RESULTADOS';
+            results.appendChild(empty);
+            return;
+        }
+        
+        found.slice(0, MAX_RESULTS).forEach(function(id) {
+            const [title, category, date] = info.articles[id];
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            link.href = root + id + '.html';
+            link.className = 'search-result';
+            link.textContent = title;
+            const details = document.createElement('span');
+            details.className = 'search-meta';
+            details.textContent = ' [' + category + '] ' + date;
+            item.appendChild(link);
+            item.appendChild(details);
+            results.appendChild(item);
+        });
+    }
+    
+    function search(query) {
+        loadMeta().then(function(info) {
+            const words = normalize(query, info);
+            if (!words.length) {
+                results.innerHTML = '';
+                return;
+            }
+            // Todas las palabras tienen que aparecer en el artículo
+            return Promise.all(words.map(function(word) { return lookup(word, info); }))
+                .then(function(sets) {
+                    const ids = Array.from(sets[0]).filter(function(id) {
+                        return sets.every(function(set) { return set.has(id); });
+                    });
+                    if (normalize(input.value, info).join(' ') === words.join(' ')) {
+                        render(ids, info);
+                    }
+                });
+        }).catch(function(err) {
+            console.error(err);
+        });
+    }
+    
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() { search(input.value); }, 200);
+    });
+    
+    form.addEventListener('submit', function(e) {
+        e.preventDefault();
+        clearTimeout(timer);
+        search(input.value);
+    });
+})();
@@ -0,0 +1,95 @@
+/* ===========================================
+   CUALQUIER TIEMPO PASADO FUE ANTERIOR
+   Scripts comunes a todas las páginas
+   =========================================== */
+
+// Sistema de cambio de tema
+(function() {
+    const themeToggle = document.getElementById('themeToggle');
+    const icon = themeToggle.querySelector('.icon');
+    const label = themeToggle.querySelector('.label');
+    
+    // Cargar tema guardado o usar oscuro por defecto
+    const savedTheme = localStorage.getItem('ctpfa-theme') || 'dark';
+    document.documentElement.setAttribute('data-theme', savedTheme);
+    updateButton(savedTheme);
+    
+    themeToggle.addEventListener('click', function() {
+        const currentTheme = document.documentElement.getAttribute('data-theme');
+        const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+        
+        document.documentElement.setAttribute('data-theme', newTheme);
+        localStorage.setItem('ctpfa-theme', newTheme);
+        updateButton(newTheme);
+    });
+    
+    function updateButton(theme) {
+        if (theme === 'dark') {
+            icon.textContent = '☀';
+            label.textContent = 'CLARO';
+        } else {
+            icon.textContent = '☾';
+            label.textContent = 'OSCURO';
+        }
+    }
+})();
+
+// Descarga del artículo en Markdown
+(function() {
+    const downloadBtn = document.getElementById('downloadMd');
+    if (downloadBtn) {
+        // Los datos van incrustados en la página o, si tiene data-src, en un
+        // <id>.json aparte que solo se descarga al pulsar el botón
+        function loadData(script) {
+            if (script.dataset.src) {
+                return fetch(script.dataset.src).then(function(response) {
+                    if (!response.ok) {
+                        throw new Error('HTTP ' + response.status);
+                    }
+                    return response.json();
+                });
+            }
+            return Promise.resolve(JSON.parse(script.textContent));
+        }
+        
+        downloadBtn.addEventListener('click', function(e) {
+            e.preventDefault();
+            
+            const script = document.getElementById('ctpfa-data');
+            if (!script) {
+                alert('Error: Datos no encontrados');
+                return;
+            }
+            
+            loadData(script).then(function(data) {
+                // Construir contenido Markdown
+                const frontmatter = [
+                    '---',
+                    `title: ${data.title}`,
+                    `category: ${data.category}`,
+                    `tags: ${(data.tags || []).join(', ')}`,
+                    `date: ${data.created}`,
+                    '---',
+                    '',
+                    ''
+                ].join('\n');
+                
+                const mdContent = frontmatter + data.content;
+                
+                // Crear Blob y descargar
+                const blob = new Blob([mdContent], { type: 'text/markdown' });
+                const url = URL.createObjectURL(blob);
+                const a = document.createElement('a');
+                a.href = url;
+                a.download = (data.id || 'article') + '.md';
+                document.body.appendChild(a);
+                a.click();
+                document.body.removeChild(a);
+                URL.revokeObjectURL(url);
+            }).catch(function(err) {
+                console.error(err);
+                alert('Error al generar la descarga');
+            });
+        });
+    }
+})();